@@ -0,0 +1,49 @@
+"""Compare the cost of one cached per-chain lookup, by `lru_cache` on the config and by chain handle.
+
+Run with `uv run python libs/scripts/registry_benchmark.py`.
+"""
+
+import logging
+import timeit
+from functools import lru_cache
+
+from clients.custom_types import ChainConfig
+from clients.evm import EVMConfig
+from clients.registry import get_chain_handle
+from eth_typing import ChainId
+from web3 import Web3
+
+
+def benchmark(chain: ChainConfig, number: int = 100_000) -> dict[str, float]:
+    """Return the cost in nanoseconds of one cached per-chain lookup, by `lru_cache` and by handle."""
+
+    @lru_cache
+    def get_cached(chain: ChainConfig) -> object:
+        return object()
+
+    handle = get_chain_handle(chain)
+    handle.get_resource("benchmark", object)
+    timings = {
+        "lru_cache": timeit.timeit(lambda: get_cached(chain), number=number),
+        "handle": timeit.timeit(lambda: get_chain_handle(chain).get_resource("benchmark", object), number=number),
+    }
+    return {name: seconds / number * 1e9 for name, seconds in timings.items()}
+
+
+async def _middleware(*args): ...
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    sample = EVMConfig(
+        private_rpc="http://localhost:8545",
+        chain_symbol="SEP",
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(11155111),
+        native_decimal=18,
+        deposit_tokens=tuple(Web3.to_checksum_address(f"0x{i:040x}") for i in range(20)),
+        deposit_finalizer_middleware=(_middleware,),
+    )
+    for name, nanoseconds in benchmark(sample).items():
+        logging.info(f"{name}: {nanoseconds:.0f} ns per lookup")
@@ -1,7 +1,6 @@
 import asyncio
 import logging
 import time
-from functools import lru_cache
 from typing import Any, Callable, Coroutine, Iterable
 
 from .abstract import ChainAsyncClient
@@ -13,10 +12,13 @@ from .evm import (
     compute_create2_address,
     get_evm_async_client,
 )
+from .registry import ChainHandle, get_chain_handle
 
 __all__ = [
     "get_async_client",
     "get_compute_address_function",
+    "get_chain_handle",
+    "ChainHandle",
     "filter_blocks",
     "BTCAsyncClient",
     "EVMAsyncClient",
@@ -31,10 +33,12 @@ __all__ = [
 ]
 
 
-# FIXME: We are using `lru_cache` instead of a self-implemented singleton;
-# perhaps we should consider changing this in the future for better clarity.
-@lru_cache
 def get_async_client(chain: ChainConfig, logger: logging.Logger | logging.LoggerAdapter) -> ChainAsyncClient:
+    """Return the client of `chain`, one per chain and event loop.
+
+    The client is shared by every caller on the loop and keeps the logger it was created with, so
+    `logger` only applies to the first call; its records carry the chain but not the later caller.
+    """
     match chain:
         case EVMConfig():
             return get_evm_async_client(chain, logger)
@@ -44,8 +48,13 @@ def get_async_client(chain: ChainConfig, logger: logging.Logger | logging.Logger
             raise NotImplementedError()
 
 
-@lru_cache
 def get_compute_address_function(chain: ChainConfig) -> Callable[[int], Address]:
+    return get_chain_handle(chain).get_resource(
+        "compute_address_function", lambda: _get_compute_address_function(chain)
+    )
+
+
+def _get_compute_address_function(chain: ChainConfig) -> Callable[[int], Address]:
     match chain:
         case EVMConfig():
             return compute_create2_address
@@ -1,9 +1,13 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
+from typing import Iterable
 
 from clients.custom_types import (
+    BlockHeader,
     BlockNumber,
     ChainConfig,
+    TokenMetadata,
     Transfer,
     TxHash,
 )
@@ -36,6 +40,16 @@ class ChainAsyncClient[_ChainT: ChainConfig, _ClientT, _TransferT: Transfer, _Ad
     async def get_token_decimals(self, token_address: _AddressT) -> int:
         """Get decimals for a token contract"""
 
+    async def get_tokens_metadata(self, token_addresses: Iterable[_AddressT]) -> dict[_AddressT, TokenMetadata | None]:
+        """Get metadata of several tokens, `None` for addresses known not to be tokens.
+
+        Looks the decimals of each token up concurrently; clients able to batch the lookups
+        override it.
+        """
+        token_addresses = list(token_addresses)
+        decimals = await asyncio.gather(*[self.get_token_decimals(address) for address in token_addresses])
+        return {address: TokenMetadata(decimals=value) for address, value in zip(token_addresses, decimals)}
+
     @abstractmethod
     async def is_transaction_successful(self, tx_hash: TxHash) -> bool:
         """Check if transaction was successful"""
@@ -48,6 +62,18 @@ class ChainAsyncClient[_ChainT: ChainConfig, _ClientT, _TransferT: Transfer, _Ad
     async def get_latest_block_number(self) -> BlockNumber:
         """Get latest block number"""
 
+    @abstractmethod
+    async def get_block_header(self, block_number: BlockNumber) -> BlockHeader:
+        """Get the hash, and the parent hash when available, of the canonical block at `block_number`"""
+
+    async def get_block_headers(self, block_numbers: Iterable[BlockNumber]) -> dict[BlockNumber, BlockHeader]:
+        """Get the headers of several blocks.
+
+        Fetches each header concurrently; clients able to batch the requests override it.
+        """
+        headers = await asyncio.gather(*[self.get_block_header(block_number) for block_number in block_numbers])
+        return {header.number: header for header in headers}
+
     @abstractmethod
     async def extract_transfer_from_block(
         self,
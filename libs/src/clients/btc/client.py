@@ -1,17 +1,18 @@
 import logging
 import os
-from functools import lru_cache
-from typing import override
+from typing import Iterable, override
 
 from bitcoinutils.keys import PublicKey
 from pyfrost.btc_utils import taproot_tweak_pubkey
 from pyfrost.crypto_utils import code_to_pub, pub_compress
 
 from clients.abstract import ChainAsyncClient
-from clients.custom_types import BlockNumber, TxHash
+from clients.custom_types import BlockHeader, BlockNumber, TxHash
+from clients.registry import ASYNC_CLIENT_RESOURCE, get_chain_handle
 
 from .custom_types import Address, BTCConfig, BTCTransfer
-from .rpc.ankr import BTCAnkrAsyncClient, Transaction
+from .rpc.ankr import BTCAnkrAsyncClient
+from .rpc.data_models import Transaction
 
 
 class BTCAsyncClient(ChainAsyncClient[BTCConfig, BTCAnkrAsyncClient, BTCTransfer, Address]):
@@ -58,6 +59,15 @@ class BTCAsyncClient(ChainAsyncClient[BTCConfig, BTCAnkrAsyncClient, BTCTransfer
     async def get_latest_block_number(self) -> BlockNumber:
         return await self.client.get_latest_block_number()
 
+    @override
+    async def get_block_header(self, block_number: BlockNumber) -> BlockHeader:
+        return (await self.get_block_headers([block_number]))[block_number]
+
+    @override
+    async def get_block_headers(self, block_numbers: Iterable[BlockNumber]) -> dict[BlockNumber, BlockHeader]:
+        hashes = await self.client.get_block_hashes(list(block_numbers))
+        return {height: BlockHeader(number=height, hash=block_hash) for height, block_hash in hashes.items()}
+
     @override
     async def extract_transfer_from_block(
         self,
@@ -85,6 +95,7 @@ class BTCAsyncClient(ChainAsyncClient[BTCConfig, BTCAnkrAsyncClient, BTCTransfer
                     BTCTransfer(
                         tx_hash=tx.txid,
                         block_number=tx.blockHeight,
+                        block_hash=tx.blockHash,
                         chain_symbol=self.chain.chain_symbol,
                         to=output.addresses[0],  # type: ignore
                         value=output.value,
@@ -95,10 +106,8 @@ class BTCAsyncClient(ChainAsyncClient[BTCConfig, BTCAnkrAsyncClient, BTCTransfer
         return transfers
 
 
-@lru_cache
 def get_btc_async_client(chain: BTCConfig, logger: logging.Logger | logging.LoggerAdapter) -> BTCAsyncClient:
-    client = BTCAsyncClient(chain, logger)
-    return client
+    return get_chain_handle(chain).get_loop_resource(ASYNC_CLIENT_RESOURCE, lambda: BTCAsyncClient(chain, logger))
 
 
 def compute_btc_address(salt: int) -> Address:
@@ -0,0 +1,205 @@
+import random
+from dataclasses import dataclass
+from typing import Sequence
+
+from .custom_types import UTXO
+
+# Virtual sizes of a taproot key path spend, which is how deposit addresses are spent
+TX_OVERHEAD_VBYTES = 11
+INPUT_VBYTES = 58
+OUTPUT_VBYTES = 43
+DUST_LIMIT = 330
+BNB_MAX_TRIES = 100_000
+KNAPSACK_ITERATIONS = 1000
+
+
+@dataclass(frozen=True)
+class CoinSelection:
+    utxos: list[UTXO]
+    fee: int
+    change: int
+
+    @property
+    def amount(self) -> int:
+        return sum(utxo.amount for utxo in self.utxos)
+
+
+def get_effective_value(utxo: UTXO, fee_rate: int) -> int:
+    """The amount a UTXO adds to a transaction once the fee of spending it is paid."""
+    return utxo.amount - INPUT_VBYTES * fee_rate
+
+
+def get_fee(inputs: int, outputs: int, fee_rate: int) -> int:
+    return (TX_OVERHEAD_VBYTES + inputs * INPUT_VBYTES + outputs * OUTPUT_VBYTES) * fee_rate
+
+
+def select_branch_and_bound(
+    utxos: Sequence[UTXO],
+    target: int,
+    fee_rate: int,
+    cost_of_change: int,
+    max_tries: int = BNB_MAX_TRIES,
+) -> list[UTXO] | None:
+    """Search for inputs whose effective value lands in `[target, target + cost_of_change]`.
+
+    Such a selection needs no change output; the excess, smaller than the cost of creating and
+    later spending a change output, goes to the fee. The depth first search tries including the
+    largest UTXOs first, prunes branches that overshoot or cannot reach `target`, and keeps the
+    selection with the least excess found within `max_tries` steps.
+    """
+    pool = sorted(
+        (utxo for utxo in utxos if get_effective_value(utxo, fee_rate) > 0),
+        key=lambda utxo: get_effective_value(utxo, fee_rate),
+        reverse=True,
+    )
+    values = [get_effective_value(utxo, fee_rate) for utxo in pool]
+    available = sum(values)
+    if available < target:
+        return None
+
+    selection: list[int] = []
+    value = 0
+    index = 0
+    best: list[int] | None = None
+    best_excess = 0
+    for _ in range(max_tries):
+        backtrack = False
+        if value + available < target or value > target + cost_of_change:
+            backtrack = True
+        elif value >= target:
+            if best is None or value - target < best_excess:
+                best, best_excess = list(selection), value - target
+                if best_excess == 0:
+                    break
+            backtrack = True
+
+        if backtrack:
+            if not selection:
+                break
+            # Give back the UTXOs omitted after the last included one, then omit that one instead.
+            index -= 1
+            while index > selection[-1]:
+                available += values[index]
+                index -= 1
+            value -= values[index]
+            selection.pop()
+            index += 1
+        else:
+            available -= values[index]
+            value += values[index]
+            selection.append(index)
+            index += 1
+
+    if best is None:
+        return None
+    return [pool[index] for index in best]
+
+
+def _approximate_best_subset(
+    values: list[int], target: int, iterations: int, rng: random.Random
+) -> tuple[list[bool], int]:
+    best_included = [True] * len(values)
+    best_value = sum(values)
+    for _ in range(iterations):
+        if best_value == target:
+            break
+        included = [False] * len(values)
+        total = 0
+        reached = False
+        for pass_ in range(2):
+            if reached:
+                break
+            for index, value in enumerate(values):
+                # The first pass picks at random, the second completes with what was left out.
+                if (pass_ == 0 and rng.random() < 0.5) or (pass_ == 1 and not included[index]):
+                    total += value
+                    included[index] = True
+                    if total >= target:
+                        reached = True
+                        if total < best_value:
+                            best_value = total
+                            best_included = list(included)
+                        total -= value
+                        included[index] = False
+    return best_included, best_value
+
+
+def select_knapsack(
+    utxos: Sequence[UTXO],
+    target: int,
+    fee_rate: int,
+    min_change: int,
+    iterations: int = KNAPSACK_ITERATIONS,
+    rng: random.Random | None = None,
+) -> list[UTXO] | None:
+    """Select inputs for `target` plus at least `min_change`, for a transaction with a change output.
+
+    Randomly approximates the smallest subset of the UTXOs smaller than the target that reaches
+    it, and takes the smallest larger UTXO alone instead when that comes closer.
+    """
+    rng = rng or random.Random()
+    pool = [utxo for utxo in utxos if get_effective_value(utxo, fee_rate) > 0]
+    rng.shuffle(pool)
+    smaller = []
+    lowest_larger = None
+    for utxo in pool:
+        value = get_effective_value(utxo, fee_rate)
+        if value == target:
+            return [utxo]
+        if value < target + min_change:
+            smaller.append(utxo)
+        elif lowest_larger is None or value < get_effective_value(lowest_larger, fee_rate):
+            lowest_larger = utxo
+
+    total_smaller = sum(get_effective_value(utxo, fee_rate) for utxo in smaller)
+    if total_smaller == target:
+        return smaller
+    if total_smaller < target:
+        return [lowest_larger] if lowest_larger is not None else None
+
+    smaller.sort(key=lambda utxo: get_effective_value(utxo, fee_rate), reverse=True)
+    values = [get_effective_value(utxo, fee_rate) for utxo in smaller]
+    included, best_value = _approximate_best_subset(values, target, iterations, rng)
+    if best_value != target and total_smaller >= target + min_change:
+        included, best_value = _approximate_best_subset(values, target + min_change, iterations, rng)
+
+    if lowest_larger is not None and (
+        (best_value != target and best_value < target + min_change)
+        or get_effective_value(lowest_larger, fee_rate) <= best_value
+    ):
+        return [lowest_larger]
+    return [utxo for utxo, keep in zip(smaller, included) if keep]
+
+
+def select_coins(
+    utxos: Sequence[UTXO],
+    amount: int,
+    fee_rate: int,
+    outputs: int = 1,
+    rng: random.Random | None = None,
+) -> CoinSelection | None:
+    """Select UTXOs paying `amount` to `outputs` recipients at `fee_rate` sat/vbyte, `None` if funds are short.
+
+    A selection without change is preferred, found by branch and bound; otherwise the knapsack
+    solver selects inputs for a transaction with a change output. Change below the dust limit is
+    left to the fee.
+    """
+    target = amount + get_fee(0, outputs, fee_rate)
+    cost_of_change = (OUTPUT_VBYTES + INPUT_VBYTES) * fee_rate
+    selected = select_branch_and_bound(utxos, target, fee_rate, cost_of_change)
+    has_change = False
+    if selected is None:
+        selected = select_knapsack(utxos, target + OUTPUT_VBYTES * fee_rate, fee_rate, DUST_LIMIT, rng=rng)
+        has_change = True
+    if selected is None:
+        return None
+
+    total = sum(utxo.amount for utxo in selected)
+    fee = get_fee(len(selected), outputs + has_change, fee_rate)
+    change = total - amount - fee
+    if change < 0:
+        return None
+    if not has_change or change < DUST_LIMIT:
+        fee = total - amount
+        change = 0
+    return CoinSelection(utxos=selected, fee=fee, change=change)
@@ -115,6 +115,24 @@ class BTCAnkrAsyncClient:
         data["txs"] = all_txs
         return Block.model_validate(data)
 
+    async def get_block_hashes(self, heights: list[int]) -> dict[int, str]:
+        """Get the hashes of the blocks at `heights` with one JSON-RPC batch of `getblockhash` calls."""
+        data = [{"id": index, "method": "getblockhash", "params": [height]} for index, height in enumerate(heights)]
+        headers = {
+            "Content-Type": "application/json",
+        }
+        # A batch is answered with one response per call
+        resp: Any = await self._request("POST", self.base_url, headers=headers, json_data=data)
+        if not isinstance(resp, list):
+            raise BTCResponseError(f"Unexpected batch response: {resp}")
+        items: list[dict[str, Any]] = resp
+        result = {}
+        for item in items:
+            if item.get("error") or item.get("result") is None:
+                raise BTCRequestError(f"Ankr error occurred: {item.get('error')}")
+            result[heights[item["id"]]] = item["result"]
+        return result
+
     async def send_tx(self, hex_tx_data: str) -> str | None:
         url = f"{self.block_book_base_url}/api/v2/sendtx/{hex_tx_data}"
         resp = await self._request("GET", url)
@@ -26,6 +26,7 @@ class Transfer[_AddressT](BaseModel, ABC):
     token: _AddressT
     to: _AddressT
     block_number: BlockNumber
+    block_hash: str | None = None
 
     @abstractmethod
     def __eq__(self, value: Any) -> bool: ...
@@ -34,6 +35,19 @@ class Transfer[_AddressT](BaseModel, ABC):
     def __gt__(self, value: Any) -> bool: ...
 
 
+class BlockHeader(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    number: BlockNumber
+    hash: str
+    parent_hash: str | None = None
+
+
+class TokenMetadata(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    decimals: int
+    symbol: str | None = None
+
+
 class WithdrawStatus(StrEnum):
     PENDING = "pending"
     PROCESSING = "processing"
@@ -64,3 +78,5 @@ class ChainConfig[_TransferT: Transfer, _WithdrawT: WithdrawRequest](BaseModel,
     transfer_class: type[_TransferT]
     withdraw_request_type: type[_WithdrawT]
     deposit_finalizer_middleware: tuple[Callable[..., Awaitable[Any]], ...] | None = None  # Supports async functions
+    # Deposit fields the middleware reads; when set they receive projected views instead of full deposits
+    deposit_finalizer_middleware_fields: tuple[str, ...] | None = None
@@ -1,4 +1,4 @@
-__all__ = ["ERC20_ABI"]
+__all__ = ["ERC20_ABI", "MULTICALL3_ABI"]
 
 ERC20_ABI = [
     {
@@ -32,3 +32,32 @@ ERC20_ABI = [
     },
     # Add other ERC20 functions if necessary
 ]
+
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"},
+                ],
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"},
+                ],
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+]
@@ -0,0 +1,46 @@
+from typing import Iterable
+
+from web3 import Web3
+
+from .custom_types import ChecksumAddress
+
+TRANSFER_EVENT_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)")
+
+
+def get_bloom_mask(value: bytes) -> int:
+    """Return the three bits `value` sets in a 2048-bit logs bloom, as defined in the yellow paper."""
+    value_hash = Web3.keccak(value)
+    mask = 0
+    for i in range(0, 6, 2):
+        mask |= 1 << (((value_hash[i] << 8) | value_hash[i + 1]) & 2047)
+    return mask
+
+
+def _address_to_topic(address: ChecksumAddress) -> bytes:
+    return bytes(12) + Web3.to_bytes(hexstr=address)
+
+
+class DepositLogsBloomFilter:
+    """Tell from a block `logsBloom` whether the block may hold an ERC20 transfer to a watched address.
+
+    A negative answer is definite, a positive one may be a false positive.
+    """
+
+    def __init__(
+        self,
+        addresses: Iterable[ChecksumAddress],
+        tokens: Iterable[ChecksumAddress] | None = None,
+    ):
+        self.transfer_topic_mask = get_bloom_mask(TRANSFER_EVENT_TOPIC)
+        self.address_masks = {get_bloom_mask(_address_to_topic(address)) for address in addresses}
+        self.token_masks = (
+            {get_bloom_mask(Web3.to_bytes(hexstr=token)) for token in tokens} if tokens is not None else None
+        )
+
+    def may_contain_deposit(self, logs_bloom: bytes) -> bool:
+        bloom = int.from_bytes(logs_bloom, "big")
+        if bloom & self.transfer_topic_mask != self.transfer_topic_mask:
+            return False
+        if self.token_masks is not None and not any(bloom & mask == mask for mask in self.token_masks):
+            return False
+        return any(bloom & mask == mask for mask in self.address_masks)
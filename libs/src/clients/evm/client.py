@@ -1,21 +1,26 @@
 import logging
 import os
-from functools import lru_cache
-from typing import override
+from itertools import batched
+from typing import Iterable, Mapping, override
 
+import httpx
 import web3.exceptions
+from eth_abi.abi import decode as abi_decode
+from eth_abi.exceptions import DecodingError
 from eth_account import Account
 from eth_account.messages import encode_defunct
 from eth_typing import HexStr
 from pydantic import ValidationError
 from web3 import AsyncHTTPProvider, AsyncWeb3, Web3
 from web3.middleware.geth_poa import async_geth_poa_middleware
-from web3.types import TxData
+from web3.types import BlockData, TxData
 
 from clients.abstract import ChainAsyncClient
-from clients.custom_types import BlockNumber, TxHash
+from clients.custom_types import BlockHeader, BlockNumber, TokenMetadata, TxHash
+from clients.registry import ASYNC_CLIENT_RESOURCE, get_chain_handle
 
-from .abi import ERC20_ABI
+from .abi import ERC20_ABI, MULTICALL3_ABI
+from .bloom import DepositLogsBloomFilter
 from .custom_types import ChecksumAddress, EVMConfig, EVMTransfer
 from .exceptions import EVMBlockNotFound, EVMTransferNotFound, EVMTransferNotValid
 from .transfer_decoder import (
@@ -24,11 +29,51 @@ from .transfer_decoder import (
     decode_transfer_tx,
 )
 
+NATIVE_TOKEN_ADDRESS = "0x0000000000000000000000000000000000000000"
+DECIMALS_SELECTOR = bytes.fromhex("313ce567")  # decimals()
+SYMBOL_SELECTOR = bytes.fromhex("95d89b41")  # symbol()
+
+
+def decode_token_decimals(success: bool, data: bytes) -> int | None:
+    if not success:
+        return None
+    try:
+        return abi_decode(["uint8"], data)[0]
+    except (DecodingError, OverflowError, ValueError):
+        return None
+
+
+def normalize_hash(value: bytes | str) -> str:
+    """Return a hash as lowercase hex with a `0x` prefix, whether web3 decoded it or it is raw JSON-RPC."""
+    if isinstance(value, bytes):
+        return "0x" + bytes.hex(value)
+    return "0x" + value.lower().removeprefix("0x")
+
+
+def decode_token_symbol(success: bool, data: bytes) -> str | None:
+    """Decode a `symbol()` result, returned as `string` by most tokens and as `bytes32` by a few old ones."""
+    if not success:
+        return None
+    try:
+        return abi_decode(["string"], data)[0]
+    except (DecodingError, OverflowError, ValueError, UnicodeDecodeError):
+        pass
+    if len(data) != 32:
+        return None
+    try:
+        return data.rstrip(b"\x00").decode() or None
+    except UnicodeDecodeError:
+        return None
+
 
 class EVMAsyncClient(ChainAsyncClient[EVMConfig, AsyncWeb3, EVMTransfer, ChecksumAddress]):
     def __init__(self, chain: EVMConfig, logger: logging.Logger | logging.LoggerAdapter):
         super().__init__(chain, logger)
         self._w3 = None
+        self._bloom_filter_source: Mapping[ChecksumAddress, int] | None = None
+        self._bloom_filter: DepositLogsBloomFilter | None = None
+        self._multicall = None
+        self._http: httpx.AsyncClient | None = None
 
     @property
     @override
@@ -78,6 +123,37 @@ class EVMAsyncClient(ChainAsyncClient[EVMConfig, AsyncWeb3, EVMTransfer, Checksu
         decimals = await contract.functions.decimals().call()
         return decimals
 
+    @override
+    async def get_tokens_metadata(
+        self, token_addresses: Iterable[ChecksumAddress]
+    ) -> dict[ChecksumAddress, TokenMetadata | None]:
+        """Get `decimals()` and `symbol()` of the tokens through Multicall3 `aggregate3` calls.
+
+        Each call carries `token_metadata_batch_size` tokens and lets the inner calls fail, so a
+        contract without `decimals()` resolves to `None` instead of failing the whole batch.
+        """
+        if self.chain.multicall_address is None:
+            return await super().get_tokens_metadata(token_addresses)
+        result: dict[ChecksumAddress, TokenMetadata | None] = {}
+        tokens = []
+        for address in token_addresses:
+            if address == NATIVE_TOKEN_ADDRESS:
+                result[address] = TokenMetadata(decimals=self.chain.native_decimal)
+            else:
+                tokens.append(address)
+        if self._multicall is None:
+            self._multicall = self.client.eth.contract(address=self.chain.multicall_address, abi=MULTICALL3_ABI)
+        for batch in batched(tokens, self.chain.token_metadata_batch_size):
+            calls = [(token, True, selector) for token in batch for selector in (DECIMALS_SELECTOR, SYMBOL_SELECTOR)]
+            responses = await self._multicall.functions.aggregate3(calls).call()
+            for token, decimals_response, symbol_response in zip(batch, responses[::2], responses[1::2]):
+                decimals = decode_token_decimals(*decimals_response)
+                if decimals is None:
+                    result[token] = None
+                else:
+                    result[token] = TokenMetadata(decimals=decimals, symbol=decode_token_symbol(*symbol_response))
+        return result
+
     @override
     async def is_transaction_successful(self, tx_hash: TxHash) -> bool:
         try:
@@ -95,17 +171,114 @@ class EVMAsyncClient(ChainAsyncClient[EVMConfig, AsyncWeb3, EVMTransfer, Checksu
     async def get_latest_block_number(self) -> BlockNumber:
         return await self.client.eth.get_block_number()
 
+    @override
+    async def get_block_header(self, block_number: BlockNumber) -> BlockHeader:
+        block = await self._get_block(block_number, full_transactions=False)
+        return BlockHeader(
+            number=block.number,  # type: ignore
+            hash=normalize_hash(block.hash),  # type: ignore
+            parent_hash=normalize_hash(block.parentHash),  # type: ignore
+        )
+
+    @override
+    async def get_block_headers(self, block_numbers: Iterable[BlockNumber]) -> dict[BlockNumber, BlockHeader]:
+        """Get the headers with JSON-RPC batches of `eth_getBlockByNumber` calls, `header_batch_size` calls each.
+
+        Web3 6 has no batch requests, so the batches are posted by an HTTP client this client owns
+        and closes, to the endpoint and with the headers of the web3 provider. Falls back to one
+        request per block when the node does not accept batches.
+        """
+        block_numbers = list(block_numbers)
+        result = {}
+        for batch in batched(block_numbers, self.chain.header_batch_size):
+            payload = [
+                {"jsonrpc": "2.0", "id": index, "method": "eth_getBlockByNumber", "params": [hex(block_number), False]}
+                for index, block_number in enumerate(batch)
+            ]
+            response = await self._get_http().post(str(self._provider.endpoint_uri), json=payload, timeout=30)
+            response.raise_for_status()
+            responses = response.json()
+            if not isinstance(responses, list):
+                self.logger.warning(f"Batch requests are not supported: {responses}")
+                return await super().get_block_headers(block_numbers)
+            for item in responses:
+                block_number = batch[item["id"]]
+                block = item.get("result")
+                if block is None:
+                    raise EVMBlockNotFound(f"Block not found: {block_number}, error: {item.get('error')}")
+                result[block_number] = BlockHeader(
+                    number=block_number,
+                    hash=normalize_hash(block["hash"]),
+                    parent_hash=normalize_hash(block["parentHash"]),
+                )
+        return result
+
+    @property
+    def _provider(self) -> AsyncHTTPProvider:
+        return self.client.provider  # type: ignore
+
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(headers=self._provider.get_request_headers())
+        return self._http
+
+    async def close(self) -> None:
+        """Close the HTTP client of the batch requests; the registry calls it when the loop of this client ends."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
     @override
     async def extract_transfer_from_block(
         self,
         block_number: BlockNumber,
+        *,
+        watched_addresses: Mapping[ChecksumAddress, int] | None = None,
         **kwargs,
     ) -> list[EVMTransfer]:
+        """Get block transfers.
+
+        When `watched_addresses` is given and `logs_bloom_prefilter` is enabled, the block
+        `logsBloom` decides whether ERC20 transfers are decoded. If `scan_native_transfers` is
+        disabled, only the block header is fetched for blocks the bloom rules out. Native
+        transfers emit no logs, so with `scan_native_transfers` enabled the full block is still
+        downloaded and the bloom only saves decoding the token transfers of unrelated blocks.
+        """
         self.logger.debug(f"Observing block number {block_number} start")
+        if watched_addresses is None or not self.chain.logs_bloom_prefilter:
+            block = await self._get_block(block_number, full_transactions=True)
+            result = self._parse_block_transfers(block)
+        else:
+            bloom_filter = self._get_bloom_filter(watched_addresses)
+            block = await self._get_block(block_number, full_transactions=self.chain.scan_native_transfers)
+            if not block.transactions:  # type: ignore
+                result = []
+            elif bloom_filter.may_contain_deposit(block.logsBloom):  # type: ignore
+                if not self.chain.scan_native_transfers:
+                    block = await self._get_block(block_number, full_transactions=True)
+                result = self._parse_block_transfers(block)
+            elif self.chain.scan_native_transfers:
+                result = self._parse_native_transfers(block, watched_addresses)
+            else:
+                result = []
+        self.logger.debug(f"Observing block number {block_number} end")
+        return result
+
+    async def _get_block(self, block_number: BlockNumber, full_transactions: bool) -> BlockData:
         try:
-            block = await self.client.eth.get_block(block_number, full_transactions=True)
+            return await self.client.eth.get_block(block_number, full_transactions=full_transactions)
         except web3.exceptions.BlockNotFound as e:
             raise EVMBlockNotFound(f"Block not found: {block_number}, error: {e}") from e
+
+    def _get_bloom_filter(self, watched_addresses: Mapping[ChecksumAddress, int]) -> DepositLogsBloomFilter:
+        # Callers pass the same mapping for every block of a scan, so the filter is rebuilt only
+        # when a new mapping is given.
+        if self._bloom_filter is None or self._bloom_filter_source is not watched_addresses:
+            self._bloom_filter = DepositLogsBloomFilter(watched_addresses, self.chain.deposit_tokens)
+            self._bloom_filter_source = watched_addresses
+        return self._bloom_filter
+
+    def _parse_block_transfers(self, block: BlockData) -> list[EVMTransfer]:
         result = []
         for tx in block.transactions:  # type: ignore
             try:
@@ -117,7 +290,21 @@ class EVMAsyncClient(ChainAsyncClient[EVMConfig, AsyncWeb3, EVMTransfer, Checksu
                 ...
             except EVMTransferNotValid as e:
                 self.logger.exception(f"EVMTransferNotValid, {e}")
-        self.logger.debug(f"Observing block number {block_number} end")
+        return result
+
+    def _parse_native_transfers(
+        self,
+        block: BlockData,
+        watched_addresses: Mapping[ChecksumAddress, int],
+    ) -> list[EVMTransfer]:
+        result = []
+        for tx in block.transactions:  # type: ignore
+            if tx["to"] not in watched_addresses or tx["input"].hex() != "0x":  # type: ignore
+                continue
+            try:
+                result.append(self._parse_transfer(tx))  # type: ignore
+            except EVMTransferNotValid as e:
+                self.logger.exception(f"EVMTransferNotValid, {e}")
         return result
 
     @staticmethod
@@ -135,6 +322,7 @@ class EVMAsyncClient(ChainAsyncClient[EVMConfig, AsyncWeb3, EVMTransfer, Checksu
                     to=tx["to"],  # type: ignore
                     value=tx["value"],  # type: ignore
                     token="0x0000000000000000000000000000000000000000",  # type: ignore
+                    block_hash=normalize_hash(tx["blockHash"]),  # type: ignore
                 )
             decoded_input = decode_transfer_tx(tx_input)  # type: ignore
             return EVMTransfer(
@@ -144,6 +332,7 @@ class EVMAsyncClient(ChainAsyncClient[EVMConfig, AsyncWeb3, EVMTransfer, Checksu
                 to=decoded_input._to,
                 value=decoded_input._value,
                 token=tx["to"],  # type: ignore
+                block_hash=normalize_hash(tx["blockHash"]),  # type: ignore
             )
         except (
             InvalidTxError,
@@ -153,10 +342,8 @@ class EVMAsyncClient(ChainAsyncClient[EVMConfig, AsyncWeb3, EVMTransfer, Checksu
             raise EVMTransferNotValid(f"Transfer with tx_hash {tx} is not valid.") from e
 
 
-@lru_cache
 def get_evm_async_client(chain: EVMConfig, logger: logging.Logger | logging.LoggerAdapter) -> EVMAsyncClient:
-    client = EVMAsyncClient(chain, logger)
-    return client
+    return get_chain_handle(chain).get_loop_resource(ASYNC_CLIENT_RESOURCE, lambda: EVMAsyncClient(chain, logger))
 
 
 def compute_create2_address(salt: int) -> ChecksumAddress:
@@ -2,9 +2,12 @@ from typing import Any
 
 from eth_typing import ChainId, ChecksumAddress
 from pydantic import Field
+from web3 import Web3
 
 from clients.custom_types import ChainConfig, Transfer, WithdrawRequest
 
+MULTICALL3_ADDRESS = Web3.to_checksum_address("0xcA11bde05977b3631167028862bE2a173976CA11")
+
 
 class EVMTransfer(Transfer[ChecksumAddress]):
     def __eq__(self, value: Any) -> bool:
@@ -27,6 +30,16 @@ class EVMConfig(ChainConfig[EVMTransfer, EVMWithdrawRequest]):
     chain_id: ChainId
     poa: bool = Field(default=False)
     native_decimal: int
+    logs_bloom_prefilter: bool = Field(default=True)
+    # Native transfers emit no logs, so scanning them downloads every block with its transactions.
+    # Off, only the header of a block is fetched unless its logsBloom may hold a token deposit,
+    # and native deposits are not observed; turn it on for chains accepting them.
+    scan_native_transfers: bool = Field(default=False)
+    deposit_tokens: tuple[ChecksumAddress, ...] | None = None
+    # Multicall3 contract batching token metadata lookups, deployed at the same address on most chains
+    multicall_address: ChecksumAddress | None = MULTICALL3_ADDRESS
+    token_metadata_batch_size: int = Field(default=100)
+    header_batch_size: int = Field(default=100)
     transfer_class: type[EVMTransfer] = EVMTransfer
     withdraw_request_type: type[EVMWithdrawRequest] = EVMWithdrawRequest
 
@@ -0,0 +1,104 @@
+import asyncio
+import inspect
+from itertools import count
+from typing import Any, AsyncGenerator, Callable, Hashable
+
+from .custom_types import ChainConfig
+
+# One client per chain and event loop, shared by every caller: it logs through the logger of
+# the caller that created it and ignores the loggers passed afterwards.
+ASYNC_CLIENT_RESOURCE = "async_client"
+
+
+class ChainHandle:
+    """An interned handle of a configured chain carrying the resources cached for it.
+
+    Handles hash by identity, so looking one up or reading one of its resources never hashes the
+    `ChainConfig` model itself.
+    """
+
+    __slots__ = ("id", "chain", "_resources")
+
+    def __init__(self, id: int, chain: ChainConfig):
+        self.id = id
+        self.chain = chain
+        self._resources: dict[Hashable, Any] = {}
+
+    def get_resource[T](self, key: Hashable, factory: Callable[[], T]) -> T:
+        """Return the resource stored under `key`, creating it with `factory` on first use."""
+        try:
+            return self._resources[key]
+        except KeyError:
+            resource = self._resources[key] = factory()
+            return resource
+
+    def get_loop_resource[T](self, key: Hashable, factory: Callable[[], T]) -> T:
+        """Like `get_resource`, but recreate the resource when used from another event loop.
+
+        For resources holding connections bound to the loop they were opened in, such as HTTP
+        clients, in processes running a new loop per request. A resource with an async `close`
+        is closed when its loop shuts down, as `asyncio.run` does on exit, so its connections do
+        not outlive the loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        stored = self._resources.get(key)
+        if stored is not None and stored[0] is loop:
+            return stored[1]
+        resource = factory()
+        closer = None
+        if loop is not None and inspect.iscoroutinefunction(getattr(resource, "close", None)):
+            closer = _close_with_loop(resource)
+        self._resources[key] = (loop, resource, closer)
+        return resource
+
+    def __repr__(self) -> str:
+        return f"ChainHandle({self.id}, {self.chain.chain_symbol})"
+
+
+def _close_with_loop(resource: Any) -> AsyncGenerator[None, None]:
+    """Return an async generator closing `resource` once the running loop finalizes it.
+
+    The generator is run up to its `yield` right away, which registers it with the hooks of the
+    running loop; the loop then closes it when shutting its async generators down. The caller
+    keeps it alive, since the loop only holds it weakly.
+    """
+
+    async def close() -> AsyncGenerator[None, None]:
+        try:
+            yield
+        finally:
+            await resource.close()
+
+    closer = close()
+    try:
+        closer.asend(None).send(None)
+    except StopIteration:
+        pass
+    return closer
+
+
+# The config is kept next to its handle so its `id` cannot be reused by another object.
+_handles_by_identity: dict[int, tuple[ChainConfig, ChainHandle]] = {}
+_handles_by_symbol: dict[str, ChainHandle] = {}
+_handle_ids = count()
+
+
+def get_chain_handle(chain: ChainConfig) -> ChainHandle:
+    """Return the interned handle of `chain`.
+
+    Configs are module level singletons, so the lookup is by identity; an equal config created
+    elsewhere is compared once and then shares the same handle.
+    """
+    try:
+        return _handles_by_identity[id(chain)][1]
+    except KeyError:
+        pass
+    handle = _handles_by_symbol.get(chain.chain_symbol)
+    if handle is None or handle.chain != chain:
+        handle = ChainHandle(next(_handle_ids), chain)
+        _handles_by_symbol[chain.chain_symbol] = handle
+    _handles_by_identity[id(chain)] = (chain, handle)
+    return handle
@@ -0,0 +1,58 @@
+import random
+
+from clients.btc.coin_selection import (
+    DUST_LIMIT,
+    INPUT_VBYTES,
+    get_fee,
+    select_branch_and_bound,
+    select_coins,
+    select_knapsack,
+)
+from clients.btc.custom_types import UTXO
+
+
+def get_utxos(*amounts: int) -> list[UTXO]:
+    return [
+        UTXO(tx_hash=f"{index:064x}", amount=amount, index=0, address="tb1q", salt=index)
+        for index, amount in enumerate(amounts)
+    ]
+
+
+def test_select_branch_and_bound_should_find_changeless_selection():
+    # Arrangement Phase
+    fee_rate = 2
+    utxos = get_utxos(*(value + INPUT_VBYTES * fee_rate for value in (10_000, 7_000, 5_000, 3_000, 1_000)))
+    # Action Phase
+    selected = select_branch_and_bound(utxos, target=8_000, fee_rate=fee_rate, cost_of_change=0)
+    # Assertion Phase
+    assert sorted(utxo.amount - INPUT_VBYTES * fee_rate for utxo in selected) == [1_000, 7_000]  # type: ignore
+
+
+def test_select_branch_and_bound_should_give_up_without_exact_window():
+    # Arrangement Phase
+    utxos = get_utxos(10_000, 20_000)
+    # Action Phase & Assertion Phase
+    assert select_branch_and_bound(utxos, target=5_000, fee_rate=0, cost_of_change=100) is None
+    assert select_branch_and_bound(utxos, target=50_000, fee_rate=0, cost_of_change=100) is None
+
+
+def test_select_knapsack_should_prefer_lowest_larger_utxo():
+    # Arrangement Phase
+    utxos = get_utxos(1_000, 2_000, 60_000, 90_000)
+    # Action Phase
+    selected = select_knapsack(utxos, target=50_000, fee_rate=0, min_change=DUST_LIMIT, rng=random.Random(1))
+    # Assertion Phase
+    assert [utxo.amount for utxo in selected] == [60_000]  # type: ignore
+
+
+def test_select_coins_should_pay_amount_fee_and_change():
+    # Arrangement Phase
+    fee_rate = 5
+    utxos = get_utxos(40_000, 70_000, 130_000, 5_000)
+    # Action Phase
+    selection = select_coins(utxos, amount=100_000, fee_rate=fee_rate, rng=random.Random(1))
+    # Assertion Phase
+    assert selection is not None
+    assert selection.amount == 100_000 + selection.fee + selection.change
+    assert selection.fee >= get_fee(len(selection.utxos), 1, fee_rate)
+    assert select_coins(utxos, amount=1_000_000, fee_rate=fee_rate) is None
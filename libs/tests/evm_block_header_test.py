@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+
+import httpx
+from clients.evm import EVMAsyncClient, EVMConfig, get_evm_async_client
+from eth_typing import ChainId
+from hexbytes import HexBytes
+from web3 import Web3
+
+BLOCK_HASH = "0x" + "ab" * 32
+PARENT_HASH = "0x" + "cd" * 32
+
+
+def get_config(**kwargs) -> EVMConfig:
+    return EVMConfig(
+        private_rpc="http://localhost:8545",
+        chain_symbol="HDR",
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(1),
+        native_decimal=18,
+        **kwargs,
+    )
+
+
+def get_batch_transport(requests: list[httpx.Request]) -> httpx.MockTransport:
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200,
+            json=[
+                # Nodes are free to return upper case hex
+                {"jsonrpc": "2.0", "id": call["id"], "result": {"hash": BLOCK_HASH.upper(), "parentHash": PARENT_HASH}}
+                for call in json.loads(request.content)
+            ],
+        )
+
+    return httpx.MockTransport(handle)
+
+
+async def test_get_block_headers_should_return_the_block_hash_of_the_transfers():
+    # Arrangement Phase
+    client = EVMAsyncClient(get_config(), logging.getLogger(__name__))
+    requests = []
+    client._http = httpx.AsyncClient(transport=get_batch_transport(requests))
+    tx = {
+        "hash": HexBytes("0x" + "01" * 32),
+        "blockNumber": 7,
+        "blockHash": HexBytes(BLOCK_HASH),
+        "to": Web3.to_checksum_address("0x72E46E170342E4879b0Ea8126389111D4275173D"),
+        "value": 1,
+        "input": HexBytes("0x"),
+    }
+    # Action Phase
+    headers = await client.get_block_headers([7])
+    transfer = client._parse_transfer(tx)  # type: ignore
+    # Assertion Phase
+    assert headers[7].hash == transfer.block_hash == BLOCK_HASH
+    assert headers[7].parent_hash == PARENT_HASH
+    assert str(requests[0].url) == "http://localhost:8545"
+    await client.close()
+
+
+def test_get_evm_async_client_should_close_the_batch_client_when_its_loop_ends():
+    # Arrangement Phase
+    chain = get_config(delay=3)
+    requests = []
+
+    async def get_headers():
+        client = get_evm_async_client(chain, logging.getLogger(__name__))
+        client._http = httpx.AsyncClient(transport=get_batch_transport(requests))
+        await client.get_block_headers([1, 2])
+        return client, client._http
+
+    # Action Phase
+    client, http = asyncio.run(get_headers())
+    # Assertion Phase
+    assert http.is_closed
+    assert client._http is None
+    assert len(requests) == 1
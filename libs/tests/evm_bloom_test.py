@@ -0,0 +1,79 @@
+import logging
+from unittest.mock import AsyncMock, MagicMock
+
+from clients.evm import EVMAsyncClient, EVMConfig
+from clients.evm.bloom import TRANSFER_EVENT_TOPIC, DepositLogsBloomFilter, get_bloom_mask
+from eth_typing import ChainId, HexStr
+from web3 import Web3
+
+DEPOSIT_ADDRESS = Web3.to_checksum_address("0x" + "11" * 20)
+TOKEN_ADDRESS = Web3.to_checksum_address("0x" + "22" * 20)
+OTHER_ADDRESS = Web3.to_checksum_address("0x" + "33" * 20)
+
+
+def _build_logs_bloom(*values: bytes) -> bytes:
+    bloom = 0
+    for value in values:
+        bloom |= get_bloom_mask(value)
+    return bloom.to_bytes(256, "big")
+
+
+def _address_topic(address: str) -> bytes:
+    return bytes(12) + Web3.to_bytes(hexstr=HexStr(address))
+
+
+def test_get_bloom_mask_should_set_three_bits_at_most():
+    mask = get_bloom_mask(TRANSFER_EVENT_TOPIC)
+
+    assert 1 <= mask.bit_count() <= 3
+    assert mask < 2**2048
+
+
+def test_deposit_bloom_filter_should_match_transfer_to_watched_address():
+    logs_bloom = _build_logs_bloom(
+        TRANSFER_EVENT_TOPIC, _address_topic(DEPOSIT_ADDRESS), Web3.to_bytes(hexstr=TOKEN_ADDRESS)
+    )
+
+    assert DepositLogsBloomFilter([DEPOSIT_ADDRESS]).may_contain_deposit(logs_bloom)
+    assert DepositLogsBloomFilter([DEPOSIT_ADDRESS], [TOKEN_ADDRESS]).may_contain_deposit(logs_bloom)
+
+
+def test_deposit_bloom_filter_should_reject_unrelated_blocks():
+    transfer_to_other = _build_logs_bloom(TRANSFER_EVENT_TOPIC, _address_topic(OTHER_ADDRESS))
+    no_transfer_event = _build_logs_bloom(_address_topic(DEPOSIT_ADDRESS))
+    other_token = _build_logs_bloom(
+        TRANSFER_EVENT_TOPIC, _address_topic(DEPOSIT_ADDRESS), Web3.to_bytes(hexstr=OTHER_ADDRESS)
+    )
+
+    assert not DepositLogsBloomFilter([DEPOSIT_ADDRESS]).may_contain_deposit(transfer_to_other)
+    assert not DepositLogsBloomFilter([DEPOSIT_ADDRESS]).may_contain_deposit(no_transfer_event)
+    assert not DepositLogsBloomFilter([DEPOSIT_ADDRESS]).may_contain_deposit(bytes(256))
+    assert not DepositLogsBloomFilter([DEPOSIT_ADDRESS], [TOKEN_ADDRESS]).may_contain_deposit(other_token)
+
+
+async def test_extract_transfer_from_block_should_only_fetch_headers_of_unrelated_blocks_by_default():
+    chain = EVMConfig(
+        private_rpc="http://localhost:8545",
+        chain_symbol="TKN",
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(1),
+        native_decimal=18,
+    )
+    client = EVMAsyncClient(chain, logging.getLogger(__name__))
+    deposit_bloom = _build_logs_bloom(TRANSFER_EVENT_TOPIC, _address_topic(DEPOSIT_ADDRESS))
+    headers = {
+        1: MagicMock(transactions=[b"tx"], logsBloom=_build_logs_bloom(TRANSFER_EVENT_TOPIC)),
+        2: MagicMock(transactions=[b"tx"], logsBloom=deposit_bloom),
+    }
+
+    async def get_block(block_number, full_transactions):
+        return MagicMock(transactions=[]) if full_transactions else headers[block_number]
+
+    client._get_block = AsyncMock(side_effect=get_block)
+    watched_addresses = {DEPOSIT_ADDRESS: 1}
+
+    for block_number in headers:
+        await client.extract_transfer_from_block(block_number, watched_addresses=watched_addresses)
+
+    fetched = [(call.args[0], call.kwargs["full_transactions"]) for call in client._get_block.await_args_list]
+    assert fetched == [(1, False), (2, False), (2, True)]
@@ -0,0 +1,61 @@
+import logging
+from unittest.mock import AsyncMock, MagicMock
+
+from clients.custom_types import TokenMetadata
+from clients.evm import EVMAsyncClient, EVMConfig
+from clients.evm.client import decode_token_symbol
+from eth_abi.abi import encode
+from eth_typing import ChainId
+from web3 import Web3
+
+TOKEN_ADDRESS = Web3.to_checksum_address("0x" + "22" * 20)
+NOT_TOKEN_ADDRESS = Web3.to_checksum_address("0x" + "33" * 20)
+NATIVE_TOKEN_ADDRESS = Web3.to_checksum_address("0x0000000000000000000000000000000000000000")
+
+
+def get_client() -> EVMAsyncClient:
+    chain = EVMConfig(
+        private_rpc="http://localhost:8545",
+        chain_symbol="TKN",
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(1),
+        native_decimal=18,
+    )
+    return EVMAsyncClient(chain, logging.getLogger(__name__))
+
+
+def test_decode_token_symbol_should_support_string_and_bytes32():
+    # Arrangement Phase
+    string_symbol = encode(["string"], ["USDT"])
+    bytes32_symbol = b"MKR".ljust(32, b"\x00")
+    # Action Phase & Assertion Phase
+    assert decode_token_symbol(True, string_symbol) == "USDT"
+    assert decode_token_symbol(True, bytes32_symbol) == "MKR"
+    assert decode_token_symbol(False, string_symbol) is None
+    assert decode_token_symbol(True, b"") is None
+
+
+async def test_get_tokens_metadata_should_resolve_all_tokens_in_one_multicall():
+    # Arrangement Phase
+    client = get_client()
+    aggregate3 = MagicMock()
+    aggregate3.return_value.call = AsyncMock(
+        return_value=[
+            (True, encode(["uint8"], [6])),
+            (True, encode(["string"], ["USDT"])),
+            (False, b""),
+            (False, b""),
+        ]
+    )
+    client._multicall = MagicMock()
+    client._multicall.functions.aggregate3 = aggregate3
+    # Action Phase
+    result = await client.get_tokens_metadata([TOKEN_ADDRESS, NOT_TOKEN_ADDRESS, NATIVE_TOKEN_ADDRESS])
+    # Assertion Phase
+    assert result == {
+        NATIVE_TOKEN_ADDRESS: TokenMetadata(decimals=18),
+        TOKEN_ADDRESS: TokenMetadata(decimals=6, symbol="USDT"),
+        NOT_TOKEN_ADDRESS: None,
+    }
+    aggregate3.assert_called_once()
+    assert [call[0] for call in aggregate3.call_args.args[0]] == [TOKEN_ADDRESS] * 2 + [NOT_TOKEN_ADDRESS] * 2
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+
+from clients import get_async_client, get_chain_handle
+from clients.evm import EVMConfig
+from eth_typing import ChainId
+
+
+def get_config(**kwargs) -> EVMConfig:
+    return EVMConfig(
+        private_rpc="http://localhost:8545",
+        chain_symbol="REG",
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(1),
+        native_decimal=18,
+        **kwargs,
+    )
+
+
+def test_get_chain_handle_should_intern_equal_configs():
+    # Arrangement Phase
+    chain = get_config()
+    # Action Phase
+    handle = get_chain_handle(chain)
+    # Assertion Phase
+    assert get_chain_handle(chain) is handle
+    assert get_chain_handle(get_config()) is handle
+    assert get_chain_handle(get_config(batch_block_size=50)) is not handle
+
+
+async def test_get_async_client_should_share_one_client_per_chain_and_loop():
+    # Arrangement Phase
+    chain = get_config(delay=7)
+    # Action Phase
+    client = get_async_client(chain, logging.getLogger("a"))
+    same_loop_client = get_async_client(chain, logging.LoggerAdapter(logging.getLogger("b")))
+    other_loop_client = await asyncio.to_thread(lambda: asyncio.run(_get_client(chain)))
+    # Assertion Phase
+    assert same_loop_client is client
+    assert client.logger.name == "a"
+    assert other_loop_client is not client
+
+
+async def _get_client(chain: EVMConfig):
+    return get_async_client(chain, logging.getLogger("c"))
+
+
+class Resource:
+    closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_get_loop_resource_should_close_the_resource_when_its_loop_ends():
+    # Arrangement Phase
+    handle = get_chain_handle(get_config(delay=8))
+
+    async def get_resource():
+        return handle.get_loop_resource("closable", Resource)
+
+    # Action Phase
+    first = asyncio.run(get_resource())
+    second = asyncio.run(get_resource())
+    # Assertion Phase
+    assert first is not second
+    assert first.closed and second.closed
@@ -0,0 +1,91 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from clients.custom_types import BlockHeader
+
+from zexporta.utils.chain_head import (
+    ChainHeadTracker,
+    HeaderRingBuffer,
+    Reorg,
+    ReorgSubscription,
+    get_chain_head_store,
+)
+
+
+def get_headers(chain: dict[int, str]):
+    async def get_block_headers(block_numbers):
+        return {number: BlockHeader(number=number, hash=chain[number]) for number in block_numbers}
+
+    return get_block_headers
+
+
+def test_header_ring_buffer_should_keep_the_last_consecutive_headers():
+    buffer = HeaderRingBuffer(3)
+
+    buffer.extend(BlockHeader(number=number, hash=f"0x{number:02x}") for number in range(1, 6))
+    assert buffer.block_numbers == range(3, 6)
+    assert buffer.get(4).hash == "0x04"  # type: ignore
+
+    buffer.truncate(3)
+    assert buffer.tail.number == 3  # type: ignore
+    buffer.extend([BlockHeader(number=9, hash="0x09")])
+    assert buffer.block_numbers == range(9, 10)
+
+
+async def test_chain_head_tracker_should_publish_heads_and_detect_reorgs(mock_client):
+    chain = {number: f"0x{number:02x}" for number in range(100, 111)}
+    mock_client.get_block_headers.side_effect = get_headers(chain)
+    mock_client.get_finalized_block_number.return_value = 100
+    store = MagicMock()
+    store.publish = AsyncMock()
+    store.publish_reorg = AsyncMock()
+    tracker = ChainHeadTracker(mock_client, store, buffer_size=16)
+
+    for latest in (105, 108):
+        mock_client.get_latest_block_number.return_value = latest
+        head, reorg = await tracker.poll()
+    assert (head.latest_block_number, head.finalized_block_number, reorg) == (108, 100, None)
+
+    chain.update({107: "0xaa", 108: "0xbb", 109: "0xcc"})
+    mock_client.get_latest_block_number.return_value = 109
+    head, reorg = await tracker.poll()
+
+    assert reorg is not None
+    assert (reorg.fork_block_number, reorg.depth) == (106, 2)
+    assert (head.latest_block_number, head.latest_block_hash) == (109, "0xcc")
+    assert tracker.buffer.get(107).hash == "0xaa"  # type: ignore
+    store.publish_reorg.assert_awaited_once_with(reorg)
+    store.publish.assert_awaited_with(head)
+
+
+async def test_reorg_subscription_should_return_the_lowest_fork_of_the_received_reorgs():
+    reorgs = [Reorg(chain_symbol="ETH", fork_block_number=number, depth=1, detected_at=0) for number in (107, 103)]
+    messages = [{"type": "subscribe", "data": 1}] + [{"type": "message", "data": r.model_dump_json()} for r in reorgs]
+    pubsub = MagicMock()
+    pubsub.get_message = AsyncMock(side_effect=[*messages, None, None])
+    subscription = ReorgSubscription(pubsub)
+
+    assert await subscription.get_fork_block_number() == 103
+    assert await subscription.get_fork_block_number() is None
+
+
+def test_get_chain_head_store_should_close_the_redis_client_of_each_finished_loop(mock_chain_config):
+    clients = []
+
+    def from_url(*args, **kwargs):
+        clients.append(MagicMock(aclose=AsyncMock()))
+        return clients[-1]
+
+    async def get_store():
+        return get_chain_head_store(mock_chain_config)
+
+    with (
+        patch("zexporta.utils.chain_head.CHAIN_HEAD_REDIS_URL", "redis://localhost"),
+        patch("zexporta.utils.chain_head.redis.from_url", side_effect=from_url),
+    ):
+        first = asyncio.run(get_store())
+        clients[0].aclose.assert_awaited_once()
+        second = asyncio.run(get_store())
+
+    assert first is not second
+    assert [client.aclose.await_count for client in clients] == [1, 1]
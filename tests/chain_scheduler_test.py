@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+from zexporta.db.chain_lease import ChainLease
+from zexporta.utils.chain_scheduler import ChainScheduler, get_fencing_token
+
+from .mock import MockChainConfig
+
+
+def get_chain(chain_symbol: str) -> MockChainConfig:
+    return MockChainConfig(private_rpc="http://example.com", chain_symbol=chain_symbol, vault_address="")
+
+
+def get_lease(chain_symbol: str, owner: str, token: int = 1) -> ChainLease:
+    return ChainLease("deposit_observer", chain_symbol, owner, token, datetime.now(timezone.utc))
+
+
+async def test_rebalance_should_take_fair_share_and_stop_workers_of_lost_leases():
+    tokens = {}
+    started = asyncio.Event()
+
+    async def worker(chain):
+        tokens[chain.chain_symbol] = get_fencing_token()
+        started.set()
+        await asyncio.Event().wait()
+
+    chains = [get_chain(chain_symbol) for chain_symbol in ("ARB", "BSC", "POL")]
+    scheduler = ChainScheduler("deposit_observer", chains, worker, "worker-1", lease_seconds=30)
+    acquire = AsyncMock(side_effect=lambda stage, chain_symbol, owner, _: get_lease(chain_symbol, owner, token=7))
+    with (
+        patch("zexporta.utils.chain_scheduler.heartbeat_stage_member", new=AsyncMock()),
+        patch("zexporta.utils.chain_scheduler.count_stage_members", new=AsyncMock(return_value=2)),
+        patch("zexporta.utils.chain_scheduler.acquire_chain_lease", new=acquire),
+        patch("zexporta.utils.chain_scheduler.renew_chain_lease", new=AsyncMock(return_value=None)),
+        patch("zexporta.utils.chain_scheduler.release_chain_lease", new=AsyncMock()) as release,
+    ):
+        await scheduler.rebalance()
+        assert sorted(scheduler.running) == ["ARB", "BSC"]
+        await started.wait()
+        tasks = [task for _, task in scheduler.running.values()]
+
+        # Both leases were taken over, so their workers stop without releasing them.
+        acquire.side_effect = lambda *args: None
+        await scheduler.rebalance()
+
+    assert scheduler.running == {}
+    assert all(task.cancelled() for task in tasks)
+    release.assert_not_awaited()
+    assert set(tokens.values()) == {7}
@@ -1,5 +1,6 @@
 import asyncio
 import os
+from functools import partial
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -7,13 +8,19 @@ from clients.abstract import ChainAsyncClient
 from pymongo import AsyncMongoClient
 from testcontainers.mongodb import MongoDbContainer
 
+from zexporta.db.db import STORAGE_BACKEND, get_db_connection
 from zexporta.utils.logger import ChainLoggerAdapter
+from zexporta.utils.token_cache import get_token_cache
 
 from .mock import MockChainConfig
 
 
 @pytest.fixture(autouse=True, scope="session")
 def setup_mongo():
+    # The memory backend keeps every collection in the process, no database is started
+    if STORAGE_BACKEND == "memory":
+        yield None
+        return
     mongo_port = int(os.environ["MONGO_PORT"])
     with MongoDbContainer("mongo:7.0.15", port=mongo_port) as mongo_container:
         with patch("pymongo.AsyncMongoClient") as client:
@@ -23,11 +30,16 @@ def setup_mongo():
 
 @pytest.fixture(autouse=True, scope="function")
 async def drop_mongo(setup_mongo):
-    db_connection = setup_mongo()
     try:
         yield
     finally:
-        await db_connection.drop_database(os.environ["MONGO_DBNAME"])
+        if setup_mongo is None:
+            database = get_db_connection()
+            for name in await database.list_collection_names():
+                await database.drop_collection(name)
+        else:
+            await setup_mongo().drop_database(os.environ["MONGO_DBNAME"])
+        get_token_cache.cache_clear()
 
 
 @pytest.fixture(autouse=True, scope="session")
@@ -45,6 +57,8 @@ def mock_chain_config():
 def mock_client(mock_chain_config):
     client = AsyncMock(spec=ChainAsyncClient)
     client.chain = mock_chain_config
+    # Resolve token metadata through the mocked `get_token_decimals`, like clients without batching do.
+    client.get_tokens_metadata.side_effect = partial(ChainAsyncClient.get_tokens_metadata, client)
     yield client
 
 
@@ -0,0 +1,34 @@
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+from bson.decimal128 import Decimal128
+
+from zexporta.db.amount import AmountDecoder, encode_amounts, sum_amounts
+
+from ..mock import MockCursor
+
+UINT256_MAX = 2**256 - 1
+
+
+def test_encode_amounts_should_keep_uint256_precision():
+    document = encode_amounts(
+        {"transfer": {"value": "10" * 17}, "amount": str(UINT256_MAX)}, ("transfer.value", "amount")
+    )
+
+    assert document["transfer"]["value"] == Decimal128("10" * 17)
+    assert document["amount"] == str(UINT256_MAX)
+    assert AmountDecoder().transform_bson(document["transfer"]["value"]) == int("10" * 17)
+    assert AmountDecoder().transform_bson(Decimal128(Decimal("1.5"))) == Decimal("1.5")
+
+
+async def test_sum_amounts_should_add_amounts_stored_as_strings():
+    collection = MagicMock()
+    collection.aggregate = AsyncMock(return_value=MockCursor([{"_id": "0xa", "total": 10}, {"_id": "0xb", "total": 1}]))
+    collection.find = MagicMock(
+        return_value=MockCursor([{"transfer": {"token": "0xa", "value": str(UINT256_MAX)}}]),
+    )
+
+    totals = await sum_amounts(collection, {"status": "pending"}, "transfer.value", group_by="transfer.token")
+
+    assert totals == {"0xa": 10 + UINT256_MAX, "0xb": 1}
+    assert collection.find.call_args.args[0] == {"status": "pending", "transfer.value": {"$type": "string"}}
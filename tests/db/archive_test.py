@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bson import Decimal128, ObjectId
+from web3 import Web3
+
+from zexporta.custom_types import ChainId, Deposit, DepositStatus, EVMConfig, EVMTransfer
+from zexporta.db.amount import get_codec_options, get_raw_collection
+from zexporta.db.archive import archive_records, get_archive_collection_name, get_archive_collection_names
+from zexporta.db.deposit import archive_deposits, insert_deposits_if_not_exists
+from zexporta.db.memory import MemoryDatabase
+
+
+def test_get_archive_collection_name_should_be_per_chain_and_month():
+    created_at = datetime(2026, 3, 5, tzinfo=timezone.utc)
+    assert get_archive_collection_name("evm_deposit", "SEP", created_at) == "evm_deposit_archive_sep_202603"
+
+
+async def test_archive_records_should_copy_by_month_then_delete():
+    records = [
+        {"_id": ObjectId.from_datetime(datetime(2026, 1, 31, tzinfo=timezone.utc)), "status": "successful"},
+        {"_id": ObjectId.from_datetime(datetime(2026, 2, 1, tzinfo=timezone.utc)), "status": "reorg"},
+    ]
+    cursor = MagicMock()
+    cursor.limit.return_value.to_list = AsyncMock(return_value=records)
+    collection = MagicMock()
+    collection.name = "evm_deposit"
+    collection.with_options.return_value = collection
+    collection.find.return_value = cursor
+    collection.delete_many = AsyncMock(return_value=MagicMock(deleted_count=2))
+    archives = {}
+
+    def get_archive(name):
+        archives.setdefault(name, MagicMock(name=name, bulk_write=AsyncMock(), create_index=AsyncMock()))
+        archives[name].name = name
+        return archives[name]
+
+    db = MagicMock()
+    db.__getitem__.side_effect = get_archive
+    with patch("zexporta.db.archive.get_db_connection", return_value=db):
+        archived = await archive_records(
+            collection,
+            "SEP",
+            {"status": {"$in": ["successful", "reorg"]}},
+            datetime(2026, 3, 1, tzinfo=timezone.utc),
+            limit=10,
+            ttl_status="reorg",
+            ttl_seconds=60,
+        )
+
+    assert archived == 2
+    assert sorted(archives) == ["evm_deposit_archive_sep_202601", "evm_deposit_archive_sep_202602"]
+    request = archives["evm_deposit_archive_sep_202602"].bulk_write.await_args.args[0][0]
+    assert request._filter == {"_id": records[1]["_id"]}
+    assert "_id" not in request._doc["$setOnInsert"]
+    delete_query = collection.delete_many.await_args.args[0]
+    assert delete_query["_id"] == {"$in": [record["_id"] for record in records]}
+    assert delete_query["status"] == {"$in": ["successful", "reorg"]}
+
+
+async def test_insert_deposits_if_not_exists_should_skip_archived_deposits():
+    chain = EVMConfig(
+        private_rpc="http://localhost",
+        native_decimal=18,
+        chain_symbol="SEP",
+        finalize_block_count=1,
+        delay=1,
+        batch_block_size=20,
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(11155111),
+    )
+    deposits = [
+        Deposit(
+            user_id=1,
+            decimals=18,
+            status=DepositStatus.SUCCESSFUL,
+            transfer=EVMTransfer(
+                tx_hash=f"0x{nonce:064x}",
+                block_number=nonce,
+                chain_symbol="SEP",
+                to=Web3.to_checksum_address("0x72E46E170342E4879b0Ea8126389111D4275173D"),
+                value=10**19,
+                token=Web3.to_checksum_address("0x0000000000000000000000000000000000000000"),
+            ),
+        )
+        for nonce in (1, 2)
+    ]
+    db = MemoryDatabase("test", codec_options=get_codec_options())
+    with (
+        patch("zexporta.db.archive.get_db_connection", return_value=db),
+        patch("zexporta.db.deposit.get_collection", return_value=db["evm_deposit"]),
+        patch("zexporta.db.deposit.get_tombstone_collection", return_value=db["evm_deposit_tombstone"]),
+        patch("zexporta.db.deposit.get_summary_collection", return_value=db["deposit_summary"]),
+    ):
+        await insert_deposits_if_not_exists(chain, deposits[:1])
+        archived = await archive_deposits(chain, datetime.now(timezone.utc) + timedelta(days=1), limit=10)
+        summary = await insert_deposits_if_not_exists(chain, deposits)
+        (archive_name,) = await get_archive_collection_names("evm_deposit", "SEP")
+
+    assert archived == 1
+    assert summary.inserted == 1
+    assert [record["transfer"]["block_number"] async for record in db["evm_deposit"].find()] == [2]
+    # Amounts above int64 are copied to the archive as the Decimal128 they are stored as
+    archived_record = await get_raw_collection(db[archive_name]).find_one({})
+    assert archived_record is not None and archived_record["transfer"]["value"] == Decimal128(str(10**19))
@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+import pytest
+
+from zexporta.db.amount import get_codec_options
+from zexporta.db.block_range import (
+    BlockRangeLeaseLost,
+    complete_block_range,
+    get_block_range_watermark,
+    insert_block_ranges,
+    iter_block_ranges,
+    lease_block_range,
+    release_block_range,
+    update_block_range_progress,
+)
+from zexporta.db.memory import MemoryDatabase
+
+
+@pytest.fixture
+def collection():
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["block_range"]
+    with patch("zexporta.db.block_range.get_collection", return_value=collection):
+        yield collection
+
+
+async def test_lease_block_range_should_take_lowest_free_range_and_resume_after_progress(collection):
+    await insert_block_ranges("ETH", iter_block_ranges(1, 25, 10))
+
+    first = await lease_block_range("ETH", "worker-1", 60)
+    second = await lease_block_range("ETH", "worker-2", 60)
+    await update_block_range_progress("ETH", 1, "worker-1", scanned_to=5, lease_seconds=60)
+    with pytest.raises(BlockRangeLeaseLost):
+        await update_block_range_progress("ETH", 1, "worker-2", scanned_to=8, lease_seconds=60)
+    await release_block_range("ETH", 1, "worker-1")
+    resumed = await lease_block_range("ETH", "worker-3", 60)
+
+    assert first is not None and (first["from_block"], first["to_block"]) == (1, 10)
+    assert second is not None and second["from_block"] == 11
+    assert resumed is not None and (resumed["from_block"], resumed["scanned_to"], resumed["owner"]) == (
+        1,
+        5,
+        "worker-3",
+    )
+
+
+async def test_lease_block_range_should_take_over_expired_leases(collection):
+    await insert_block_ranges("ETH", [(1, 10)])
+
+    await lease_block_range("ETH", "worker-1", -1)
+    taken = await lease_block_range("ETH", "worker-2", 60)
+
+    assert taken is not None and taken["owner"] == "worker-2"
+    with pytest.raises(BlockRangeLeaseLost):
+        await complete_block_range("ETH", 1, "worker-1")
+    assert await lease_block_range("ETH", "worker-3", 60) is None
+
+
+async def test_get_block_range_watermark_should_stop_at_first_range_not_done(collection):
+    await insert_block_ranges("ETH", iter_block_ranges(1, 40, 10))
+    for owner in ("worker-1", "worker-2", "worker-3"):
+        await lease_block_range("ETH", owner, 60)
+    # Ranges completed out of order only move the watermark once the gap before them is done
+    await complete_block_range("ETH", 11, "worker-2")
+    await complete_block_range("ETH", 21, "worker-3")
+    before = await get_block_range_watermark("ETH", 1)
+    await complete_block_range("ETH", 1, "worker-1")
+
+    assert before == 0
+    assert await get_block_range_watermark("ETH", 1) == 30
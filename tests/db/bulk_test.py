@@ -0,0 +1,43 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from zexporta.db.bulk import DUPLICATE_KEY_ERROR_CODE, bulk_upsert, get_field
+
+
+def test_get_field_should_read_dotted_keys():
+    assert get_field({"transfer": {"tx_hash": "0x1"}}, "transfer.tx_hash") == "0x1"
+
+
+async def test_bulk_upsert_should_send_one_request_per_chunk():
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock(return_value=MagicMock(upserted_count=2, matched_count=1, modified_count=0))
+    documents = [{"tx_hash": f"0x{i}", "index": 0} for i in range(3)]
+
+    summary = await bulk_upsert(collection, documents, ("tx_hash", "index"), insert_only=True, chunk_size=2)
+
+    assert collection.bulk_write.await_count == 2
+    requests = collection.bulk_write.await_args_list[0].args[0]
+    assert requests[0]._filter == {"tx_hash": "0x0", "index": 0}
+    assert requests[0]._doc == {"$setOnInsert": documents[0]}
+    assert (summary.inserted, summary.matched) == (4, 2)
+
+
+async def test_bulk_upsert_should_count_duplicate_keys_and_raise_other_errors():
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock(
+        side_effect=BulkWriteError(
+            {
+                "writeErrors": [{"code": DUPLICATE_KEY_ERROR_CODE}],
+                "nUpserted": 1,
+                "upserted": [{"index": 1, "_id": "id"}],
+            }
+        )
+    )
+    summary = await bulk_upsert(collection, [{"nonce": 1}, {"nonce": 2}], ("nonce",))
+    assert (summary.inserted, summary.duplicates, summary.upserted) == (1, 1, [1])
+
+    collection.bulk_write.side_effect = BulkWriteError({"writeErrors": [{"code": 121}]})
+    with pytest.raises(BulkWriteError):
+        await bulk_upsert(collection, [{"nonce": 1}], ("nonce",))
@@ -0,0 +1,33 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from zexporta.db.chain import upsert_chain_last_observed_block
+from zexporta.db.chain_lease import StaleFencingToken, acquire_chain_lease
+
+
+async def test_acquire_chain_lease_should_increment_token_and_fail_when_held():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(side_effect=[{"token": 3}, DuplicateKeyError("held")])
+    with patch("zexporta.db.chain_lease.get_collection", return_value=collection):
+        lease = await acquire_chain_lease("deposit_observer", "ETH", "worker-1", 30)
+        held = await acquire_chain_lease("deposit_observer", "ETH", "worker-2", 30)
+
+    assert lease is not None and lease.token == 3 and lease.owner == "worker-1"
+    assert held is None
+    query, update = collection.find_one_and_update.await_args_list[0].args
+    assert {"owner": None} in query["$or"]
+    assert update["$inc"] == {"token": 1}
+
+
+async def test_upsert_chain_last_observed_block_should_reject_stale_fencing_token():
+    collection = MagicMock()
+    collection.update_one = AsyncMock(side_effect=DuplicateKeyError("chain_symbol"))
+    with patch("zexporta.db.chain.get_collection", return_value=collection):
+        with pytest.raises(StaleFencingToken):
+            await upsert_chain_last_observed_block("ETH", 100, fencing_token=2)
+
+    query, update = collection.update_one.await_args.args
+    assert {"last_observed_block_fencing_token": {"$lte": 2}} in query["$or"]
+    assert update["$set"]["last_observed_block_fencing_token"] == 2
@@ -0,0 +1,80 @@
+from bson import BSON
+from bson.binary import Binary
+
+from zexporta.db.amount import encode_amount, get_codec_options, get_raw_collection
+from zexporta.db.codec import CODEC_VERSION, CODEC_VERSION_FIELD, HexSubtype, backfill
+from zexporta.db.deposit import DEPOSIT_CODEC
+from zexporta.db.memory import MemoryDatabase
+
+TX_HASH = "0x" + "ab" * 32
+BTC_TX_HASH = "cd" * 32
+ADDRESS = "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed"
+
+
+def get_document(tx_hash: str) -> dict:
+    return {
+        "transfer": {
+            "tx_hash": tx_hash,
+            "to": ADDRESS,
+            "token": "0x" + "00" * 20,
+            "chain_symbol": "SEP",
+            "block_number": 1,
+        },
+        "status": "pending",
+    }
+
+
+def test_encode_document_should_round_trip_and_shrink_the_document():
+    for tx_hash in (TX_HASH, BTC_TX_HASH):
+        document = get_document(tx_hash)
+        encoded = DEPOSIT_CODEC.encode_document(get_document(tx_hash))
+
+        assert encoded[CODEC_VERSION_FIELD] == CODEC_VERSION
+        assert encoded["transfer"]["chain_symbol"] == 1
+        assert len(BSON.encode(encoded)) < len(BSON.encode(document))
+        assert DEPOSIT_CODEC.decode_document(encoded) == document
+
+
+def test_encode_document_should_keep_values_it_cannot_restore():
+    lowercase_address = ADDRESS.lower()
+    document = get_document("not a hash")
+    document["transfer"]["to"] = lowercase_address
+    document["transfer"]["chain_symbol"] = "NEW"
+
+    encoded = DEPOSIT_CODEC.encode_document(document)
+
+    assert encoded["transfer"]["tx_hash"] == "not a hash"
+    assert encoded["transfer"]["to"].subtype == HexSubtype.PREFIXED_HEX
+    assert encoded["transfer"]["chain_symbol"] == "NEW"
+    assert DEPOSIT_CODEC.decode_document(encoded)["transfer"]["to"] == lowercase_address
+
+
+def test_encode_query_should_encode_operators_and_nested_filters():
+    query = DEPOSIT_CODEC.encode_query(
+        {
+            "status": "pending",
+            "$or": [{"transfer.tx_hash": {"$in": [TX_HASH]}}, {"transfer.chain_symbol": "BTC"}],
+        }
+    )
+
+    assert query == {
+        "status": "pending",
+        "$or": [
+            {"transfer.tx_hash": {"$in": [Binary(bytes.fromhex("ab" * 32), HexSubtype.PREFIXED_HEX)]}},
+            {"transfer.chain_symbol": 7},
+        ],
+    }
+
+
+async def test_backfill_should_keep_decimal128_amounts():
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["evm_deposit"]
+    document = get_document(TX_HASH)
+    document["transfer"]["value"] = encode_amount(10**19)
+    await collection.insert_one(document)
+
+    rewritten = await backfill(collection, DEPOSIT_CODEC)
+    record = await get_raw_collection(collection).find_one({})
+
+    assert rewritten == 1
+    assert record is not None and record[CODEC_VERSION_FIELD] == CODEC_VERSION
+    assert record["transfer"]["value"] == encode_amount(10**19)
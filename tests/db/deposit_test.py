@@ -0,0 +1,82 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from zexporta.custom_types import DepositStatus
+from zexporta.db.codec import encode_hex
+from zexporta.db.deposit import (
+    find_deposit_views_by_status,
+    get_pending_deposits_block_hashes,
+    get_pending_deposits_block_number,
+)
+
+from ..mock import MockCursor
+
+
+async def test_get_pending_deposits_block_number_should_return_distinct_page(mock_chain_config):
+    collection = MagicMock()
+    collection.aggregate = AsyncMock(return_value=MockCursor([{"_id": 10}, {"_id": 12}]))
+    with patch("zexporta.db.deposit.get_collection", return_value=collection):
+        block_numbers = await get_pending_deposits_block_number(
+            mock_chain_config, finalized_block_number=20, from_block=10, limit=2
+        )
+
+    assert block_numbers == [10, 12]
+    pipeline = collection.aggregate.await_args.args[0]
+    assert pipeline[0]["$match"]["transfer.block_number"] == {"$gte": 10, "$lte": 20}
+    assert {"$group": {"_id": "$transfer.block_number"}} in pipeline
+    assert pipeline[-1] == {"$limit": 2}
+
+
+async def test_get_pending_deposits_block_hashes_should_group_hashes_by_block(mock_chain_config):
+    collection = MagicMock()
+    collection.aggregate = AsyncMock(
+        return_value=MockCursor(
+            [{"_id": 10, "block_hashes": [encode_hex("0xaa")]}, {"_id": 12, "block_hashes": [encode_hex("0xbb"), None]}]
+        )
+    )
+    with patch("zexporta.db.deposit.get_collection", return_value=collection):
+        blocks = await get_pending_deposits_block_hashes(mock_chain_config, finalized_block_number=20, limit=2)
+
+    assert blocks == {10: {"0xaa"}, 12: {"0xbb", None}}
+    assert collection.aggregate.await_args.args[0][-1] == {"$limit": 2}
+
+
+async def test_find_deposit_views_by_status_should_match_tx_or_block_hashes(mock_chain_config):
+    cursor = MockCursor([])
+    collection = MagicMock()
+    collection.find = MagicMock(return_value=cursor)
+    with patch("zexporta.db.deposit.get_collection", return_value=collection):
+        await find_deposit_views_by_status(
+            mock_chain_config,
+            DepositStatus.PENDING,
+            fields=("transfer.tx_hash",),
+            txs_hash=["0x01"],
+            block_hashes=["0xaa"],
+        )
+
+    query = collection.find.call_args.args[0]
+    assert query["$or"] == [
+        {"transfer.tx_hash": {"$in": [encode_hex("0x01")]}},
+        {"transfer.block_hash": {"$in": [encode_hex("0xaa")]}},
+    ]
+
+
+async def test_find_deposit_views_by_status_should_project_fields(mock_chain_config):
+    cursor = MockCursor([{"transfer": {"tx_hash": "0x1", "block_number": 5}}])
+    collection = MagicMock()
+    collection.find = MagicMock(return_value=cursor)
+    with patch("zexporta.db.deposit.get_collection", return_value=collection):
+        deposits = await find_deposit_views_by_status(
+            mock_chain_config, DepositStatus.FINALIZED, fields=("transfer.tx_hash", "transfer.block_number"), limit=1
+        )
+
+    assert collection.find.call_args.kwargs["projection"] == {
+        "_id": 0,
+        "transfer.tx_hash": 1,
+        "transfer.block_number": 1,
+    }
+    assert deposits[0].transfer.tx_hash == "0x1"
+    assert deposits[0].transfer.block_number == 5
+    with pytest.raises(AttributeError):
+        _ = deposits[0].user_id
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from zexporta.db.amount import get_codec_options
+from zexporta.db.lease import LeaseHeartbeat, LeaseLost, claim_records
+from zexporta.db.memory import MemoryDatabase
+
+
+def get_collection():
+    return MemoryDatabase("test", codec_options=get_codec_options())["withdraw"]
+
+
+async def test_claim_records_should_skip_held_leases_and_take_expired_ones():
+    collection = get_collection()
+    now = datetime.now(timezone.utc)
+    await collection.insert_many(
+        [
+            {
+                "nonce": 1,
+                "status": "finalized",
+                "lease_owner": "worker-2",
+                "lease_expires_at": now + timedelta(seconds=60),
+            },
+            {
+                "nonce": 2,
+                "status": "finalized",
+                "lease_owner": "worker-3",
+                "lease_expires_at": now - timedelta(seconds=1),
+            },
+            {"nonce": 3, "status": "finalized"},
+            {"nonce": 4, "status": "finalized"},
+            {"nonce": 5, "status": "pending"},
+        ]
+    )
+
+    records = await claim_records(
+        collection, {"status": "finalized"}, "worker-1", 60, limit=5, sort=[("nonce", 1)], projection={"nonce": 1}
+    )
+
+    assert [record["nonce"] for record in records] == [2, 3, 4]
+    assert "status" not in records[0]
+    assert await collection.count_documents({"lease_owner": "worker-1"}) == 3
+
+
+async def test_claim_records_should_make_up_for_records_taken_concurrently():
+    collection = get_collection()
+    await collection.insert_many([{"nonce": nonce, "status": "finalized"} for nonce in range(4)])
+    update_many = collection.update_many
+
+    async def claim_first_elsewhere(*args, **kwargs):
+        # Another worker claims the first candidate between the read and the update
+        collection.update_many = update_many
+        await claim_records(collection, {"status": "finalized"}, "worker-2", 60, limit=1, sort=[("nonce", 1)])
+        return await update_many(*args, **kwargs)
+
+    collection.update_many = claim_first_elsewhere
+    records = await claim_records(collection, {"status": "finalized"}, "worker-1", 60, limit=2, sort=[("nonce", 1)])
+
+    assert [record["nonce"] for record in records] == [1, 2]
+    assert [record["nonce"] async for record in collection.find({"lease_owner": "worker-2"})] == [0]
+
+
+async def test_lease_heartbeat_should_detect_lost_leases_and_release():
+    collection = MagicMock()
+    collection.update_many = AsyncMock()
+    with patch("zexporta.db.lease.renew_records", new_callable=AsyncMock, return_value=1):
+        async with LeaseHeartbeat(collection, "worker-1", claimed=2, lease_seconds=0.03) as heartbeat:
+            assert heartbeat._task is not None
+            await heartbeat._task
+            with pytest.raises(LeaseLost):
+                heartbeat.check()
+
+    collection.update_many.assert_awaited_once()
+    assert collection.update_many.await_args.args[0] == {"lease_owner": "worker-1"}
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from zexporta.db.amount import encode_amount, get_codec_options, sum_amounts
+from zexporta.db.bulk import bulk_upsert
+from zexporta.db.lease import claim_records
+from zexporta.db.memory import MemoryDatabase
+from zexporta.db.transition import StatusTransitionBuffer
+
+
+def get_collection(name: str = "deposit"):
+    return MemoryDatabase("test", codec_options=get_codec_options())[name]
+
+
+async def test_bulk_upsert_should_honour_unique_indexes_and_insertion_order():
+    collection = get_collection()
+    await collection.create_index(("tx_hash", "index"), unique=True)
+    documents = [{"tx_hash": f"0x{i}", "index": 0, "block_number": 10 - i} for i in range(3)]
+
+    first = await bulk_upsert(collection, documents, ("tx_hash", "index"), insert_only=True)
+    second = await bulk_upsert(collection, documents[:2], ("tx_hash", "index"), insert_only=True)
+
+    assert (first.inserted, second.inserted, second.matched) == (3, 0, 2)
+    with pytest.raises(DuplicateKeyError):
+        await collection.insert_one({"tx_hash": "0x1", "index": 0})
+    assert [record["tx_hash"] async for record in collection.find({})] == ["0x0", "0x1", "0x2"]
+    records = await collection.find({"block_number": {"$gte": 9}}, sort=[("block_number", 1)]).to_list()
+    assert [record["block_number"] for record in records] == [9, 10]
+
+
+async def test_claim_records_should_lease_in_sort_order_until_expired():
+    collection = get_collection()
+    await collection.insert_many([{"nonce": nonce, "status": "finalized"} for nonce in (3, 1, 2)])
+
+    claimed = await claim_records(collection, {"status": "finalized"}, "worker-1", 60, limit=2, sort=[("nonce", 1)])
+    rest = await claim_records(collection, {"status": "finalized"}, "worker-2", 60, limit=5, sort=[("nonce", 1)])
+
+    assert [record["nonce"] for record in claimed] == [1, 2]
+    assert [record["nonce"] for record in rest] == [3]
+    assert await claim_records(collection, {"status": "finalized"}, "worker-3", 60, limit=5, sort=[]) == []
+
+
+async def test_transitions_and_amount_sums_should_match_mongo_semantics():
+    collection = get_collection()
+    amounts = [10**30, 7, 10**40]
+    await collection.insert_many(
+        [
+            {"nonce": i, "status": "pending", "token": "0xa", "amount": encode_amount(amount)}
+            for i, amount in enumerate(amounts)
+        ]
+    )
+    buffer = StatusTransitionBuffer(flush_interval=60)
+    futures = [
+        buffer.submit(collection, {"nonce": {"$in": [0, 1]}}, "pending", "finalized"),
+        buffer.submit(collection, {"nonce": 2}, "pending", "finalized"),
+        buffer.submit(collection, {"nonce": 0}, "pending", "reorg"),
+    ]
+    await buffer.flush()
+    for future in futures:
+        await future
+    await buffer.close()
+
+    assert await collection.count_documents({"status": "finalized"}) == 3
+    assert await sum_amounts(collection, {"status": "finalized"}, "amount", group_by="token") == {"0xa": sum(amounts)}
+
+
+async def test_find_one_and_update_should_upsert_and_expire_ttl_documents():
+    collection = get_collection("lease")
+    await collection.create_index(("stage", "chain_symbol"), unique=True)
+    now = datetime.now(timezone.utc)
+    query = {"stage": "observer", "chain_symbol": "ETH", "$or": [{"owner": None}, {"expires_at": {"$lt": now}}]}
+    update = {"$set": {"owner": "worker-1", "expires_at": now + timedelta(seconds=30)}, "$inc": {"token": 1}}
+
+    lease = await collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+    with pytest.raises(DuplicateKeyError):
+        await collection.find_one_and_update(query, update, upsert=True)
+
+    assert lease is not None
+    assert (lease["owner"], lease["token"]) == ("worker-1", 1)
+    members = collection.database["member"]
+    await members.create_index("expires_at", expireAfterSeconds=0)
+    await members.insert_many(
+        [
+            {"owner": "a", "expires_at": now - timedelta(seconds=1)},
+            {"owner": "b", "expires_at": now + timedelta(seconds=60)},
+        ]
+    )
+    assert [record["owner"] async for record in members.find()] == ["b"]
@@ -0,0 +1,24 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from zexporta.db.migration import Migration, migrate
+
+
+async def test_migrate_should_apply_only_migrations_newer_than_recorded_version():
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value={"version": 1})
+    collection.update_one = AsyncMock()
+    applied = []
+
+    def make_apply(version):
+        async def apply():
+            applied.append(version)
+
+        return apply
+
+    migrations = [Migration(version, f"v{version}", make_apply(version)) for version in (3, 1, 2)]
+    with patch("zexporta.db.migration.get_collection", return_value=collection):
+        version = await migrate(migrations)
+
+    assert applied == [2, 3]
+    assert version == 3
+    assert [call.args[0] for call in collection.update_one.await_args_list] == [{"version": 2}, {"version": 3}]
@@ -0,0 +1,54 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from pymongo.errors import OperationFailure
+
+from zexporta.db.notifier import ChangeNotifier
+
+
+class MockChangeStream:
+    def __init__(self, changes: asyncio.Queue):
+        self.changes = changes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.changes.get()
+
+
+async def test_wait_should_wake_up_on_change():
+    changes = asyncio.Queue()
+    collection = MagicMock()
+    collection.watch = AsyncMock(return_value=MockChangeStream(changes))
+    notifier = ChangeNotifier(collection, {"status": "pending"}, poll_interval=1, max_wait=1)
+
+    # The first wake up follows the stream being opened.
+    assert await notifier.wait() is True
+    changes.put_nowait({"operationType": "insert"})
+    assert await notifier.wait() is True
+    assert await notifier.wait(timeout=0.01) is False
+    await notifier.close()
+
+    pipeline = collection.watch.await_args.args[0]
+    assert pipeline[0]["$match"]["fullDocument.status"] == "pending"
+
+
+async def test_wait_should_fall_back_to_polling_without_replica_set():
+    collection = MagicMock()
+    collection.watch = AsyncMock(side_effect=OperationFailure("only supported on replica sets", 40573))
+    notifier = ChangeNotifier(collection, {"status": "pending"}, poll_interval=5, max_wait=60)
+
+    await notifier.wait()
+    with patch("zexporta.db.notifier.asyncio.sleep", new=AsyncMock()) as sleep:
+        assert await notifier.wait() is False
+
+    assert notifier.supported is False
+    sleep.assert_awaited_once_with(5)
+    await notifier.close()
@@ -0,0 +1,71 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from zexporta.custom_types import ChainId, EVMConfig
+from zexporta.db.amount import get_codec_options
+from zexporta.db.deposit import DepositPartitioning, get_collection_name
+from zexporta.db.memory import MemoryDatabase
+from zexporta.db.migration import migrate
+from zexporta.db.partition import move_deposits
+
+
+@pytest.fixture
+def sep_config():
+    return EVMConfig(
+        private_rpc="http://localhost",
+        native_decimal=18,
+        chain_symbol="SEP",
+        finalize_block_count=1,
+        delay=1,
+        batch_block_size=20,
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(11155111),
+    )
+
+
+def test_get_collection_name_should_follow_partitioning(sep_config):
+    assert get_collection_name(sep_config, DepositPartitioning.SHARED) == "evm_deposit"
+    assert get_collection_name(sep_config, DepositPartitioning.CHAIN) == "evm_deposit_sep"
+
+
+async def test_move_deposits_should_copy_then_delete_until_source_is_empty(sep_config):
+    records = [{"_id": 1, "transfer": {"tx_hash": "0x1", "chain_symbol": 1}}]
+    source = MagicMock()
+    source.with_options.return_value = source
+    source.find.return_value.limit.return_value.to_list = AsyncMock(side_effect=[records, []])
+    source.delete_many = AsyncMock(return_value=MagicMock(deleted_count=1))
+    target = MagicMock(create_index=AsyncMock())
+    db = MagicMock()
+    db.__getitem__.side_effect = {"evm_deposit": source, "evm_deposit_sep": target}.__getitem__
+
+    with (
+        patch("zexporta.db.partition.get_db_connection", return_value=db),
+        patch("zexporta.db.partition.bulk_upsert", new_callable=AsyncMock) as bulk_upsert,
+    ):
+        moved = await move_deposits(sep_config, DepositPartitioning.CHAIN)
+
+    assert moved == 1
+    assert source.find.call_args.args[0] == {"transfer.chain_symbol": {"$in": ["SEP", 1]}}
+    bulk_upsert.assert_awaited_once_with(
+        target, records, ("transfer.tx_hash", "transfer.chain_symbol"), insert_only=True
+    )
+    source.delete_many.assert_awaited_once_with({"_id": {"$in": [1]}})
+    assert ("status", "transfer.block_number") in [call.args[0] for call in target.create_index.await_args_list]
+
+
+async def test_migrate_should_index_per_chain_collections_of_configured_chains(sep_config):
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["evm_deposit_sep"]
+    migrations = MagicMock()
+    migrations.find_one = AsyncMock(return_value={"version": 1})
+    with (
+        patch("zexporta.db.migration.get_collection", return_value=migrations),
+        patch("zexporta.db.deposit.DEPOSIT_PARTITIONING", DepositPartitioning.CHAIN),
+        patch("zexporta.db.deposit.get_collection", return_value=collection),
+        patch("zexporta.config.CHAINS_CONFIG", {"SEP": sep_config}),
+    ):
+        await migrate([])
+
+    keys = [index["key"] for index in (await collection.index_information()).values()]
+    assert [("transfer.tx_hash", 1), ("transfer.chain_symbol", 1)] in keys
+    assert [("status", 1), ("transfer.block_number", 1)] in keys
@@ -0,0 +1,62 @@
+from zexporta.custom_types import UserSummary
+from zexporta.db.amount import get_codec_options
+from zexporta.db.memory import MemoryDatabase
+from zexporta.db.summary import StatusChange, apply_status_changes, find_summary, replace_summaries
+
+TOKEN = "0x0000000000000000000000000000000000000000"
+
+
+def get_collection():
+    return MemoryDatabase("test", codec_options=get_codec_options())["deposit_summary"]
+
+
+def make_change(nonce: int, from_status: str | None, to_status: str, amount: int = 10**30) -> StatusChange:
+    return StatusChange(
+        chain_symbol="SEP",
+        user_id=1,
+        key=str(nonce),
+        sort=nonce,
+        token=TOKEN,
+        amount=amount,
+        from_status=from_status,
+        to_status=to_status,
+        item={"nonce": nonce, "status": to_status},
+    )
+
+
+async def test_apply_status_changes_should_move_counts_totals_and_latest_items():
+    collection = get_collection()
+    await apply_status_changes(collection, [make_change(nonce, None, "pending") for nonce in range(4)], latest_items=2)
+    await apply_status_changes(
+        collection, [make_change(0, "pending", "successful"), make_change(3, "pending", "rejected")], latest_items=2
+    )
+    await apply_status_changes(collection, [make_change(3, "rejected", "rejected")], latest_items=2)
+
+    summary = await find_summary(collection, "SEP", 1)
+
+    assert summary.counts == {"pending": 2, "successful": 1, "rejected": 1}
+    assert summary.totals == {
+        "pending": {TOKEN: 2 * 10**30},
+        "successful": {TOKEN: 10**30},
+        "rejected": {TOKEN: 10**30},
+    }
+    # Record 0 left the two latest items and is not pushed back by its transition
+    assert summary.latest == [{"nonce": 3, "status": "rejected"}, {"nonce": 2, "status": "pending"}]
+
+
+async def test_replace_summaries_should_match_incremental_summaries():
+    incremental, rebuilt = get_collection(), get_collection()
+    await apply_status_changes(incremental, [make_change(nonce, None, "pending", amount=nonce) for nonce in range(5)])
+    await apply_status_changes(incremental, [make_change(1, "pending", "successful", amount=1)])
+
+    async def iter_changes():
+        for nonce in range(5):
+            yield make_change(nonce, None, "successful" if nonce == 1 else "pending", amount=nonce)
+
+    assert await replace_summaries(rebuilt, iter_changes(), latest_items=3) == 1
+    expected = (await find_summary(incremental, "SEP", 1)).model_copy(update={"latest": [], "updated_at": None})
+    summary = await find_summary(rebuilt, "SEP", 1)
+
+    assert summary.model_copy(update={"latest": [], "updated_at": None}) == expected
+    assert [item["nonce"] for item in summary.latest] == [4, 3, 2]
+    assert await find_summary(rebuilt, "SEP", 2) == UserSummary(user_id=2, chain_symbol="SEP")
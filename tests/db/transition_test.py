@@ -0,0 +1,115 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from zexporta.db.amount import get_codec_options
+from zexporta.db.memory import MemoryDatabase
+from zexporta.db.transition import TRANSITION_MARK_FIELD, StatusTransitionBuffer, get_transition_buffer
+
+
+async def test_flush_should_coalesce_consecutive_transitions_in_order():
+    collection = MagicMock(bulk_write=AsyncMock())
+    buffer = StatusTransitionBuffer(flush_interval=60)
+    futures = [
+        buffer.submit(collection, {"nonce": 1}, "pending", "successful"),
+        buffer.submit(collection, {"nonce": 2}, "pending", "successful"),
+        buffer.submit(collection, {"nonce": 3}, "pending", "rejected", fields={"tx_hash": "0x3"}),
+    ]
+    await buffer.flush()
+
+    await asyncio.gather(*futures)
+    requests = collection.bulk_write.await_args.args[0]
+    assert collection.bulk_write.await_args.kwargs == {"ordered": True}
+    assert [(request._filter, request._doc) for request in requests] == [
+        ({"status": "pending", "$or": [{"nonce": 1}, {"nonce": 2}]}, {"$set": {"status": "successful"}}),
+        ({"status": "pending", "nonce": 3}, {"$set": {"status": "rejected", "tx_hash": "0x3"}}),
+    ]
+    await buffer.close()
+
+
+async def test_submit_should_flush_when_batch_is_full_and_propagate_errors():
+    collection = MagicMock(bulk_write=AsyncMock(side_effect=RuntimeError("down")))
+    buffer = StatusTransitionBuffer(flush_interval=60, max_batch_size=1)
+
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(buffer.submit(collection, {"nonce": 1}, "pending", "successful"), timeout=1)
+    await buffer.close()
+
+
+async def test_flush_should_tell_observers_about_the_documents_each_run_moved():
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["withdraw"]
+    await collection.insert_many([{"nonce": nonce, "status": "pending"} for nonce in range(3)])
+    observer = MagicMock(on_transition=AsyncMock())
+    buffer = StatusTransitionBuffer(flush_interval=60)
+    futures = [
+        buffer.submit(collection, {"nonce": {"$in": [0, 1]}}, "pending", "successful", observer=observer),
+        buffer.submit(collection, {"nonce": 1}, "pending", "rejected", observer=observer),
+        buffer.submit(collection, {"nonce": 2}, "pending", "rejected", fields={"tx_hash": "0x2"}, observer=observer),
+    ]
+    await buffer.flush()
+
+    await asyncio.gather(*futures)
+    moved = [
+        ([(record["nonce"], record["status"]) for record in call.args[0]], call.args[1])
+        for call in observer.on_transition.await_args_list
+    ]
+    # The second run finds nonce 1 already moved by the first one
+    assert moved == [([(0, "successful"), (1, "successful")], "pending"), ([(2, "rejected")], "pending")]
+    record = await collection.find_one({"nonce": 2})
+    assert record is not None
+    assert record["tx_hash"] == "0x2"
+    await buffer.close()
+
+
+async def test_flush_should_read_back_the_documents_each_observed_run_moved_and_drop_the_marks():
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["withdraw"]
+    await collection.insert_many([{"nonce": nonce, "status": "pending"} for nonce in range(3)])
+    observer = MagicMock(on_transition=AsyncMock())
+    buffer = StatusTransitionBuffer(flush_interval=60)
+    bulk_write = collection.bulk_write
+
+    async def move_concurrently(requests, ordered):
+        # Another writer moves nonce 1 before the transitions are written
+        await collection.update_one({"nonce": 1}, {"$set": {"status": "rejected"}})
+        return await bulk_write(requests, ordered=ordered)
+
+    futures = [
+        buffer.submit(collection, {"nonce": {"$in": [0, 1]}}, "pending", "finalized", observer=observer),
+        buffer.submit(collection, {"nonce": 0}, "finalized", "successful", observer=observer),
+        buffer.submit(collection, {"nonce": 2}, "pending", "finalized"),
+    ]
+    with patch.object(collection, "bulk_write", side_effect=move_concurrently):
+        await buffer.flush()
+
+    await asyncio.gather(*futures)
+    records = [record async for record in collection.find(sort=[("nonce", 1)])]
+    assert [record["status"] for record in records] == ["successful", "rejected", "finalized"]
+    assert all(TRANSITION_MARK_FIELD not in record for record in records)
+    moved = [
+        ([(record["nonce"], record["status"]) for record in call.args[0]], call.args[1])
+        for call in observer.on_transition.await_args_list
+    ]
+    assert moved == [([(0, "finalized")], "pending"), ([(0, "successful")], "finalized")]
+    assert all(
+        TRANSITION_MARK_FIELD not in record
+        for call in observer.on_transition.await_args_list
+        for record in call.args[0]
+    )
+    await buffer.close()
+
+
+def test_get_transition_buffer_should_serve_consecutive_event_loops():
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["withdraw"]
+
+    async def transition(nonce: int) -> StatusTransitionBuffer:
+        await collection.insert_one({"nonce": nonce, "status": "pending"})
+        buffer = get_transition_buffer()
+        await asyncio.wait_for(buffer.submit(collection, {"nonce": nonce}, "pending", "successful"), timeout=1)
+        return buffer
+
+    first = asyncio.run(transition(1))
+    second = asyncio.run(transition(2))
+
+    assert first is not second
+    assert asyncio.run(collection.count_documents({"status": "successful"})) == 2
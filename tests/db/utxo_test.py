@@ -0,0 +1,39 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from zexporta.custom_types import UTXO
+from zexporta.db.utxo import get_spendable_utxo_cache, reserve_utxos, select_and_reserve_utxos
+
+
+def get_utxo(index: int, amount: int) -> UTXO:
+    return UTXO(tx_hash=f"{index:064x}", amount=amount, index=index, address="tb1q", salt=index)
+
+
+async def test_reserve_utxos_should_release_partial_reservation():
+    collection = MagicMock()
+    collection.update_many = AsyncMock(return_value=MagicMock(modified_count=1))
+    with patch("zexporta.db.utxo.get_collection", return_value=collection):
+        reserved = await reserve_utxos([get_utxo(1, 10_000), get_utxo(2, 20_000)], "worker-1-abc", 60)
+
+    assert not reserved
+    query, update = collection.update_many.await_args_list[0].args
+    assert len(query["$and"][0]["$or"]) == 2
+    assert update["$set"]["lease_owner"] == "worker-1-abc"
+    assert collection.update_many.await_args_list[1].args[0] == {"lease_owner": "worker-1-abc"}
+
+
+async def test_select_and_reserve_utxos_should_retry_with_fresh_utxos():
+    utxos = [get_utxo(1, 50_000), get_utxo(2, 200_000)]
+    find = AsyncMock(return_value=utxos)
+    reserve = AsyncMock(side_effect=[False, True])
+    get_spendable_utxo_cache.cache_clear()
+    with (
+        patch("zexporta.db.utxo.find_spendable_utxos", new=find),
+        patch("zexporta.db.utxo.reserve_utxos", new=reserve),
+    ):
+        result = await select_and_reserve_utxos(100_000, fee_rate=2, owner="worker-1", lease_seconds=60)
+
+    assert result is not None
+    reservation, selection = result
+    assert reservation.startswith("worker-1-")
+    assert selection.amount == 100_000 + selection.fee + selection.change
+    assert find.await_count == 2
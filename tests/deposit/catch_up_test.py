@@ -0,0 +1,52 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from zexporta.db.amount import get_codec_options
+from zexporta.db.block_range import BlockRangeStatus
+from zexporta.db.memory import MemoryDatabase
+from zexporta.deposit.catch_up import catch_up
+
+
+@pytest.fixture
+def block_ranges():
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["block_range"]
+    with patch("zexporta.db.block_range.get_collection", return_value=collection):
+        yield collection
+
+
+async def test_catch_up_should_hold_watermark_until_released_range_is_done(
+    mock_chain_config, mock_client, mock_logger, block_ranges
+):
+    later_range_scanned = asyncio.Event()
+
+    async def explore(client, from_block, to_block, *args, **kwargs):
+        if from_block == 11:
+            later_range_scanned.set()
+        elif from_block == 1 and failing:
+            # The first range fails only after a later one was scanned by the other worker
+            await later_range_scanned.wait()
+            raise ConnectionError("node unavailable")
+
+    failing = True
+    with (
+        patch("zexporta.deposit.catch_up.CATCH_UP_RANGE_SIZE", 10),
+        patch("zexporta.deposit.catch_up.CATCH_UP_WORKERS", 2),
+        patch("zexporta.deposit.catch_up.explorer", side_effect=explore),
+        patch("zexporta.deposit.catch_up.upsert_chain_last_observed_block", new_callable=AsyncMock) as upsert,
+    ):
+        held = await catch_up(mock_chain_config, mock_client, {}, 0, 30, mock_logger)
+        statuses = {record["from_block"]: record["status"] async for record in block_ranges.find()}
+        failing = False
+        advanced = await catch_up(mock_chain_config, mock_client, {}, 0, 30, mock_logger)
+
+    assert held == 0
+    assert statuses == {
+        1: BlockRangeStatus.PENDING.value,
+        11: BlockRangeStatus.DONE.value,
+        21: BlockRangeStatus.DONE.value,
+    }
+    assert advanced == 30
+    upsert.assert_awaited_once_with(mock_chain_config.chain_symbol, 30, None)
+    assert await block_ranges.count_documents({}) == 0
@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+from clients.custom_types import BlockHeader
+
+from zexporta.custom_types import DepositStatus
+from zexporta.deposit.finalizer import finalize_blocks, split_blocks
+
+BLOCKS = {1: {"0x01"}, 2: {"0x02"}, 3: {"0xstale"}, 4: {"0x04"}, 5: {None}}
+
+
+@pytest.fixture
+def transitions():
+    def submit(*args, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    manager = MagicMock()
+    with (
+        patch("zexporta.deposit.finalizer.to_finalized_block_hashes", side_effect=submit) as to_finalized_block_hashes,
+        patch("zexporta.deposit.finalizer.to_finalized", side_effect=submit) as to_finalized,
+        patch("zexporta.deposit.finalizer.to_reorg_block_numbers", side_effect=submit) as to_reorg_block_numbers,
+    ):
+        manager.attach_mock(to_finalized_block_hashes, "to_finalized_block_hashes")
+        manager.attach_mock(to_finalized, "to_finalized")
+        manager.attach_mock(to_reorg_block_numbers, "to_reorg_block_numbers")
+        yield manager
+
+
+@pytest.fixture
+def finalizer_client(mock_client):
+    async def get_block_headers(block_numbers):
+        return {number: BlockHeader(number=number, hash=f"0x{number:02x}") for number in block_numbers}
+
+    mock_client.get_block_headers.side_effect = get_block_headers
+    mock_client.get_block_tx_hash.side_effect = lambda block_number: [f"0xtx{block_number}"]
+    return mock_client
+
+
+async def test_finalize_blocks_should_fetch_the_headers_of_a_round_once(
+    mock_chain_config, finalizer_client, mock_logger, transitions
+):
+    slices = split_blocks(BLOCKS, 2)
+
+    await finalize_blocks(mock_chain_config, finalizer_client, slices, 10, asyncio.Semaphore(2), mock_logger)
+
+    assert len(slices) == 3
+    finalizer_client.get_block_headers.assert_awaited_once_with([1, 2, 3, 4, 5])
+    assert sorted(finalizer_client.get_block_tx_hash.await_args_list) == [call(3), call(5)]
+
+
+async def test_finalize_blocks_should_submit_the_transitions_of_all_slices_in_order(
+    mock_chain_config, finalizer_client, mock_logger, transitions
+):
+    slices = split_blocks(BLOCKS, 2)
+
+    await finalize_blocks(mock_chain_config, finalizer_client, slices, 10, asyncio.Semaphore(2), mock_logger)
+
+    # Finalizing comes first, so the reorg of the checked blocks only catches the deposits left pending
+    assert transitions.mock_calls == [
+        call.to_finalized_block_hashes(mock_chain_config, 10, ["0x01", "0x02", "0x04"], from_block=1),
+        call.to_finalized(mock_chain_config, 10, ["0xtx3", "0xtx5"]),
+        call.to_reorg_block_numbers(mock_chain_config, [1, 2, 3, 4, 5]),
+    ]
+
+
+async def test_finalize_blocks_should_run_the_middleware_slice_by_slice(
+    mock_chain_config, finalizer_client, mock_logger, transitions
+):
+    order = []
+
+    async def middleware(deposits):
+        order.append(deposits)
+
+    async def find_deposit_by_status(**query):
+        return [(query["from_block"], query["to_block"])]
+
+    chain = mock_chain_config.model_copy(update={"deposit_finalizer_middleware": (middleware,)})
+    with patch("zexporta.deposit.finalizer.find_deposit_by_status", side_effect=find_deposit_by_status) as find:
+        await finalize_blocks(chain, finalizer_client, split_blocks(BLOCKS, 2), 10, asyncio.Semaphore(2), mock_logger)
+
+    assert order == [[(1, 2)], [(3, 4)], [(5, 5)]]
+    assert find.await_args_list[1].kwargs == {
+        "chain": chain,
+        "status": DepositStatus.PENDING,
+        "from_block": 3,
+        "to_block": 4,
+        "txs_hash": ["0xtx3"],
+        "block_hashes": ["0x04"],
+    }
@@ -0,0 +1,58 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from zexporta.db.amount import get_codec_options
+from zexporta.db.block_range import BlockRangeStatus, insert_block_ranges, iter_block_ranges
+from zexporta.db.memory import MemoryDatabase
+from zexporta.deposit.catch_up import catch_up
+from zexporta.deposit.observer import rewind_to_fork
+
+
+@pytest.fixture
+def block_ranges():
+    collection = MemoryDatabase("test", codec_options=get_codec_options())["block_range"]
+    with patch("zexporta.db.block_range.get_collection", return_value=collection):
+        yield collection
+
+
+async def test_rewind_to_fork_should_move_the_checkpoint_back_only_for_reorgs_below_it(
+    mock_chain_config, mock_logger, block_ranges
+):
+    reorgs = MagicMock()
+    reorgs.get_fork_block_number = AsyncMock(side_effect=[None, 120, 95])
+
+    with patch("zexporta.deposit.observer.upsert_chain_last_observed_block", new_callable=AsyncMock) as upsert:
+        rewound = [await rewind_to_fork(mock_chain_config, reorgs, 100, mock_logger) for _ in range(3)]
+
+    assert rewound == [100, 100, 95]
+    upsert.assert_awaited_once_with(mock_chain_config.chain_symbol, 95, None)
+
+
+async def test_catch_up_should_advance_past_the_fork_after_a_rewind_during_catch_up(
+    mock_chain_config, mock_client, mock_logger, block_ranges
+):
+    symbol = mock_chain_config.chain_symbol
+    await insert_block_ranges(symbol, iter_block_ranges(101, 130, 10))
+    await block_ranges.update_one({"from_block": 101}, {"$set": {"status": BlockRangeStatus.DONE.value}})
+    reorgs = MagicMock(get_fork_block_number=AsyncMock(return_value=95))
+    scanned = []
+
+    async def explore(client, from_block, to_block, *args, **kwargs):
+        scanned.append((from_block, to_block))
+
+    with (
+        patch("zexporta.deposit.observer.upsert_chain_last_observed_block", new_callable=AsyncMock),
+        patch("zexporta.deposit.catch_up.upsert_chain_last_observed_block", new_callable=AsyncMock) as upsert,
+        patch("zexporta.deposit.catch_up.CATCH_UP_RANGE_SIZE", 10),
+        patch("zexporta.deposit.catch_up.CATCH_UP_WORKERS", 1),
+        patch("zexporta.deposit.catch_up.explorer", side_effect=explore),
+    ):
+        fork = await rewind_to_fork(mock_chain_config, reorgs, 100, mock_logger)
+        advanced = await catch_up(mock_chain_config, mock_client, {}, fork, 130, mock_logger)
+
+    # The range scanned before the reorg is scanned again
+    assert scanned == [(96, 105), (106, 115), (116, 125), (126, 130)]
+    assert advanced == 130
+    upsert.assert_awaited_once_with(symbol, 130, None)
+    assert await block_ranges.count_documents({}) == 0
@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from clients.custom_types import BlockHeader
+from web3 import Web3
+
+from zexporta.custom_types import ChainId, Deposit, DepositStatus, EVMConfig, EVMTransfer
+from zexporta.db.amount import get_codec_options
+from zexporta.db.chain import get_last_observed_block
+from zexporta.db.deposit import (
+    claim_deposit_views,
+    find_deposit_by_status,
+    find_user_deposit_summary,
+    get_pending_deposits_block_hashes,
+    to_reorg_with_tx_hash,
+    upsert_deposits,
+)
+from zexporta.db.memory import MemoryDatabase
+from zexporta.db.transition import StatusTransitionBuffer
+from zexporta.deposit.finalizer import finalize_blocks, split_blocks
+from zexporta.deposit.observer import persist_explored_batch
+from zexporta.explorer import ExploredBatch
+
+
+@pytest.fixture
+async def memory_db():
+    db = MemoryDatabase("test", codec_options=get_codec_options())
+    buffer = StatusTransitionBuffer(flush_interval=0.01)
+    with (
+        patch("zexporta.db.chain.get_collection", return_value=db["chain"]),
+        patch("zexporta.db.deposit.get_collection", return_value=db["evm_deposit"]),
+        patch("zexporta.db.deposit.get_tombstone_collection", return_value=db["evm_deposit_tombstone"]),
+        patch("zexporta.db.deposit.get_summary_collection", return_value=db["deposit_summary"]),
+        patch("zexporta.db.deposit.get_transition_buffer", return_value=buffer),
+    ):
+        yield db
+    await buffer.close()
+
+
+async def test_deposits_should_move_from_observer_through_finalizer_to_sa(mock_client, mock_logger, memory_db):
+    chain = EVMConfig(
+        private_rpc="http://localhost",
+        native_decimal=18,
+        chain_symbol="SEP",
+        vault_address="0x72E46E170342E4879b0Ea8126389111D4275173D",
+        chain_id=ChainId(11155111),
+    )
+    deposits = [
+        Deposit(
+            transfer=EVMTransfer(
+                tx_hash=f"0x{block_number:064x}",
+                value=10**19,
+                chain_symbol="SEP",
+                token=Web3.to_checksum_address("0x0000000000000000000000000000000000000000"),
+                to=Web3.to_checksum_address("0x72E46E170342E4879b0Ea8126389111D4275173D"),
+                block_number=block_number,
+                block_hash=block_hash,
+            ),
+            user_id=1,
+            decimals=18,
+            status=DepositStatus.PENDING,
+        )
+        for block_number, block_hash in [(10, "0x0a"), (11, "0x0b"), (12, "0xorphaned")]
+    ]
+
+    async def get_block_headers(block_numbers):
+        return {number: BlockHeader(number=number, hash=f"0x{number:02x}") for number in block_numbers}
+
+    mock_client.get_block_headers.side_effect = get_block_headers
+    # The transaction of the orphaned block did not make it into the canonical one
+    mock_client.get_block_tx_hash.return_value = []
+
+    # Observer
+    await persist_explored_batch(chain, ExploredBatch((10, 11, 12), deposits))
+
+    # Finalizer
+    blocks = await get_pending_deposits_block_hashes(chain=chain, finalized_block_number=20, limit=10)
+    await finalize_blocks(chain, mock_client, split_blocks(blocks, 2), 20, asyncio.Semaphore(2), mock_logger)
+
+    # SA
+    claimed = await claim_deposit_views(
+        chain=chain,
+        status=DepositStatus.FINALIZED,
+        fields=("transfer.tx_hash",),
+        owner="sa",
+        lease_seconds=60,
+        limit=10,
+    )
+    txs_hash = [deposit.transfer.tx_hash for deposit in claimed]
+    verified = [
+        deposit.model_copy(update={"status": DepositStatus.VERIFIED})
+        for deposit in deposits
+        if deposit.transfer.tx_hash in txs_hash
+    ]
+    await upsert_deposits(chain, verified)
+    await to_reorg_with_tx_hash(chain=chain, txs_hash=txs_hash, status=DepositStatus.FINALIZED)
+
+    assert txs_hash == [deposit.transfer.tx_hash for deposit in deposits[:2]]
+    verified = await find_deposit_by_status(chain, DepositStatus.VERIFIED)
+    reorged = await find_deposit_by_status(chain, DepositStatus.REORG)
+    assert [deposit.transfer.block_number for deposit in verified] == [10, 11]
+    assert [deposit.transfer.block_number for deposit in reorged] == [12]
+    assert await get_last_observed_block("SEP") == 12
+    summary = await find_user_deposit_summary(chain, 1)
+    assert summary.counts == {DepositStatus.VERIFIED.value: 2, DepositStatus.REORG.value: 1}
@@ -1,9 +1,17 @@
 from unittest.mock import AsyncMock, patch
 
 import pytest
-
-from zexporta.db.token import get_decimals
-from zexporta.explorer import explorer, get_accepted_deposits, get_block_batches, get_token_decimals
+from clients.custom_types import TokenMetadata, Transfer
+
+from zexporta.db.token import find_tokens_metadata
+from zexporta.explorer import (
+    ExploredBatch,
+    explorer,
+    get_accepted_deposits,
+    get_block_batches,
+    get_token_decimals,
+    iter_block_batches,
+)
 
 from .mock import MockTransfer
 
@@ -40,6 +48,15 @@ def test_get_block_batches(input_value: dict[str, int], expected_result: tuple[i
     assert result == expected_result
 
 
+def test_iter_block_batches_should_be_lazy():
+    # Action
+    batches = iter_block_batches(0, 10**12, batch_size=3)
+
+    # Assertion
+    assert next(batches) == (0, 1, 2)
+    assert next(batches) == (3, 4, 5)
+
+
 async def test_get_token_decimals_should_save_decimal_to_db(mock_client):
     # Arrangement
     expected_result = 10
@@ -50,7 +67,7 @@ async def test_get_token_decimals_should_save_decimal_to_db(mock_client):
     result = await get_token_decimals(client=mock_client, token_address=token_address)
 
     # Assertion
-    assert (await get_decimals(mock_client.chain.chain_symbol, token_address)) == expected_result
+    assert (await find_tokens_metadata(mock_client.chain.chain_symbol))[token_address].decimals == expected_result
     assert result == expected_result
 
 
@@ -113,6 +130,41 @@ async def test_get_accepted_deposits_with_sa_timestamp(mock_client):
     mock_client.get_token_decimals.assert_called_once()
 
 
+async def test_get_accepted_deposits_should_skip_transfers_of_non_tokens(mock_client):
+    transfers: list[Transfer] = [
+        MockTransfer(tx_hash="0x123", value=100, chain_symbol="ETH", token="0xABC", to="0xDEF", block_number=1),
+        MockTransfer(tx_hash="0x456", value=200, chain_symbol="ETH", token="0xBAD", to="0xDEF", block_number=2),
+    ]
+    mock_client.is_transaction_successful.return_value = True
+    mock_client.get_tokens_metadata.side_effect = None
+    mock_client.get_tokens_metadata.return_value = {"0xABC": TokenMetadata(decimals=18), "0xBAD": None}
+
+    with patch("zexporta.explorer.logger") as logger:
+        deposits = await get_accepted_deposits(mock_client, transfers, {"0xDEF": 1})
+
+    # The rest of the batch is accepted, by the observer and the validator alike
+    assert [deposit.transfer.tx_hash for deposit in deposits] == ["0x123"]
+    assert "0xBAD is not a token" in logger.warning.call_args.args[0]
+
+
+async def test_get_accepted_deposits_should_lookup_each_token_and_tx_once(mock_client):
+    transfers: list[Transfer] = [
+        MockTransfer(tx_hash="0x123", value=100, chain_symbol="ETH", token="0xABC", to="0xDEF", block_number=1),
+        MockTransfer(tx_hash="0x123", value=200, chain_symbol="ETH", token="0xABC", to="0xGHI", block_number=1),
+        MockTransfer(tx_hash="0x456", value=300, chain_symbol="ETH", token="0xABC", to="0xDEF", block_number=2),
+    ]
+    accepted_addresses = {"0xDEF": 1, "0xGHI": 2}
+
+    mock_client.is_transaction_successful.side_effect = lambda tx_hash: tx_hash == "0x123"
+    mock_client.get_token_decimals.return_value = 18
+
+    deposits = await get_accepted_deposits(mock_client, transfers, accepted_addresses)
+
+    assert [(deposit.user_id, deposit.transfer.value) for deposit in deposits] == [(1, 100), (2, 200)]
+    mock_client.get_token_decimals.assert_called_once_with("0xABC")
+    assert mock_client.is_transaction_successful.call_count == 2
+
+
 @pytest.fixture
 def mock_extract_block_logic():
     return AsyncMock(return_value=[])
@@ -186,3 +238,98 @@ async def test_explorer_with_transfers(mock_client, mock_logger):
         assert deposits[0].user_id == 1
         assert deposits[0].decimals == 18
         assert deposits[0].transfer == transfer1
+
+
+async def test_explorer_should_persist_batches_in_order(mock_client, mock_logger):
+    accepted_addresses = {"0xDEF": 1}
+
+    async def mock_extract_block_logic(block_number, **kwargs):
+        return [
+            MockTransfer(
+                tx_hash=f"0x{block_number}",
+                value=100,
+                chain_symbol="ETH",
+                token="0xABC",
+                to="0xDEF",
+                block_number=block_number,
+            )
+        ]
+
+    mock_client.is_transaction_successful.return_value = True
+    mock_client.get_token_decimals.return_value = 18
+    persisted: list[ExploredBatch] = []
+
+    async def persist_batch(batch: ExploredBatch):
+        persisted.append(batch)
+
+    deposits = await explorer(
+        mock_client,
+        1,
+        7,
+        accepted_addresses,
+        mock_extract_block_logic,  # type: ignore
+        batch_size=3,
+        persist_batch=persist_batch,
+        logger=mock_logger,
+    )
+
+    assert [batch.blocks_number for batch in persisted] == [(1, 2, 3), (4, 5, 6), (7,)]
+    assert [deposit.transfer.block_number for batch in persisted for deposit in batch.deposits] == list(range(1, 8))
+    assert len(deposits) == 7
+
+
+async def test_explorer_should_raise_when_a_stage_fails(mock_client, mock_logger, mock_extract_block_logic):
+    persist_batch = AsyncMock(side_effect=ValueError("persist failed"))
+
+    with pytest.raises(ValueError, match="persist failed"):
+        await explorer(
+            mock_client,
+            1,
+            100,
+            {},
+            mock_extract_block_logic,
+            batch_size=5,
+            persist_batch=persist_batch,
+            logger=mock_logger,
+        )
+    persist_batch.assert_awaited_once()
+
+
+async def test_explorer_should_record_failed_blocks_and_keep_going(mock_client, mock_logger):
+    accepted_addresses = {"0xDEF": 1}
+
+    async def mock_extract_block_logic(block_number, **kwargs):
+        if block_number == 2:
+            raise ValueError("block not available")
+        return [
+            MockTransfer(
+                tx_hash=f"0x{block_number}",
+                value=100,
+                chain_symbol="ETH",
+                token="0xABC",
+                to="0xDEF",
+                block_number=block_number,
+            )
+        ]
+
+    mock_client.is_transaction_successful.return_value = True
+    mock_client.get_token_decimals.return_value = 18
+    persisted: list[ExploredBatch] = []
+
+    async def persist_batch(batch: ExploredBatch):
+        persisted.append(batch)
+
+    await explorer(
+        mock_client,
+        1,
+        4,
+        accepted_addresses,
+        mock_extract_block_logic,  # type: ignore
+        batch_size=2,
+        persist_batch=persist_batch,
+        record_failed_blocks=True,
+        logger=mock_logger,
+    )
+
+    assert [batch.failed_blocks for batch in persisted] == [[2], []]
+    assert [len(batch.deposits) for batch in persisted] == [1, 2]
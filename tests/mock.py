@@ -18,3 +18,18 @@ class MockWithdraw(WithdrawRequest): ...
 class MockChainConfig(ChainConfig[MockTransfer, MockWithdraw]):
     transfer_class: type[MockTransfer] = MockTransfer
     withdraw_request_type: type[MockWithdraw] = MockWithdraw
+
+
+class MockCursor:
+    def __init__(self, records: list[dict]):
+        self.records = records
+
+    def limit(self, limit: int) -> "MockCursor":
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for record in self.records:
+            yield record
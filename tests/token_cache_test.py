@@ -0,0 +1,32 @@
+from clients.custom_types import TokenMetadata
+
+from zexporta.db.token import find_tokens_metadata
+from zexporta.utils.token_cache import TokenMetadataCache
+
+
+async def test_get_tokens_metadata_should_resolve_unknown_tokens_in_one_batch(mock_client):
+    cache = TokenMetadataCache()
+    mock_client.get_tokens_metadata.side_effect = None
+    mock_client.get_tokens_metadata.return_value = {
+        "0xABC": TokenMetadata(decimals=6, symbol="USDT"),
+        "0xDEF": None,
+    }
+
+    result = await cache.get_tokens_metadata(mock_client, ["0xABC", "0xDEF", "0xABC"])
+    cached = await cache.get_tokens_metadata(mock_client, ["0xABC", "0xDEF"])
+
+    assert result == cached == {"0xABC": TokenMetadata(decimals=6, symbol="USDT"), "0xDEF": None}
+    mock_client.get_tokens_metadata.assert_awaited_once()
+    assert sorted(mock_client.get_tokens_metadata.await_args.args[0]) == ["0xABC", "0xDEF"]
+    assert (await find_tokens_metadata(mock_client.chain.chain_symbol))["0xABC"].decimals == 6
+
+
+async def test_get_tokens_metadata_should_look_not_tokens_up_again_after_ttl(mock_client):
+    cache = TokenMetadataCache(negative_ttl=0)
+    mock_client.get_tokens_metadata.side_effect = None
+    mock_client.get_tokens_metadata.return_value = {"0xDEF": None}
+
+    await cache.get_tokens_metadata(mock_client, ["0xDEF"])
+    await cache.get_tokens_metadata(mock_client, ["0xDEF"])
+
+    assert mock_client.get_tokens_metadata.await_count == 2
@@ -1,9 +1,19 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from zexporta.db.migration import migrate
+
 from .v1 import v1 as v1_app
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await migrate()
+    yield
+
+
 def create_app():
-    app = FastAPI(name="Zexporta")
+    app = FastAPI(name="Zexporta", lifespan=lifespan)
     app.mount("/api/v1", v1_app)
     return app
@@ -4,7 +4,7 @@ from fastapi.responses import JSONResponse
 
 from zexporta.config import CHAINS_CONFIG
 from zexporta.custom_types import ChainSymbol, DepositStatus, UserId
-from zexporta.db.deposit import find_address_deposits
+from zexporta.db.deposit import find_address_deposits, find_user_deposit_summary
 
 deposit_router = APIRouter(tags=["Deposits"], prefix="/deposits")
 
@@ -19,3 +19,10 @@ async def get_user_deposits(
     address = get_compute_address_function(chain)(user_id)
     deposits = await find_address_deposits(chain, address, status)
     return JSONResponse(content=[deposit.model_dump(mode="json") for deposit in deposits])
+
+
+@deposit_router.get("/{user_id}/{chain_symbol}/summary")
+async def get_user_deposit_summary(user_id: UserId, chain_symbol: ChainSymbol) -> JSONResponse:
+    chain = CHAINS_CONFIG[chain_symbol.value]
+    summary = await find_user_deposit_summary(chain, user_id)
+    return JSONResponse(content=summary.model_dump(mode="json"))
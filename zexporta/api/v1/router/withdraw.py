@@ -3,7 +3,7 @@ from fastapi.responses import JSONResponse
 
 from zexporta.config import CHAINS_CONFIG
 from zexporta.custom_types import ChainSymbol, UserId, WithdrawStatus
-from zexporta.db.withdraw import find_user_withdraws
+from zexporta.db.withdraw import find_user_withdraw_summary, find_user_withdraws
 
 withdraw_router = APIRouter(tags=["Withdraws"], prefix="/withdraws")
 
@@ -17,3 +17,10 @@ async def get_user_withdraws(
     chain = CHAINS_CONFIG[chain_symbol.value]
     withdraws = await find_user_withdraws(chain, user_id, status)
     return JSONResponse(content=[withdraw.model_dump(mode="json") for withdraw in withdraws])
+
+
+@withdraw_router.get("/{user_id}/{chain_symbol}/summary")
+async def get_user_withdraw_summary(user_id: UserId, chain_symbol: ChainSymbol) -> JSONResponse:
+    chain = CHAINS_CONFIG[chain_symbol.value]
+    summary = await find_user_withdraw_summary(chain, user_id)
+    return JSONResponse(content=summary.model_dump(mode="json"))
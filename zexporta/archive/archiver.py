@@ -0,0 +1,58 @@
+import asyncio
+import logging.config
+from datetime import datetime, timedelta, timezone
+
+import sentry_sdk
+
+from zexporta.custom_types import ChainConfig
+from zexporta.db.deposit import archive_deposits
+from zexporta.db.migration import migrate
+from zexporta.db.withdraw import archive_withdraws
+from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
+
+from .config import (
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_DELAY_SECOND,
+    ARCHIVE_MIN_AGE_DAYS,
+    ARCHIVE_REORG_TTL_DAYS,
+    CHAINS_CONFIG,
+    LOGGER_PATH,
+    SENTRY_DNS,
+)
+
+logging.config.dictConfig(get_logger_config(logger_path=f"{LOGGER_PATH}/archiver.log"))
+logger = logging.getLogger(__name__)
+
+
+async def archive_terminal_records(chain: ChainConfig, logger: ChainLoggerAdapter):
+    created_before = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_MIN_AGE_DAYS)
+    reorg_ttl_seconds = ARCHIVE_REORG_TTL_DAYS * 24 * 3600 if ARCHIVE_REORG_TTL_DAYS is not None else None
+    while (archived := await archive_deposits(chain, created_before, ARCHIVE_BATCH_SIZE, reorg_ttl_seconds)) > 0:
+        logger.info(f"Archived {archived} deposits")
+    while (archived := await archive_withdraws(chain, created_before, ARCHIVE_BATCH_SIZE)) > 0:
+        logger.info(f"Archived {archived} withdraws")
+
+
+async def archive(chain: ChainConfig):
+    _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
+    while True:
+        try:
+            await archive_terminal_records(chain, _logger)
+        except Exception as e:
+            _logger.exception(f"Archiving raised an exception: {e}")
+        await asyncio.sleep(ARCHIVE_DELAY_SECOND)
+
+
+async def main():
+    await migrate()
+    loop = asyncio.get_running_loop()
+    tasks = [loop.create_task(archive(chain)) for chain in CHAINS_CONFIG.values()]
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    sentry_sdk.init(
+        dsn=SENTRY_DNS,
+    )
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
@@ -0,0 +1,13 @@
+import os
+
+from zexporta.config import (
+    CHAINS_CONFIG,
+    SENTRY_DNS,
+)
+
+LOGGER_PATH = "/var/log/archive/"
+ARCHIVE_DELAY_SECOND = int(os.getenv("ARCHIVE_DELAY_SECOND", 3600))
+ARCHIVE_MIN_AGE_DAYS = int(os.getenv("ARCHIVE_MIN_AGE_DAYS", 30))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 1000))
+# Reorged deposits are dropped from the archive this long after archiving, unset to keep them
+ARCHIVE_REORG_TTL_DAYS = int(os.environ["ARCHIVE_REORG_TTL_DAYS"]) if os.getenv("ARCHIVE_REORG_TTL_DAYS") else None
@@ -13,7 +13,7 @@ from .custom_types import (
     EVMConfig,
     EVMWithdrawRequest,
 )
-from .db.utxo import populate_deposits_utxos
+from .db.utxo import UTXO_DEPOSIT_FIELDS, populate_deposits_utxos
 
 ENVIRONMENT = EnvEnum(os.environ["ENV"])
 
@@ -28,6 +28,8 @@ if ENVIRONMENT == EnvEnum.PROD:
             finalize_block_count=1,
             delay=1,
             batch_block_size=20,
+            # Native deposits are accepted, so every block is downloaded with its transactions
+            scan_native_transfers=True,
             vault_address=Web3.to_checksum_address("0x72E46E170342E4879b0Ea8126389111D4275173D"),
             chain_id=ChainId(17000),
         ),
@@ -38,6 +40,8 @@ if ENVIRONMENT == EnvEnum.PROD:
             finalize_block_count=1,
             delay=1,
             batch_block_size=20,
+            # Native deposits are accepted, so every block is downloaded with its transactions
+            scan_native_transfers=True,
             vault_address=Web3.to_checksum_address("0x72E46E170342E4879b0Ea8126389111D4275173D"),
             chain_id=ChainId(11155111),
         ),
@@ -61,6 +65,7 @@ if ENVIRONMENT == EnvEnum.PROD:
             batch_block_size=5,
             vault_address="",
             deposit_finalizer_middleware=(populate_deposits_utxos,),
+            deposit_finalizer_middleware_fields=UTXO_DEPOSIT_FIELDS,
         ),
     }
     setup("testnet")
@@ -77,6 +82,8 @@ else:
             finalize_block_count=1,
             delay=1,
             batch_block_size=20,
+            # Native deposits are accepted, so every block is downloaded with its transactions
+            scan_native_transfers=True,
             vault_address=Web3.to_checksum_address("0x17a8bC4724666738387Ef5Fc59F7EF835AF60979"),
             chain_id=ChainId(17000),
         ),
@@ -87,6 +94,8 @@ else:
             finalize_block_count=1,
             delay=1,
             batch_block_size=20,
+            # Native deposits are accepted, so every block is downloaded with its transactions
+            scan_native_transfers=True,
             vault_address=Web3.to_checksum_address("0x17a8bC4724666738387Ef5Fc59F7EF835AF60979"),
             chain_id=ChainId(11155111),
         ),
@@ -110,6 +119,7 @@ else:
         #     batch_block_size=5,
         #     vault_address="",
         #     deposit_finalizer_middleware=(populate_deposits_utxos,),
+        #     deposit_finalizer_middleware_fields=UTXO_DEPOSIT_FIELDS,
         # ),
     }
     # setup("testnet")
@@ -134,6 +144,9 @@ EVM_VAULT_DEPOSITOR_PRIVATE_KEY = os.environ["EVM_VAULT_DEPOSITOR_PRIVATE_KEY"]
 
 SENTRY_DNS = os.getenv("SENTRY_DNS")
 
+# Upper bound on how long a stage waits for a change stream event before it queries anyway
+CHANGE_STREAM_MAX_WAIT_SECONDS = int(os.getenv("CHANGE_STREAM_MAX_WAIT_SECONDS", 60))
+
 MONGO_HOST = os.environ["MONGO_HOST"]
 MONGO_PORT = os.environ["MONGO_PORT"]
 MONGO_DBNAME = os.environ.get("MONGO_DBNAME", "transaction_database")
@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import StrEnum
 from typing import Any
 
@@ -6,6 +7,7 @@ from clients.custom_types import (
     Address,
     BlockNumber,
     ChainConfig,
+    TokenMetadata,
     Transfer,
     TxHash,
     Value,
@@ -94,8 +96,21 @@ class ZexUserAsset(BaseModel):
     withdrawing: str
 
 
+class UserSummary(BaseModel):
+    user_id: UserId
+    chain_symbol: str
+    # Number of records in each status
+    counts: dict[str, int] = Field(default_factory=dict)
+    # Total amount of each token, by status
+    totals: dict[str, dict[str, Value]] = Field(default_factory=dict)
+    # The most recent records, newest first
+    latest: list[dict[str, Any]] = Field(default_factory=list)
+    updated_at: datetime | None = None
+
+
 __all__ = [
     "ZexUserAsset",
+    "UserSummary",
     "WithdrawRequest",
     "EVMWithdrawRequest",
     "BTCWithdrawRequest",
@@ -103,6 +118,7 @@ __all__ = [
     "Deposit",
     "SaDepositSchema",
     "Token",
+    "TokenMetadata",
     "WithdrawStatus",
     "DepositStatus",
     "ChainSymbol",
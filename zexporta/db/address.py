@@ -2,10 +2,9 @@ import asyncio
 import logging
 import os
 from concurrent.futures import ProcessPoolExecutor
-from functools import lru_cache
 from typing import Iterable
 
-from clients import get_compute_address_function
+from clients import get_chain_handle, get_compute_address_function
 from pymongo import DESCENDING
 from web3 import Web3
 
@@ -26,13 +25,11 @@ from zexporta.utils.zex_api import (
 from .db import get_db_connection
 
 
-async def __create_address_index(collection):
-    await collection.create_index("user_id", unique=True)
-    await collection.create_index("address", unique=True)
+def get_collection(chain: ChainConfig):
+    return get_chain_handle(chain).get_resource("address_collection", lambda: _get_collection(chain))
 
 
-@lru_cache()
-def get_collection(chain: ChainConfig):
+def _get_collection(chain: ChainConfig):
     match chain:
         case EVMConfig():
             collection = get_db_connection()["evm_address"]
@@ -40,7 +37,6 @@ def get_collection(chain: ChainConfig):
             collection = get_db_connection()["btc_address"]
         case _:
             raise NotImplementedError()
-    asyncio.run_coroutine_threadsafe(__create_address_index(collection), asyncio.get_event_loop())
     return collection
 
 
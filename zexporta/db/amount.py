@@ -0,0 +1,69 @@
+from decimal import Decimal
+from typing import Any, Iterable
+
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
+from bson.decimal128 import Decimal128
+
+from .bulk import get_field
+
+# Decimal128 holds 34 significant digits exactly; larger uint256 amounts stay decimal strings.
+DECIMAL128_MAX_DIGITS = 34
+
+
+def encode_amount(value: int | str) -> Decimal128 | str:
+    digits = str(value)
+    if len(digits.lstrip("-")) > DECIMAL128_MAX_DIGITS:
+        return digits
+    return Decimal128(Decimal(digits))
+
+
+def encode_amounts(document: dict[str, Any], fields: Iterable[str]) -> dict[str, Any]:
+    """Store the dotted amount `fields` of a JSON dumped document as `Decimal128`, in place."""
+    for field in fields:
+        *parents, name = field.split(".")
+        parent = get_field(document, ".".join(parents)) if parents else document
+        parent[name] = encode_amount(parent[name])
+    return document
+
+
+class AmountDecoder(TypeDecoder):
+    """Decode stored `Decimal128` amounts back to `int` so models and sums see plain integers."""
+
+    bson_type = Decimal128  # type: ignore
+
+    def transform_bson(self, value: Decimal128) -> int | Decimal:
+        decimal = value.to_decimal()
+        return int(decimal) if decimal == decimal.to_integral_value() else decimal
+
+
+def get_codec_options() -> CodecOptions:
+    return CodecOptions(type_registry=TypeRegistry([AmountDecoder()]))
+
+
+def get_raw_collection(collection):
+    """Return `collection` reading amounts as stored, for copies written back without a model.
+
+    Decoded amounts are plain ints, which would be written back as int64 or overflow it.
+    """
+    return collection.with_options(codec_options=CodecOptions())
+
+
+async def sum_amounts(collection, match: dict[str, Any], field: str, group_by: str | None = None) -> dict[Any, int]:
+    """Sum the amount `field` of the documents matching `match`, grouped by the `group_by` field.
+
+    The sum runs in the database; the rare amounts too large for `Decimal128` are stored as
+    strings, which `$sum` skips, so those are fetched and added here to keep totals exact.
+    """
+    group_key = f"${group_by}" if group_by is not None else None
+    cursor = await collection.aggregate(
+        [
+            {"$match": match},
+            {"$group": {"_id": group_key, "total": {"$sum": f"${field}"}}},
+        ]
+    )
+    totals: dict[Any, int] = {record["_id"]: int(record["total"]) async for record in cursor}
+    projection = {field: 1} | ({group_by: 1} if group_by is not None else {})
+    async for record in collection.find(match | {field: {"$type": "string"}}, projection=projection):
+        key = get_field(record, group_by) if group_by is not None else None
+        totals[key] = totals.get(key, 0) + int(get_field(record, field))
+    return totals
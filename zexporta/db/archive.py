@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, AsyncIterator, Sequence
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from .amount import get_raw_collection
+from .bulk import bulk_upsert, get_field
+from .db import get_db_connection
+
+_archive_indexes_created: set[str] = set()
+
+
+def get_archive_collection_prefix(collection_name: str, chain_symbol: str) -> str:
+    return f"{collection_name}_archive_{chain_symbol.lower()}_"
+
+
+def get_archive_collection_name(collection_name: str, chain_symbol: str, created_at: datetime) -> str:
+    """Name the archive of `collection_name` holding the records of one chain created in one month."""
+    return f"{get_archive_collection_prefix(collection_name, chain_symbol)}{created_at:%Y%m}"
+
+
+def get_tombstone_collection_name(collection_name: str) -> str:
+    """Name the collection keeping the keys of the archived records of `collection_name`."""
+    return f"{collection_name}_tombstone"
+
+
+async def get_archive_collection_names(collection_name: str, chain_symbol: str) -> list[str]:
+    """Return the archive collections of a chain, most recent month first."""
+    prefix = get_archive_collection_prefix(collection_name, chain_symbol)
+    names = await get_db_connection().list_collection_names(filter={"name": {"$regex": f"^{prefix}"}})
+    return sorted(names, reverse=True)
+
+
+async def _create_archive_indexes(
+    collection,
+    indexes: Sequence[Sequence[str]],
+    ttl_status: str | None,
+    ttl_seconds: int | None,
+):
+    if collection.name in _archive_indexes_created:
+        return
+    for index in indexes:
+        await collection.create_index(index)
+    if ttl_status is not None and ttl_seconds is not None:
+        await collection.create_index(
+            "archived_at",
+            expireAfterSeconds=ttl_seconds,
+            partialFilterExpression={"status": ttl_status},
+        )
+    _archive_indexes_created.add(collection.name)
+
+
+def _without_id(record: dict[str, Any]) -> dict[str, Any]:
+    return {key: value for key, value in record.items() if key != "_id"}
+
+
+def _get_key_document(record: dict[str, Any], key_fields: Sequence[str]) -> dict[str, Any]:
+    document: dict[str, Any] = {}
+    for key_field in key_fields:
+        *parents, name = key_field.split(".")
+        target = document
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[name] = get_field(record, key_field)
+    return document
+
+
+async def archive_records(
+    collection,
+    chain_symbol: str,
+    query: dict[str, Any],
+    created_before: datetime,
+    limit: int,
+    archive_name: str | None = None,
+    indexes: Sequence[Sequence[str]] = (),
+    ttl_status: str | None = None,
+    ttl_seconds: int | None = None,
+    tombstone_key_fields: Sequence[str] = (),
+) -> int:
+    """Move up to `limit` records matching `query` and created before `created_before` to the archive.
+
+    The creation time is read from the `ObjectId`, so no extra field is needed on the hot records.
+    Records are copied first and deleted afterwards; both steps are idempotent, so an interrupted
+    run is completed by the next one. Archive collections get `indexes` and, when `ttl_seconds` is
+    set, a TTL index expiring records in `ttl_status` that long after they were archived.
+    Archives are named after `archive_name`, which defaults to the name of `collection`.
+    With `tombstone_key_fields`, the keys of the records are also kept in the tombstone collection
+    of `archive_name`, so writers can tell an archived record from a new one once the unique
+    index of `collection` no longer holds it.
+    Return the number of records removed from `collection`.
+    """
+    query = query | {"_id": {"$lt": ObjectId.from_datetime(created_before)}}
+    records = await get_raw_collection(collection).find(query, sort=[("_id", 1)]).limit(limit).to_list()
+    if len(records) == 0:
+        return 0
+
+    archived_at = datetime.now(timezone.utc)
+    db = get_db_connection()
+    archive_name = archive_name or collection.name
+    for name, month_records in groupby(
+        records,
+        key=lambda record: get_archive_collection_name(archive_name, chain_symbol, record["_id"].generation_time),
+    ):
+        archive_collection = db[name]
+        await _create_archive_indexes(archive_collection, indexes, ttl_status, ttl_seconds)
+        await archive_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": record["_id"]},
+                    {"$setOnInsert": {**_without_id(record), "archived_at": archived_at}},
+                    upsert=True,
+                )
+                for record in month_records
+            ],
+            ordered=False,
+        )
+    if tombstone_key_fields:
+        await bulk_upsert(
+            db[get_tombstone_collection_name(archive_name)],
+            (_get_key_document(record, tombstone_key_fields) for record in records),
+            tombstone_key_fields,
+            insert_only=True,
+        )
+    result = await collection.delete_many(query | {"_id": {"$in": [record["_id"] for record in records]}})
+    return result.deleted_count
+
+
+async def iter_archived_records(
+    collection_name: str,
+    chain_symbol: str,
+    query: dict[str, Any],
+    sort: list[tuple[str, int]],
+) -> AsyncIterator[dict[str, Any]]:
+    """Yield archived records matching `query`, month by month from the most recent one."""
+    for name in await get_archive_collection_names(collection_name, chain_symbol):
+        async for record in get_db_connection()[name].find(query, projection={"archived_at": 0}, sort=sort):
+            yield record
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+from enum import StrEnum
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+from zexporta.custom_types import BlockNumber
+
+from .db import get_db_connection
+
+
+class BlockRangeStatus(StrEnum):
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+
+
+class BlockRangeLeaseLost(Exception):
+    """Raise when a block range lease has been taken over by another worker"""
+
+
+@lru_cache()
+def get_collection():
+    return get_db_connection()["block_range"]
+
+
+def iter_block_ranges(
+    from_block: BlockNumber,
+    to_block: BlockNumber,
+    range_size: int,
+) -> Iterator[tuple[BlockNumber, BlockNumber]]:
+    for start in range(from_block, to_block + 1, range_size):
+        yield start, min(start + range_size - 1, to_block)
+
+
+async def insert_block_ranges(chain_symbol: str, block_ranges: Iterable[tuple[BlockNumber, BlockNumber]]):
+    requests = [
+        UpdateOne(
+            {"chain_symbol": chain_symbol, "from_block": from_block},
+            {
+                "$setOnInsert": {
+                    "to_block": to_block,
+                    "scanned_to": from_block - 1,
+                    "status": BlockRangeStatus.PENDING.value,
+                }
+            },
+            upsert=True,
+        )
+        for from_block, to_block in block_ranges
+    ]
+    if requests:
+        await get_collection().bulk_write(requests, ordered=False)
+
+
+async def get_last_block_range_end(chain_symbol: str) -> BlockNumber | None:
+    record = await get_collection().find_one(
+        {"chain_symbol": chain_symbol},
+        projection={"to_block": 1},
+        sort=[("from_block", DESCENDING)],
+    )
+    return record["to_block"] if record else None
+
+
+async def lease_block_range(chain_symbol: str, owner: str, lease_seconds: int | float) -> dict | None:
+    """Take the lowest range that is pending or whose lease expired.
+
+    The returned record carries `scanned_to`, so a range abandoned by a dead worker resumes
+    after its last persisted batch.
+    """
+    now = datetime.now(timezone.utc)
+    return await get_collection().find_one_and_update(
+        {
+            "chain_symbol": chain_symbol,
+            "$or": [
+                {"status": BlockRangeStatus.PENDING.value},
+                {"status": BlockRangeStatus.LEASED.value, "lease_expires_at": {"$lt": now}},
+            ],
+        },
+        {
+            "$set": {
+                "status": BlockRangeStatus.LEASED.value,
+                "owner": owner,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            }
+        },
+        sort=[("from_block", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def update_block_range_progress(
+    chain_symbol: str,
+    from_block: BlockNumber,
+    owner: str,
+    scanned_to: BlockNumber,
+    lease_seconds: int | float,
+):
+    result = await get_collection().update_one(
+        {
+            "chain_symbol": chain_symbol,
+            "from_block": from_block,
+            "owner": owner,
+            "status": BlockRangeStatus.LEASED.value,
+        },
+        {
+            "$set": {
+                "scanned_to": scanned_to,
+                "lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds),
+            }
+        },
+    )
+    if result.matched_count == 0:
+        raise BlockRangeLeaseLost(f"Lease of range starting at {from_block} is not owned by {owner}")
+
+
+async def complete_block_range(chain_symbol: str, from_block: BlockNumber, owner: str):
+    result = await get_collection().update_one(
+        {
+            "chain_symbol": chain_symbol,
+            "from_block": from_block,
+            "owner": owner,
+            "status": BlockRangeStatus.LEASED.value,
+        },
+        {"$set": {"status": BlockRangeStatus.DONE.value}, "$unset": {"lease_expires_at": ""}},
+    )
+    if result.matched_count == 0:
+        raise BlockRangeLeaseLost(f"Lease of range starting at {from_block} is not owned by {owner}")
+
+
+async def release_block_range(chain_symbol: str, from_block: BlockNumber, owner: str):
+    await get_collection().update_one(
+        {
+            "chain_symbol": chain_symbol,
+            "from_block": from_block,
+            "owner": owner,
+            "status": BlockRangeStatus.LEASED.value,
+        },
+        {"$set": {"status": BlockRangeStatus.PENDING.value}, "$unset": {"owner": "", "lease_expires_at": ""}},
+    )
+
+
+async def get_block_range_watermark(chain_symbol: str, from_block: BlockNumber) -> BlockNumber:
+    """Return the last block of the contiguous run of done ranges starting at `from_block`."""
+    watermark = from_block - 1
+    async for record in get_collection().find(
+        {"chain_symbol": chain_symbol, "from_block": {"$gte": from_block}},
+        projection={"from_block": 1, "to_block": 1, "status": 1},
+        sort=[("from_block", ASCENDING)],
+    ):
+        if record["from_block"] != watermark + 1 or record["status"] != BlockRangeStatus.DONE.value:
+            break
+        watermark = record["to_block"]
+    return watermark
+
+
+async def delete_done_block_ranges(chain_symbol: str, to_block: BlockNumber):
+    await get_collection().delete_many(
+        {
+            "chain_symbol": chain_symbol,
+            "status": BlockRangeStatus.DONE.value,
+            "to_block": {"$lte": to_block},
+        }
+    )
+
+
+async def delete_block_ranges_after(chain_symbol: str, block_number: BlockNumber):
+    """Drop the ranges reaching past `block_number`, whatever their status, so they are split again."""
+    await get_collection().delete_many({"chain_symbol": chain_symbol, "to_block": {"$gt": block_number}})
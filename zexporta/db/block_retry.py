@@ -0,0 +1,46 @@
+from functools import lru_cache
+from typing import Iterable
+
+from pymongo import ASCENDING, UpdateOne
+
+from zexporta.custom_types import BlockNumber
+
+from .db import get_db_connection
+
+
+@lru_cache()
+def get_collection():
+    return get_db_connection()["block_retry"]
+
+
+async def insert_retry_blocks(chain_symbol: str, blocks_number: Iterable[BlockNumber]):
+    requests = [
+        UpdateOne(
+            {"chain_symbol": chain_symbol, "block_number": block_number},
+            {"$setOnInsert": {"attempts": 0}},
+            upsert=True,
+        )
+        for block_number in blocks_number
+    ]
+    if requests:
+        await get_collection().bulk_write(requests, ordered=False)
+
+
+async def get_retry_blocks(chain_symbol: str, limit: int = 0) -> list[BlockNumber]:
+    cursor = get_collection().find(
+        {"chain_symbol": chain_symbol},
+        projection={"block_number": 1},
+        sort=[("block_number", ASCENDING)],
+    )
+    return [record["block_number"] async for record in cursor.limit(limit)]
+
+
+async def increase_retry_attempts(chain_symbol: str, blocks_number: list[BlockNumber]):
+    await get_collection().update_many(
+        {"chain_symbol": chain_symbol, "block_number": {"$in": blocks_number}},
+        {"$inc": {"attempts": 1}},
+    )
+
+
+async def delete_retry_blocks(chain_symbol: str, blocks_number: list[BlockNumber]):
+    await get_collection().delete_many({"chain_symbol": chain_symbol, "block_number": {"$in": blocks_number}})
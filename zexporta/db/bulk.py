@@ -0,0 +1,84 @@
+from dataclasses import dataclass, field
+from itertools import batched
+from typing import Any, Iterable, Sequence
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+BULK_WRITE_CHUNK_SIZE = 1000
+
+
+@dataclass
+class BulkWriteSummary:
+    inserted: int = 0
+    matched: int = 0
+    modified: int = 0
+    duplicates: int = 0
+    # Positions of the inserted documents among the documents written
+    upserted: list[int] = field(default_factory=list, compare=False, repr=False)
+
+    def add(self, inserted: int, matched: int, modified: int, duplicates: int = 0, upserted: Iterable[int] = ()):
+        self.inserted += inserted
+        self.matched += matched
+        self.modified += modified
+        self.duplicates += duplicates
+        self.upserted.extend(upserted)
+
+
+def get_field(document: dict[str, Any], field: str) -> Any:
+    """Read a dotted `field` such as `transfer.tx_hash` from a nested document."""
+    value: Any = document
+    for part in field.split("."):
+        value = value[part]
+    return value
+
+
+async def bulk_upsert(
+    collection,
+    documents: Iterable[dict[str, Any]],
+    key_fields: Sequence[str],
+    *,
+    insert_only: bool = False,
+    chunk_size: int = BULK_WRITE_CHUNK_SIZE,
+) -> BulkWriteSummary:
+    """Upsert `documents` matched on `key_fields` with one unordered `bulk_write` per chunk.
+
+    With `insert_only`, existing documents are left untouched (`$setOnInsert`), otherwise they
+    are overwritten (`$set`). Duplicate key errors, raised when a concurrent writer inserts the
+    same key between the match and the insert, count as `duplicates` instead of failing.
+    """
+    operator = "$setOnInsert" if insert_only else "$set"
+    summary = BulkWriteSummary()
+    offset = 0
+    for chunk in batched(documents, chunk_size):
+        requests = [
+            UpdateOne(
+                {field: get_field(document, field) for field in key_fields},
+                {operator: document},
+                upsert=True,
+            )
+            for document in chunk
+        ]
+        try:
+            result = await collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY_ERROR_CODE for error in write_errors):
+                raise
+            summary.add(
+                e.details.get("nUpserted", 0),
+                e.details.get("nMatched", 0),
+                e.details.get("nModified", 0),
+                duplicates=len(write_errors),
+                upserted=[offset + upserted["index"] for upserted in e.details.get("upserted", [])],
+            )
+        else:
+            summary.add(
+                result.upserted_count,
+                result.matched_count,
+                result.modified_count,
+                upserted=[offset + index for index in result.upserted_ids or {}],
+            )
+        offset += len(chunk)
+    return summary
@@ -1,29 +1,46 @@
-import asyncio
 from functools import lru_cache
+from typing import Any
+
+from pymongo.errors import DuplicateKeyError
 
 from zexporta.custom_types import BlockNumber
 
+from .chain_lease import StaleFencingToken
 from .db import get_db_connection
 
 
 @lru_cache()
 def get_collection():
-    _chain_collection = get_db_connection()["chain"]
-    asyncio.run_coroutine_threadsafe(
-        _chain_collection.create_index("chain_symbol", unique=True), asyncio.get_event_loop()
-    )
-    return _chain_collection
+    return get_db_connection()["chain"]
 
 
-async def upsert_chain_last_observed_block(chain_symbol: str, block_number: BlockNumber):
-    query = {"chain_symbol": chain_symbol}
+async def upsert_chain_last_observed_block(
+    chain_symbol: str, block_number: BlockNumber, fencing_token: int | None = None
+):
+    """Move the observer checkpoint of `chain_symbol` to `block_number`.
+
+    With a `fencing_token`, the write is rejected with `StaleFencingToken` once a newer chain
+    lease holder wrote the checkpoint, so an observer that stalled past its lease never moves
+    the checkpoint of its successor.
+    """
+    query: dict[str, Any] = {"chain_symbol": chain_symbol}
     update = {
         "$set": {
             "last_observed_block": block_number,
         }
     }
+    if fencing_token is not None:
+        query["$or"] = [
+            {"last_observed_block_fencing_token": None},
+            {"last_observed_block_fencing_token": {"$lte": fencing_token}},
+        ]
+        update["$set"]["last_observed_block_fencing_token"] = fencing_token
 
-    result = await get_collection().update_one(query, update, upsert=True)
+    try:
+        result = await get_collection().update_one(query, update, upsert=True)
+    except DuplicateKeyError as e:
+        # The filter missed the existing document, so the upsert collided with its chain symbol.
+        raise StaleFencingToken(f"Fencing token {fencing_token} of {chain_symbol} is stale") from e
     return result
 
 
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .db import get_db_connection
+
+
+class StaleFencingToken(Exception):
+    """Raise when a write carries the fencing token of a chain lease that was taken over"""
+
+
+@dataclass(frozen=True)
+class ChainLease:
+    stage: str
+    chain_symbol: str
+    owner: str
+    # Increases every time the lease changes hands, so writes of a former holder can be rejected
+    token: int
+    expires_at: datetime
+
+
+@lru_cache()
+def get_collection():
+    return get_db_connection()["chain_lease"]
+
+
+@lru_cache()
+def get_member_collection():
+    return get_db_connection()["stage_member"]
+
+
+async def acquire_chain_lease(
+    stage: str, chain_symbol: str, owner: str, lease_seconds: int | float
+) -> ChainLease | None:
+    """Lease `chain_symbol` to `owner` for `stage` when it is free or expired, `None` otherwise.
+
+    Every acquisition increments the fencing token of the lease. A lease that does not exist yet
+    is created; when another replica holds it, the upsert conflicts with the unique
+    `(stage, chain_symbol)` index and the lease is not acquired.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=lease_seconds)
+    query = {
+        "stage": stage,
+        "chain_symbol": chain_symbol,
+        "$or": [{"owner": None}, {"expires_at": {"$lt": now}}],
+    }
+    update = {
+        "$set": {"owner": owner, "expires_at": expires_at},
+        "$inc": {"token": 1},
+    }
+    try:
+        record = await get_collection().find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None
+    if record is None:
+        return None
+    return ChainLease(
+        stage=stage,
+        chain_symbol=chain_symbol,
+        owner=owner,
+        token=record["token"],
+        expires_at=expires_at,
+    )
+
+
+async def renew_chain_lease(lease: ChainLease, lease_seconds: int | float) -> ChainLease | None:
+    """Extend `lease`, `None` when it was taken over since it was acquired."""
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+    result = await get_collection().update_one(
+        {"stage": lease.stage, "chain_symbol": lease.chain_symbol, "owner": lease.owner, "token": lease.token},
+        {"$set": {"expires_at": expires_at}},
+    )
+    if result.matched_count == 0:
+        return None
+    return ChainLease(
+        stage=lease.stage,
+        chain_symbol=lease.chain_symbol,
+        owner=lease.owner,
+        token=lease.token,
+        expires_at=expires_at,
+    )
+
+
+async def release_chain_lease(lease: ChainLease):
+    await get_collection().update_one(
+        {"stage": lease.stage, "chain_symbol": lease.chain_symbol, "owner": lease.owner, "token": lease.token},
+        {"$set": {"owner": None, "expires_at": None}},
+    )
+
+
+async def heartbeat_stage_member(stage: str, owner: str, lease_seconds: int | float):
+    """Announce `owner` as a live replica of `stage` for the next `lease_seconds`."""
+    await get_member_collection().update_one(
+        {"stage": stage, "owner": owner},
+        {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)}},
+        upsert=True,
+    )
+
+
+async def count_stage_members(stage: str) -> int:
+    return await get_member_collection().count_documents(
+        {"stage": stage, "expires_at": {"$gte": datetime.now(timezone.utc)}}
+    )
+
+
+async def remove_stage_member(stage: str, owner: str):
+    await get_member_collection().delete_one({"stage": stage, "owner": owner})
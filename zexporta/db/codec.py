@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from enum import IntEnum
+from itertools import batched
+from typing import Any
+
+from bson.binary import Binary
+from pymongo import ReplaceOne
+from web3 import Web3
+
+from zexporta.custom_types import ChainSymbol
+
+from .amount import get_raw_collection
+from .db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+CODEC_VERSION = 1
+CODEC_VERSION_FIELD = "_codec"
+BACKFILL_BATCH_SIZE = 1000
+
+# Codes are persisted, never renumber them; only append new chains.
+CHAIN_CODES: dict[str, int] = {
+    ChainSymbol.SEP.value: 1,
+    ChainSymbol.BST.value: 2,
+    ChainSymbol.HOL.value: 3,
+    ChainSymbol.POL.value: 4,
+    ChainSymbol.BSC.value: 5,
+    ChainSymbol.OPT.value: 6,
+    ChainSymbol.BTC.value: 7,
+}
+CHAIN_SYMBOLS: dict[int, str] = {code: symbol for symbol, code in CHAIN_CODES.items()}
+
+_PREFIXED_HEX = re.compile(r"0x(?:[0-9a-f]{2})+")
+_BARE_HEX = re.compile(r"(?:[0-9a-f]{2})+")
+_ADDRESS = re.compile(r"0x[0-9a-fA-F]{40}")
+
+
+class HexSubtype(IntEnum):
+    """User defined BSON binary subtypes recording the text form a value is decoded back to."""
+
+    PREFIXED_HEX = 0x80
+    BARE_HEX = 0x81
+    CHECKSUM_ADDRESS = 0x82
+
+
+def encode_hex(value: Any) -> Any:
+    """Store a hash or address string as binary, keeping any other value as it is.
+
+    Only text forms that decode back to the exact same string are converted.
+    """
+    if not isinstance(value, str):
+        return value
+    if _ADDRESS.fullmatch(value) and Web3.to_checksum_address(value) == value:
+        return Binary(bytes.fromhex(value[2:]), HexSubtype.CHECKSUM_ADDRESS)
+    if _PREFIXED_HEX.fullmatch(value):
+        return Binary(bytes.fromhex(value[2:]), HexSubtype.PREFIXED_HEX)
+    if _BARE_HEX.fullmatch(value):
+        return Binary(bytes.fromhex(value), HexSubtype.BARE_HEX)
+    return value
+
+
+def decode_hex(value: Any) -> Any:
+    if not isinstance(value, Binary):
+        return value
+    match value.subtype:
+        case HexSubtype.CHECKSUM_ADDRESS:
+            return Web3.to_checksum_address("0x" + value.hex())
+        case HexSubtype.PREFIXED_HEX:
+            return "0x" + value.hex()
+        case HexSubtype.BARE_HEX:
+            return value.hex()
+    return value
+
+
+def encode_chain_symbol(value: Any) -> Any:
+    return CHAIN_CODES.get(value, value) if isinstance(value, str) else value
+
+
+def decode_chain_symbol(value: Any) -> Any:
+    return CHAIN_SYMBOLS.get(value, value) if isinstance(value, int) else value
+
+
+@dataclass(frozen=True)
+class DocumentCodec:
+    """Translate documents and queries between their model form and the compact stored form.
+
+    `hex_fields` hold hashes or addresses and are stored as binary, `chain_fields` hold a chain
+    symbol and are stored as its code. Fields are dotted paths, as used in queries.
+    """
+
+    hex_fields: tuple[str, ...] = ()
+    chain_fields: tuple[str, ...] = ()
+
+    def _get_coders(self, field: str):
+        if field in self.hex_fields:
+            return encode_hex, decode_hex
+        if field in self.chain_fields:
+            return encode_chain_symbol, decode_chain_symbol
+        return None
+
+    def _transform(self, document: dict[str, Any], index: int):
+        for field in self.hex_fields + self.chain_fields:
+            *parents, name = field.split(".")
+            parent = document
+            for part in parents:
+                parent = parent.get(part)
+                if not isinstance(parent, dict):
+                    break
+            else:
+                if name in parent:
+                    parent[name] = self._get_coders(field)[index](parent[name])  # type: ignore
+        return document
+
+    def encode_document(self, document: dict[str, Any]) -> dict[str, Any]:
+        """Encode a JSON dumped document in place and tag it with the codec version."""
+        self._transform(document, 0)
+        document[CODEC_VERSION_FIELD] = CODEC_VERSION
+        return document
+
+    def decode_document(self, document: dict[str, Any]) -> dict[str, Any]:
+        """Decode a stored document in place; documents not yet backfilled pass through unchanged."""
+        document.pop(CODEC_VERSION_FIELD, None)
+        return self._transform(document, 1)
+
+    def encode_value(self, field: str, value: Any) -> Any:
+        coders = self._get_coders(field)
+        if coders is None:
+            return value
+        encode = coders[0]
+        if isinstance(value, dict):
+            return {
+                operator: [encode(item) for item in operand] if isinstance(operand, list) else encode(operand)
+                for operator, operand in value.items()
+            }
+        return encode(value)
+
+    def encode_query(self, query: dict[str, Any]) -> dict[str, Any]:
+        """Return a copy of `query` with values of codec fields in their stored form."""
+        encoded = {}
+        for field, value in query.items():
+            if field in ("$or", "$and", "$nor"):
+                encoded[field] = [self.encode_query(item) for item in value]
+            else:
+                encoded[field] = self.encode_value(field, value)
+        return encoded
+
+
+async def get_storage_stats(collection_name: str) -> dict[str, int]:
+    cursor = await get_db_connection()[collection_name].aggregate([{"$collStats": {"storageStats": {}}}])
+    stats = (await cursor.to_list())[0]["storageStats"]
+    return {
+        "size": stats["size"],
+        "storage_size": stats["storageSize"],
+        "index_size": stats["totalIndexSize"],
+    }
+
+
+async def backfill(collection, codec: DocumentCodec, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Rewrite the documents stored with an older codec version and return how many were rewritten.
+
+    Each replacement is conditioned on the old version, so documents written concurrently by an
+    up to date service are left alone and the backfill can be rerun safely. Documents are read
+    with their amounts as stored, so `Decimal128` amounts are written back unchanged.
+    """
+    collection = get_raw_collection(collection)
+    outdated = {CODEC_VERSION_FIELD: {"$not": {"$gte": CODEC_VERSION}}}
+    rewritten = 0
+    cursor = collection.find(outdated, projection={"_id": 1})
+    for ids in batched([record["_id"] async for record in cursor], batch_size):
+        requests = [
+            ReplaceOne(
+                {"_id": record["_id"]} | outdated,
+                codec.encode_document(record),
+            )
+            async for record in collection.find({"_id": {"$in": list(ids)}} | outdated)
+        ]
+        if requests:
+            result = await collection.bulk_write(requests, ordered=False)
+            rewritten += result.modified_count
+    return rewritten
+
+
+def get_codec_collections() -> dict[str, DocumentCodec]:
+    from .deposit import DEPOSIT_CODEC
+    from .utxo import UTXO_CODEC
+
+    return {"evm_deposit": DEPOSIT_CODEC, "btc_deposit": DEPOSIT_CODEC, "btc_utxo": UTXO_CODEC}
+
+
+async def backfill_all() -> dict[str, dict[str, Any]]:
+    """Backfill the hot, per-chain and archive collections, returning their storage stats before and after."""
+    db = get_db_connection()
+    names = await db.list_collection_names()
+    report = {}
+    for base_name, codec in get_codec_collections().items():
+        for name in sorted(name for name in names if name.startswith(base_name)):
+            before = await get_storage_stats(name)
+            rewritten = await backfill(db[name], codec)
+            after = await get_storage_stats(name)
+            report[name] = {"rewritten": rewritten, "before": before, "after": after}
+    return report
+
+
+def log_backfill_report(report: dict[str, dict[str, Any]]):
+    for name, result in report.items():
+        before, after = result["before"], result["after"]
+        logger.info(
+            f"{name}: rewrote {result['rewritten']} documents, "
+            f"data {before['size']} -> {after['size']} bytes, "
+            f"indexes {before['index_size']} -> {after['index_size']} bytes"
+        )
+    logger.info("Index files only shrink once rebuilt, run `compact` on the collections to reclaim the space")
+
+
+async def main():
+    log_backfill_report(await backfill_all())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -3,13 +3,21 @@ from functools import lru_cache
 
 import pymongo
 
+from .amount import get_codec_options
+from .memory import MemoryDatabase
+
 # FIXME: due to circular import, we must do this. We must move this config to configs in future
 MONGO_HOST = os.environ["MONGO_HOST"]
 MONGO_PORT = os.environ["MONGO_PORT"]
 MONGO_DBNAME = os.environ.get("MONGO_DBNAME", "transaction_database")
+# "mongo", or "memory" to keep every collection in the process, to test and profile stages without a database
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
 
 
 @lru_cache()
 def get_db_connection():
+    """Return the database of the configured storage backend, see `zexporta.db.storage.Database`."""
+    if STORAGE_BACKEND == "memory":
+        return MemoryDatabase(MONGO_DBNAME, codec_options=get_codec_options())
     client = pymongo.AsyncMongoClient(f"mongodb://{MONGO_HOST}:{MONGO_PORT}/")
-    return client[MONGO_DBNAME]
+    return client.get_database(MONGO_DBNAME, codec_options=get_codec_options())
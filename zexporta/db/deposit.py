@@ -1,8 +1,13 @@
 import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from enum import StrEnum
 from functools import lru_cache
-from typing import Iterable, overload
+from typing import Any, AsyncIterator, Iterable, overload
 
-from clients import Transfer
+from clients import Transfer, get_chain_handle
 from pymongo import ASCENDING, DESCENDING
 
 from zexporta.custom_types import (
@@ -16,44 +21,166 @@ from zexporta.custom_types import (
     EVMConfig,
     EVMTransfer,
     TxHash,
+    UserId,
+    UserSummary,
 )
 
+from .amount import encode_amounts, sum_amounts
+from .archive import archive_records, get_tombstone_collection_name, iter_archived_records
+from .bulk import BulkWriteSummary, bulk_upsert, get_field
+from .codec import DocumentCodec, decode_hex
 from .db import get_db_connection
+from .lease import LeaseHeartbeat, claim_records
+from .notifier import ChangeNotifier
+from .summary import StatusChange, apply_status_changes, find_summary, replace_summaries
+from .transition import get_transition_buffer
+from .view import DocumentView, get_projection
 
 
-@lru_cache()
-def get_collection(chain: ChainConfig):
+class DepositPartitioning(StrEnum):
+    # One collection per chain family, every query filtering on `transfer.chain_symbol`
+    SHARED = "shared"
+    # One collection per chain, so a backlog on one chain does not slow the others down
+    CHAIN = "chain"
+
+
+DEPOSIT_PARTITIONING = DepositPartitioning(os.getenv("DEPOSIT_PARTITIONING", DepositPartitioning.SHARED))
+
+
+def get_base_collection_name(chain: ChainConfig) -> str:
     match chain:
         case EVMConfig():
-            collection = get_db_connection()["evm_deposit"]
-            asyncio.run_coroutine_threadsafe(
-                collection.create_index(("transfer.tx_hash", "transfer.chain_symbol"), unique=True),
-                asyncio.get_event_loop(),
-            )
+            return "evm_deposit"
         case BTCConfig():
-            collection = get_db_connection()["btc_deposit"]
-            asyncio.run_coroutine_threadsafe(
-                collection.create_index(("transfer.tx_hash", "transfer.chain_symbol", "transfer.index"), unique=True),
-                asyncio.get_event_loop(),
-            )
+            return "btc_deposit"
         case _:
             raise NotImplementedError()
-    return collection
 
 
-async def insert_deposit_if_not_exists(chain: ChainConfig, deposit: Deposit):
-    collection = get_collection(chain)
-    query = {
-        "transfer.chain_symbol": deposit.transfer.chain_symbol,
-        "transfer.tx_hash": deposit.transfer.tx_hash,
-    }
-    record = await collection.find_one(query)
-    if not record:
-        await collection.insert_one(deposit.model_dump(mode="json"))
+def get_collection_name(chain: ChainConfig, partitioning: DepositPartitioning = DEPOSIT_PARTITIONING) -> str:
+    name = get_base_collection_name(chain)
+    if partitioning == DepositPartitioning.CHAIN:
+        return f"{name}_{chain.chain_symbol.lower()}"
+    return name
+
+
+def get_collection(chain: ChainConfig):
+    return get_chain_handle(chain).get_resource(
+        "deposit_collection", lambda: get_db_connection()[get_collection_name(chain)]
+    )
+
+
+def get_tombstone_collection(chain: ChainConfig):
+    return get_chain_handle(chain).get_resource(
+        "deposit_tombstone_collection",
+        lambda: get_db_connection()[get_tombstone_collection_name(get_base_collection_name(chain))],
+    )
+
+
+@lru_cache()
+def get_summary_collection():
+    return get_db_connection()["deposit_summary"]
+
+
+DEPOSIT_AMOUNT_FIELDS = ("transfer.value",)
+DEPOSIT_CODEC = DocumentCodec(
+    hex_fields=("transfer.tx_hash", "transfer.to", "transfer.token", "transfer.block_hash"),
+    chain_fields=("transfer.chain_symbol",),
+)
+TERMINAL_DEPOSIT_STATUSES = (DepositStatus.SUCCESSFUL, DepositStatus.REORG, DepositStatus.REJECTED)
+
+
+def get_key_fields(chain: ChainConfig) -> tuple[str, ...]:
+    match chain:
+        case BTCConfig():
+            return ("transfer.tx_hash", "transfer.chain_symbol", "transfer.index")
+        case _:
+            return ("transfer.tx_hash", "transfer.chain_symbol")
+
+
+def _encode_deposit(deposit: Deposit) -> dict:
+    return DEPOSIT_CODEC.encode_document(encode_amounts(deposit.model_dump(mode="json"), DEPOSIT_AMOUNT_FIELDS))
+
+
+def _get_summary_key(tx_hash: TxHash, index: int | None = None) -> str:
+    # The outputs of one BTC transaction are told apart by their index
+    return tx_hash if index is None else f"{tx_hash}:{index}"
+
+
+def _get_deposit_summary_key(deposit: Deposit) -> str:
+    match deposit.transfer:
+        case BTCTransfer():
+            return _get_summary_key(deposit.transfer.tx_hash, deposit.transfer.index)
+        case _:
+            return _get_summary_key(deposit.transfer.tx_hash)
+
+
+def _get_status_change(deposit: Deposit, from_status: str | None) -> StatusChange:
+    transfer = deposit.transfer
+    return StatusChange(
+        chain_symbol=transfer.chain_symbol,
+        user_id=deposit.user_id,
+        key=_get_deposit_summary_key(deposit),
+        sort=transfer.block_number,
+        token=transfer.token,
+        amount=transfer.value,
+        from_status=from_status,
+        to_status=deposit.status.value,
+        item=deposit.model_dump(mode="json"),
+    )
+
+
+@dataclass(frozen=True)
+class DepositSummaryObserver:
+    """Apply the status transitions of the deposits of `chain` to the deposit summaries."""
 
+    chain: ChainConfig
 
-async def insert_deposits_if_not_exists(chain: ChainConfig, deposits: Iterable[Deposit]):
-    await asyncio.gather(*[insert_deposit_if_not_exists(chain, deposit) for deposit in deposits])
+    async def on_transition(self, records: list[dict[str, Any]], from_status: str):
+        await apply_status_changes(
+            get_summary_collection(),
+            [_get_status_change(_to_deposit(self.chain, record), from_status) for record in records],
+        )
+
+
+def get_summary_observer(chain: ChainConfig) -> DepositSummaryObserver:
+    # Shared by the transitions of a chain, so the transition buffer can merge them
+    return get_chain_handle(chain).get_resource("deposit_summary_observer", lambda: DepositSummaryObserver(chain))
+
+
+async def insert_deposit_if_not_exists(chain: ChainConfig, deposit: Deposit):
+    await insert_deposits_if_not_exists(chain, [deposit])
+
+
+async def _exclude_archived(chain: ChainConfig, deposits: list[Deposit]) -> list[Deposit]:
+    """Drop the deposits already moved to the archive, which the hot unique index no longer guards."""
+    if not deposits:
+        return deposits
+    query = DEPOSIT_CODEC.encode_query(
+        {
+            "transfer.chain_symbol": chain.chain_symbol,
+            "transfer.tx_hash": {"$in": list({deposit.transfer.tx_hash for deposit in deposits})},
+        }
+    )
+    archived = set()
+    async for record in get_tombstone_collection(chain).find(query, projection={"_id": 0}):
+        transfer = DEPOSIT_CODEC.decode_document(record)["transfer"]
+        archived.add(_get_summary_key(transfer["tx_hash"], transfer.get("index")))
+    return [deposit for deposit in deposits if _get_deposit_summary_key(deposit) not in archived]
+
+
+async def insert_deposits_if_not_exists(chain: ChainConfig, deposits: Iterable[Deposit]) -> BulkWriteSummary:
+    deposits = await _exclude_archived(chain, list(deposits))
+    summary = await bulk_upsert(
+        get_collection(chain),
+        (_encode_deposit(deposit) for deposit in deposits),
+        get_key_fields(chain),
+        insert_only=True,
+    )
+    await apply_status_changes(
+        get_summary_collection(), [_get_status_change(deposits[index], None) for index in summary.upserted]
+    )
+    return summary
 
 
 @overload
@@ -64,6 +191,7 @@ async def find_deposit_by_status(
     to_block: BlockNumber | None = None,
     limit: int = 0,
     txs_hash: list[TxHash] | None = None,
+    block_hashes: list[str] | None = None,
 ) -> list[Deposit[BTCTransfer]]: ...
 
 
@@ -75,6 +203,7 @@ async def find_deposit_by_status(
     to_block: BlockNumber | None = None,
     limit: int = 0,
     txs_hash: list[TxHash] | None = None,
+    block_hashes: list[str] | None = None,
 ) -> list[Deposit[EVMTransfer]]: ...
 
 
@@ -86,6 +215,7 @@ async def find_deposit_by_status(
     to_block: BlockNumber | None = None,
     limit: int = 0,
     txs_hash: list[TxHash] | None = None,
+    block_hashes: list[str] | None = None,
 ) -> list[Deposit[Transfer]]: ...
 
 
@@ -96,147 +226,494 @@ async def find_deposit_by_status(
     to_block: BlockNumber | None = None,
     limit: int = 0,
     txs_hash: list[TxHash] | None = None,
+    block_hashes: list[str] | None = None,
 ) -> list[Deposit]:
-    collection = get_collection(chain)
-    res = []
+    return [
+        deposit
+        async for deposit in iter_deposits_by_status(
+            chain,
+            status,
+            from_block=from_block,
+            to_block=to_block,
+            limit=limit,
+            txs_hash=txs_hash,
+            block_hashes=block_hashes,
+        )
+    ]
+
+
+def _get_status_query(
+    chain: ChainConfig,
+    status: DepositStatus,
+    from_block: BlockNumber | None,
+    to_block: BlockNumber | None,
+    txs_hash: list[TxHash] | None,
+    block_hashes: list[str] | None = None,
+) -> dict:
     block_number_query = {"$gte": from_block or 0}
     if to_block:
         block_number_query["$lte"] = to_block
 
-    query = {
+    query: dict[str, Any] = {
         "status": status.value,
         "transfer.block_number": block_number_query,
         "transfer.chain_symbol": chain.chain_symbol,
     }
+    # Deposits matching either filter are returned when both are given.
+    filters = []
     if txs_hash:
-        query["transfer.tx_hash"] = {"$in": txs_hash}
+        filters.append({"transfer.tx_hash": {"$in": txs_hash}})
+    if block_hashes:
+        filters.append({"transfer.block_hash": {"$in": block_hashes}})
+    if len(filters) == 1:
+        query.update(filters[0])
+    elif filters:
+        query["$or"] = filters
+    return DEPOSIT_CODEC.encode_query(query)
+
+
+def _to_deposit(chain: ChainConfig, record: dict) -> Deposit:
+    DEPOSIT_CODEC.decode_document(record)
+    transfer = chain.transfer_class(**record.pop("transfer"))
+    return Deposit(transfer=transfer, **record)
+
+
+async def iter_deposits_by_status(
+    chain: ChainConfig,
+    status: DepositStatus,
+    from_block: BlockNumber | None = None,
+    to_block: BlockNumber | None = None,
+    limit: int = 0,
+    txs_hash: list[TxHash] | None = None,
+    block_hashes: list[str] | None = None,
+) -> AsyncIterator[Deposit]:
+    """Yield deposits in block order, validating each one only when the cursor reaches it."""
+    query = _get_status_query(chain, status, from_block, to_block, txs_hash, block_hashes)
+    cursor = get_collection(chain).find(query, sort={"transfer.block_number": ASCENDING}).limit(limit)
+    async for record in cursor:
+        yield _to_deposit(chain, record)
+
+
+async def find_deposit_views_by_status(
+    chain: ChainConfig,
+    status: DepositStatus,
+    fields: Iterable[str],
+    from_block: BlockNumber | None = None,
+    to_block: BlockNumber | None = None,
+    limit: int = 0,
+    txs_hash: list[TxHash] | None = None,
+    block_hashes: list[str] | None = None,
+) -> list[DocumentView]:
+    """Return only the projected dotted `fields` of matching deposits, in block order, without validation."""
+    query = _get_status_query(chain, status, from_block, to_block, txs_hash, block_hashes)
+    cursor = get_collection(chain).find(
+        query,
+        projection=get_projection(fields),
+        sort={"transfer.block_number": ASCENDING},
+    )
+    return [DocumentView(DEPOSIT_CODEC.decode_document(record)) async for record in cursor.limit(limit)]
+
+
+async def claim_deposits(
+    chain: ChainConfig,
+    status: DepositStatus,
+    owner: str,
+    lease_seconds: int | float,
+    limit: int,
+) -> list[Deposit]:
+    """Lease up to `limit` deposits in `status` to `owner`, in block order."""
+    records = await claim_records(
+        get_collection(chain),
+        _get_status_query(chain, status, None, None, None),
+        owner,
+        lease_seconds,
+        limit,
+        sort=[("transfer.block_number", ASCENDING)],
+    )
+    return [_to_deposit(chain, record) for record in records]
+
+
+async def claim_deposit_views(
+    chain: ChainConfig,
+    status: DepositStatus,
+    fields: Iterable[str],
+    owner: str,
+    lease_seconds: int | float,
+    limit: int,
+) -> list[DocumentView]:
+    """Lease up to `limit` deposits in `status` to `owner` and return only their projected `fields`."""
+    records = await claim_records(
+        get_collection(chain),
+        _get_status_query(chain, status, None, None, None),
+        owner,
+        lease_seconds,
+        limit,
+        sort=[("transfer.block_number", ASCENDING)],
+        projection=get_projection(fields),
+    )
+    return [DocumentView(DEPOSIT_CODEC.decode_document(record)) for record in records]
 
-    async for record in collection.find(query, sort={"transfer.block_number": ASCENDING}).limit(limit):
-        transfer = chain.transfer_class(**record["transfer"])
-        del record["transfer"]
-        res.append(Deposit(transfer=transfer, **record))
-    return res
+
+def get_deposit_lease_heartbeat(
+    chain: ChainConfig,
+    owner: str,
+    claimed: int,
+    lease_seconds: int | float,
+    logger: logging.Logger | logging.LoggerAdapter | None = None,
+) -> LeaseHeartbeat:
+    return LeaseHeartbeat(get_collection(chain), owner, claimed, lease_seconds, logger=logger)
 
 
 async def find_address_deposits(
     chain: ChainConfig, address: Address, status: DepositStatus | None = None
 ) -> list[Deposit]:
-    collection = get_collection(chain)
-    res = []
+    return [deposit async for deposit in iter_address_deposits(chain, address, status)]
+
+
+async def iter_address_deposits(
+    chain: ChainConfig, address: Address, status: DepositStatus | None = None
+) -> AsyncIterator[Deposit]:
     query = {
         "transfer.chain_symbol": chain.chain_symbol,
         "transfer.to": address,
     }
     if status is not None:
         query["status"] = status.value
-
-    async for record in collection.find(query, sort={"transfer.block_number": DESCENDING}):
-        transfer = chain.transfer_class(**record["transfer"])
-        del record["transfer"]
-        res.append(Deposit(transfer=transfer, **record))
-    return res
-
-
-async def update_deposit_status(chain: ChainConfig, tx_hash: TxHash, new_status: DepositStatus):
-    collection = get_collection(chain)
-    await collection.update_one({"transfer.tx_hash": tx_hash}, {"$set": {"status": new_status}})
+    async for deposit in _iter_deposits(
+        chain,
+        query,
+        sort=[("transfer.block_number", DESCENDING)],
+        archived=status is None or status in TERMINAL_DEPOSIT_STATUSES,
+    ):
+        yield deposit
+
+
+async def _iter_deposits(
+    chain: ChainConfig, query: dict[str, Any], sort: list[tuple[str, int]], archived: bool = True
+) -> AsyncIterator[Deposit]:
+    """Yield the hot deposits matching `query`, then the archived ones unless `archived` is unset."""
+    query = DEPOSIT_CODEC.encode_query(query)
+    key_fields = get_key_fields(chain)
+    seen = set()
+    async for record in get_collection(chain).find(query, sort=sort):
+        seen.add(tuple(get_field(record, field) for field in key_fields))
+        yield _to_deposit(chain, record)
+
+    if not archived:
+        return
+    # A record being archived may briefly exist in both tiers, the hot copy wins.
+    async for record in iter_archived_records(get_base_collection_name(chain), chain.chain_symbol, query, sort=sort):
+        if tuple(get_field(record, field) for field in key_fields) not in seen:
+            yield _to_deposit(chain, record)
+
+
+async def find_user_deposit_summary(chain: ChainConfig, user_id: UserId) -> UserSummary:
+    """Return the status counts, token totals and latest deposits of a user with one read."""
+    return await find_summary(get_summary_collection(), chain.chain_symbol, user_id)
+
+
+async def rebuild_deposit_summaries(chain: ChainConfig, address: Address | None = None) -> int:
+    """Rebuild the deposit summaries of `chain`, or only the one of the user of `address`, from its deposits."""
+    query = {"transfer.chain_symbol": chain.chain_symbol}
+    if address is not None:
+        query["transfer.to"] = address
+    # The whole chain is read in storage order, a user in address and block order
+    sort = [("transfer.block_number", DESCENDING)] if address is not None else [("_id", ASCENDING)]
+    return await replace_summaries(
+        get_summary_collection(),
+        (_get_status_change(deposit, None) async for deposit in _iter_deposits(chain, query, sort)),
+    )
+
+
+async def archive_deposits(
+    chain: ChainConfig,
+    created_before: datetime,
+    limit: int,
+    reorg_ttl_seconds: int | None = None,
+) -> int:
+    """Move terminal deposits created before `created_before` to the monthly archive collections."""
+    return await archive_records(
+        get_collection(chain),
+        chain.chain_symbol,
+        DEPOSIT_CODEC.encode_query(
+            {
+                "transfer.chain_symbol": chain.chain_symbol,
+                "status": {"$in": [status.value for status in TERMINAL_DEPOSIT_STATUSES]},
+            }
+        ),
+        created_before,
+        limit,
+        archive_name=get_base_collection_name(chain),
+        indexes=[("transfer.to", "transfer.block_number")],
+        ttl_status=DepositStatus.REORG.value,
+        ttl_seconds=reorg_ttl_seconds,
+        tombstone_key_fields=get_key_fields(chain),
+    )
+
+
+def get_deposit_notifier(
+    chain: ChainConfig,
+    status: DepositStatus,
+    poll_interval: float,
+    max_wait: float,
+    logger: logging.Logger | logging.LoggerAdapter | None = None,
+) -> ChangeNotifier:
+    return ChangeNotifier(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query({"transfer.chain_symbol": chain.chain_symbol, "status": status.value}),
+        poll_interval=poll_interval,
+        max_wait=max_wait,
+        logger=logger,
+    )
+
+
+def update_deposit_status(
+    chain: ChainConfig,
+    tx_hash: TxHash,
+    from_status: DepositStatus,
+    new_status: DepositStatus,
+) -> asyncio.Future[None]:
+    return get_transition_buffer().submit(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query({"transfer.chain_symbol": chain.chain_symbol, "transfer.tx_hash": tx_hash}),
+        from_status.value,
+        new_status.value,
+        observer=get_summary_observer(chain),
+    )
 
 
 async def delete_deposit(chain: ChainConfig, tx_hash: TxHash):
     collection = get_collection(chain)
-    await collection.delete_one({"transfer.tx_hash": tx_hash})
+    await collection.delete_one(DEPOSIT_CODEC.encode_query({"transfer.tx_hash": tx_hash}))
 
 
-async def to_finalized(
+def to_finalized(
     chain: ChainConfig,
     finalized_block_number: BlockNumber,
     txs_hash: list[TxHash],
-):
-    collection = get_collection(chain)
-    query = {
-        "status": DepositStatus.PENDING.value,
-        "transfer.block_number": {"$lte": finalized_block_number},
-        "transfer.tx_hash": {"$in": txs_hash},
-        "transfer.chain_symbol": chain.chain_symbol,
-    }
-
-    update = {"$set": {"status": DepositStatus.FINALIZED.value}}
-
-    await collection.update_many(query, update)
-
-
-async def to_reorg_block_number(
+) -> asyncio.Future[None]:
+    return get_transition_buffer().submit(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query(
+            {
+                "transfer.block_number": {"$lte": finalized_block_number},
+                "transfer.tx_hash": {"$in": txs_hash},
+                "transfer.chain_symbol": chain.chain_symbol,
+            }
+        ),
+        DepositStatus.PENDING.value,
+        DepositStatus.FINALIZED.value,
+        observer=get_summary_observer(chain),
+    )
+
+
+def to_finalized_block_hashes(
+    chain: ChainConfig,
+    finalized_block_number: BlockNumber,
+    block_hashes: list[str],
+    from_block: BlockNumber = 0,
+) -> asyncio.Future[None]:
+    """Finalize every pending deposit recorded in one of the canonical blocks `block_hashes`."""
+    return get_transition_buffer().submit(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query(
+            {
+                "transfer.block_number": {"$gte": from_block, "$lte": finalized_block_number},
+                "transfer.block_hash": {"$in": block_hashes},
+                "transfer.chain_symbol": chain.chain_symbol,
+            }
+        ),
+        DepositStatus.PENDING.value,
+        DepositStatus.FINALIZED.value,
+        observer=get_summary_observer(chain),
+    )
+
+
+def to_reorg_block_number(
     chain: ChainConfig,
     from_block: BlockNumber,
     to_block: BlockNumber,
     status: DepositStatus = DepositStatus.PENDING,
-):
-    collection = get_collection(chain)
-    query = {
-        "status": status.value,
-        "transfer.block_number": {"$lte": to_block, "$gte": from_block},
-        "transfer.chain_symbol": chain.chain_symbol,
-    }
-    update = {"$set": {"status": DepositStatus.REORG.value}}
-    await collection.update_many(query, update)
-
-
-async def to_reorg_with_tx_hash(
+) -> asyncio.Future[None]:
+    return get_transition_buffer().submit(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query(
+            {
+                "transfer.block_number": {"$lte": to_block, "$gte": from_block},
+                "transfer.chain_symbol": chain.chain_symbol,
+            }
+        ),
+        status.value,
+        DepositStatus.REORG.value,
+        observer=get_summary_observer(chain),
+    )
+
+
+def to_reorg_block_numbers(
+    chain: ChainConfig,
+    block_numbers: list[BlockNumber],
+    status: DepositStatus = DepositStatus.PENDING,
+) -> asyncio.Future[None]:
+    """Mark the deposits of exactly `block_numbers` as reorged, leaving other blocks of their range alone."""
+    return get_transition_buffer().submit(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query(
+            {
+                "transfer.block_number": {"$in": block_numbers},
+                "transfer.chain_symbol": chain.chain_symbol,
+            }
+        ),
+        status.value,
+        DepositStatus.REORG.value,
+        observer=get_summary_observer(chain),
+    )
+
+
+def to_reorg_with_tx_hash(
     chain: ChainConfig,
     txs_hash: list[TxHash],
     status: DepositStatus = DepositStatus.PENDING,
-):
-    collection = get_collection(chain)
+) -> asyncio.Future[None]:
+    return get_transition_buffer().submit(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query(
+            {
+                "transfer.chain_symbol": chain.chain_symbol,
+                "transfer.tx_hash": {"$in": txs_hash},
+            }
+        ),
+        status.value,
+        DepositStatus.REORG.value,
+        observer=get_summary_observer(chain),
+    )
+
+
+async def _get_distinct_block_numbers(chain: ChainConfig, query: dict, limit: int) -> list[BlockNumber]:
+    pipeline: list[dict] = [
+        {"$match": DEPOSIT_CODEC.encode_query(query)},
+        {"$sort": {"transfer.block_number": ASCENDING}},
+        {"$group": {"_id": "$transfer.block_number"}},
+        {"$sort": {"_id": ASCENDING}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    cursor = await get_collection(chain).aggregate(pipeline)
+    return [record["_id"] async for record in cursor]
+
+
+async def get_pending_deposits_block_hashes(
+    chain: ChainConfig,
+    finalized_block_number: BlockNumber,
+    from_block: BlockNumber | None = None,
+    limit: int = 0,
+) -> dict[BlockNumber, set[str | None]]:
+    """Like `get_pending_deposits_block_number`, mapping each block number to the block hashes its
+    pending deposits were observed in; `None` stands for deposits recorded without one."""
     query = {
-        "status": status.value,
         "transfer.chain_symbol": chain.chain_symbol,
-        "transfer.tx_hash": {"$in": txs_hash},
+        "status": DepositStatus.PENDING.value,
+        "transfer.block_number": _get_block_number_query(from_block, finalized_block_number),
     }
-    update = {"$set": {"status": DepositStatus.REORG.value}}
-    await collection.update_many(query, update)
+    pipeline: list[dict] = [
+        {"$match": DEPOSIT_CODEC.encode_query(query)},
+        {"$sort": {"transfer.block_number": ASCENDING}},
+        {
+            "$group": {
+                "_id": "$transfer.block_number",
+                "block_hashes": {"$addToSet": {"$ifNull": ["$transfer.block_hash", None]}},
+            }
+        },
+        {"$sort": {"_id": ASCENDING}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    cursor = await get_collection(chain).aggregate(pipeline)
+    return {record["_id"]: {decode_hex(block_hash) for block_hash in record["block_hashes"]} async for record in cursor}
+
+
+def _get_block_number_query(from_block: BlockNumber | None, to_block: BlockNumber | None) -> dict:
+    block_number_query = {}
+    if from_block is not None:
+        block_number_query["$gte"] = from_block
+    if to_block is not None:
+        block_number_query["$lte"] = to_block
+    return block_number_query
 
 
 async def get_pending_deposits_block_number(
-    chain: ChainConfig, finalized_block_number: BlockNumber
+    chain: ChainConfig,
+    finalized_block_number: BlockNumber,
+    from_block: BlockNumber | None = None,
+    limit: int = 0,
 ) -> list[BlockNumber]:
-    collection = get_collection(chain)
+    """Return the sorted distinct block numbers of pending deposits up to `finalized_block_number`.
+
+    Page through them by passing the last returned block number plus one as `from_block`.
+    """
     query = {
-        "status": DepositStatus.PENDING.value,
         "transfer.chain_symbol": chain.chain_symbol,
-        "transfer.block_number": {"$lte": finalized_block_number},
+        "status": DepositStatus.PENDING.value,
+        "transfer.block_number": _get_block_number_query(from_block, finalized_block_number),
     }
-    block_numbers = set()
-    async for record in collection.find(
-        query,
-        sort=[("transfer.block_number", ASCENDING)],
-    ):
-        block_numbers.add(record["transfer"]["block_number"])
-    return list(block_numbers)
+    return await _get_distinct_block_numbers(chain, query, limit)
 
 
-async def get_block_numbers_by_status(chain: ChainConfig, status: DepositStatus) -> list[BlockNumber]:
-    collection = get_collection(chain)
-    query = {"transfer.chain_symbol": chain.chain_symbol, "status": status.value}
-    block_numbers = set()
-    async for record in collection.find(
-        query,
-        sort=[("transfer.block_number", ASCENDING)],
-    ):
-        block_numbers.add(record["transfer"]["block_number"])
-    return list(block_numbers)
+async def get_block_numbers_by_status(
+    chain: ChainConfig,
+    status: DepositStatus,
+    from_block: BlockNumber | None = None,
+    to_block: BlockNumber | None = None,
+    limit: int = 0,
+) -> list[BlockNumber]:
+    query: dict = {"transfer.chain_symbol": chain.chain_symbol, "status": status.value}
+    if block_number_query := _get_block_number_query(from_block, to_block):
+        query["transfer.block_number"] = block_number_query
+    return await _get_distinct_block_numbers(chain, query, limit)
 
 
 async def upsert_deposit(chain: ChainConfig, deposit: Deposit):
-    collection = get_collection(chain)
-    update = {
-        "$set": deposit.model_dump(mode="json"),
-    }
-    filter_ = {
-        "transfer.tx_hash": deposit.transfer.tx_hash,
-        "transfer.chain_symbol": deposit.transfer.chain_symbol,
-    }
-    await collection.update_one(filter=filter_, update=update, upsert=True)
-
-
-async def upsert_deposits(chain: ChainConfig, deposits: list[Deposit]):
-    await asyncio.gather(*[upsert_deposit(chain, deposit) for deposit in deposits])
+    await upsert_deposits(chain, [deposit])
+
+
+async def upsert_deposits(chain: ChainConfig, deposits: list[Deposit]) -> BulkWriteSummary:
+    statuses = await _get_statuses(chain, deposits)
+    summary = await bulk_upsert(
+        get_collection(chain),
+        (_encode_deposit(deposit) for deposit in deposits),
+        get_key_fields(chain),
+    )
+    await apply_status_changes(
+        get_summary_collection(),
+        [_get_status_change(deposit, statuses.get(_get_deposit_summary_key(deposit))) for deposit in deposits],
+    )
+    return summary
+
+
+async def _get_statuses(chain: ChainConfig, deposits: list[Deposit]) -> dict[str, str]:
+    """Return the stored status of `deposits` by summary key, before they are overwritten."""
+    query = DEPOSIT_CODEC.encode_query(
+        {
+            "transfer.chain_symbol": chain.chain_symbol,
+            "transfer.tx_hash": {"$in": list({deposit.transfer.tx_hash for deposit in deposits})},
+        }
+    )
+    projection = get_projection(("transfer.tx_hash", "transfer.index", "status"))
+    statuses = {}
+    async for record in get_collection(chain).find(query, projection=projection):
+        transfer = DEPOSIT_CODEC.decode_document(record)["transfer"]
+        statuses[_get_summary_key(transfer["tx_hash"], transfer.get("index"))] = record["status"]
+    return statuses
+
+
+async def get_value_per_token(
+    chain: ChainConfig,
+    status: DepositStatus = DepositStatus.PENDING,
+) -> dict[Address, int]:
+    """Return the total deposited value of each token among the deposits in `status`."""
+    totals = await sum_amounts(
+        get_collection(chain),
+        DEPOSIT_CODEC.encode_query({"transfer.chain_symbol": chain.chain_symbol, "status": status.value}),
+        "transfer.value",
+        group_by="transfer.token",
+    )
+    return {decode_hex(token): total for token, total in totals.items()}
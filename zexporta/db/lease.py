@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+LEASE_OWNER_FIELD = "lease_owner"
+LEASE_EXPIRES_AT_FIELD = "lease_expires_at"
+
+
+class LeaseLost(Exception):
+    """Raise when claimed records are no longer leased by their owner"""
+
+
+def get_claimable_query(now: datetime) -> dict[str, Any]:
+    # `None` also matches records that were never leased
+    return {"$or": [{LEASE_EXPIRES_AT_FIELD: None}, {LEASE_EXPIRES_AT_FIELD: {"$lt": now}}]}
+
+
+async def claim_records(
+    collection,
+    query: dict[str, Any],
+    owner: str,
+    lease_seconds: int | float,
+    limit: int,
+    sort: list[tuple[str, int]],
+    projection: dict[str, Any] | None = None,
+) -> list[dict[str, Any]]:
+    """Lease up to `limit` records matching `query` to `owner`, in `sort` order.
+
+    The first `limit` claimable records are leased with one `update_many`, still conditioned on
+    being claimable, so concurrent workers never get the same record; the claimed ones are read
+    back by owner. Records lost to another worker in between are made up for with the next
+    claimable ones. Records whose lease expired, because their owner died or stalled, are
+    claimable again. Claimed records stay leased until `release_records` or the lease expires.
+    """
+    now = datetime.now(timezone.utc)
+    update = {"$set": {LEASE_OWNER_FIELD: owner, LEASE_EXPIRES_AT_FIELD: now + timedelta(seconds=lease_seconds)}}
+    claimable = {"$and": [query, get_claimable_query(now)]}
+    records: list[dict[str, Any]] = []
+    while len(records) < limit:
+        candidates = (
+            await collection.find(claimable, projection={"_id": 1}, sort=sort).limit(limit - len(records)).to_list()
+        )
+        if not candidates:
+            break
+        ids = [record["_id"] for record in candidates]
+        await collection.update_many(
+            {"$and": [{"_id": {"$in": ids}}, claimable]},
+            update,
+        )
+        records += await collection.find(
+            {"_id": {"$in": ids}, LEASE_OWNER_FIELD: owner},
+            projection=projection,
+            sort=sort,
+        ).to_list()
+    return records
+
+
+async def renew_records(collection, owner: str, lease_seconds: int | float) -> int:
+    """Extend the leases held by `owner` and return how many records it still holds."""
+    now = datetime.now(timezone.utc)
+    result = await collection.update_many(
+        {LEASE_OWNER_FIELD: owner, LEASE_EXPIRES_AT_FIELD: {"$gte": now}},
+        {"$set": {LEASE_EXPIRES_AT_FIELD: now + timedelta(seconds=lease_seconds)}},
+    )
+    return result.matched_count
+
+
+async def release_records(collection, owner: str):
+    await collection.update_many(
+        {LEASE_OWNER_FIELD: owner},
+        {"$unset": {LEASE_OWNER_FIELD: "", LEASE_EXPIRES_AT_FIELD: ""}},
+    )
+
+
+class LeaseHeartbeat:
+    """Renew the leases of `owner` while the records are processed and release them afterwards.
+
+    Leases are renewed every third of `lease_seconds`. When fewer than `claimed` records are still
+    held, another worker took some over after a stall; `lost` is set and `check()` raises, so the
+    caller can stop before repeating a side effect. Release only after the new statuses are
+    written, otherwise another worker may claim the records again.
+    """
+
+    def __init__(
+        self,
+        collection,
+        owner: str,
+        claimed: int,
+        lease_seconds: int | float,
+        logger: logging.Logger | logging.LoggerAdapter | None = None,
+    ):
+        self.collection = collection
+        self.owner = owner
+        self.claimed = claimed
+        self.lease_seconds = lease_seconds
+        self.logger = logger or logging.getLogger(__name__)
+        self.lost = False
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                held = await renew_records(self.collection, self.owner, self.lease_seconds)
+            except Exception as e:
+                self.logger.warning(f"Renewing leases of {self.owner} failed: {e}")
+                continue
+            if held < self.claimed:
+                self.lost = True
+                self.logger.warning(f"{self.owner} lost {self.claimed - held} of {self.claimed} leases")
+                return
+
+    def check(self):
+        if self.lost:
+            raise LeaseLost(f"{self.owner} no longer holds all of its {self.claimed} leases")
+
+    async def __aenter__(self) -> "LeaseHeartbeat":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await release_records(self.collection, self.owner)
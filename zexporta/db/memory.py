@@ -0,0 +1,1165 @@
+import asyncio
+import copy
+import itertools
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from functools import cmp_to_key
+from typing import Any, AsyncIterator, Callable, Iterable, Mapping, Sequence
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.decimal128 import Decimal128, create_decimal128_context
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from .bulk import DUPLICATE_KEY_ERROR_CODE
+from .storage import Collection, CommandCursor, Cursor, Database, Document, SortSpec
+
+# Documents are kept as BSON decodes them without the type registry, so Decimal128 amounts and
+# naive UTC datetimes are stored exactly as MongoDB stores them.
+_STORAGE_CODEC_OPTIONS = CodecOptions()
+_DECIMAL128_CONTEXT = create_decimal128_context()
+
+
+class _Missing:
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+MISSING: Any = _Missing()
+
+_TYPE_ALIASES: dict[str, tuple[type, ...]] = {
+    "double": (float,),
+    "string": (str,),
+    "object": (dict,),
+    "array": (list,),
+    "binData": (bytes,),
+    "objectId": (ObjectId,),
+    "bool": (bool,),
+    "date": (datetime,),
+    "null": (type(None),),
+    "int": (int,),
+    "long": (int,),
+    "decimal": (Decimal128,),
+    "number": (int, float, Decimal128),
+}
+
+
+def _get_type_order(value: Any) -> int:
+    """Rank `value` by the BSON comparison order of its type; values compare only within a rank."""
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float, Decimal, Decimal128)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def compare(a: Any, b: Any) -> int:
+    """Compare two values in the BSON sort order, returning -1, 0 or 1."""
+    order_a, order_b = _get_type_order(a), _get_type_order(b)
+    if order_a != order_b:
+        return -1 if order_a < order_b else 1
+    if order_a == 1:
+        return 0
+    if order_a == 4:
+        for (key_a, value_a), (key_b, value_b) in zip(a.items(), b.items()):
+            if result := compare(value_a, value_b) or (key_a > key_b) - (key_a < key_b):
+                return result
+        return (len(a) > len(b)) - (len(a) < len(b))
+    if order_a == 5:
+        for value_a, value_b in zip(a, b):
+            if result := compare(value_a, value_b):
+                return result
+        return (len(a) > len(b)) - (len(a) < len(b))
+    if order_a == 6:
+        a = (len(a), getattr(a, "subtype", 0), bytes(a))
+        b = (len(b), getattr(b, "subtype", 0), bytes(b))
+    a, b = _normalize(a), _normalize(b)
+    return (a > b) - (a < b)
+
+
+def freeze(value: Any) -> Any:
+    """Return a hashable key equal for values MongoDB considers equal."""
+    if value is MISSING or value is None:
+        return None
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, bytes):
+        return ("binary", getattr(value, "subtype", 0), bytes(value))
+    if isinstance(value, dict):
+        return ("object", tuple((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ("array", tuple(freeze(item) for item in value))
+    return _normalize(value)
+
+
+def _equals(a: Any, b: Any) -> bool:
+    return compare(None if a is MISSING else a, b) == 0
+
+
+def get_value(document: Any, path: str) -> Any:
+    """Read a dotted `path` from `document`, `MISSING` when it is absent."""
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return MISSING
+    return value
+
+
+def _resolve(value: Any, parts: list[str]) -> list[Any]:
+    """Collect the values a query on the dotted `parts` path looks at, traversing arrays like MongoDB."""
+    if not parts:
+        return [value]
+    if isinstance(value, dict):
+        return _resolve(value[parts[0]], parts[1:]) if parts[0] in value else [MISSING]
+    if isinstance(value, list):
+        values = []
+        if parts[0].isdigit() and int(parts[0]) < len(value):
+            values.extend(_resolve(value[int(parts[0])], parts[1:]))
+        for item in value:
+            if isinstance(item, dict):
+                values.extend(value for value in _resolve(item, parts) if value is not MISSING)
+        return values or [MISSING]
+    return [MISSING]
+
+
+def _expand(values: list[Any]) -> Iterable[Any]:
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _is_operator_document(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) > 0 and all(key.startswith("$") for key in value)
+
+
+type Predicate = Callable[[Any], bool]
+type ValuesPredicate = Callable[[list[Any]], bool]
+
+
+def compile_query(query: Mapping[str, Any]) -> Predicate:
+    """Compile the MongoDB `query` once into a predicate on documents."""
+    predicates: list[Predicate] = []
+    for key, condition in query.items():
+        if key in ("$and", "$or", "$nor"):
+            items = [compile_query(item) for item in condition]
+            if key == "$and":
+                predicates.append(lambda document, items=items: all(item(document) for item in items))
+            elif key == "$or":
+                predicates.append(lambda document, items=items: any(item(document) for item in items))
+            else:
+                predicates.append(lambda document, items=items: not any(item(document) for item in items))
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}")
+        else:
+            test = _compile_condition(condition)
+            parts = key.split(".")
+            predicates.append(lambda document, parts=parts, test=test: test(_resolve(document, parts)))
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda document: all(predicate(document) for predicate in predicates)
+
+
+def match(document: Mapping[str, Any], query: Mapping[str, Any]) -> bool:
+    """Whether `document` matches the MongoDB `query`."""
+    return compile_query(query)(document)
+
+
+def _compile_condition(condition: Any) -> ValuesPredicate:
+    if _is_operator_document(condition):
+        options = condition.get("$options", "")
+        tests = [
+            _compile_operator(operator, operand, options)
+            for operator, operand in condition.items()
+            if operator != "$options"
+        ]
+        if len(tests) == 1:
+            return tests[0]
+        return lambda values: all(test(values) for test in tests)
+    if isinstance(condition, re.Pattern):
+        return _compile_regex(condition, "")
+    return _compile_in([condition])
+
+
+def _compile_in(operand: Iterable[Any]) -> ValuesPredicate:
+    """Match values equal to one of `operand`, or matching one of its regular expressions."""
+    keys = set()
+    patterns = []
+    for item in operand:
+        if isinstance(item, re.Pattern):
+            patterns.append(item)
+        else:
+            keys.add(freeze(item))
+
+    def test(values: list[Any]) -> bool:
+        for value in _expand(values):
+            if freeze(value) in keys:
+                return True
+            if patterns and isinstance(value, str) and any(pattern.search(value) for pattern in patterns):
+                return True
+        return False
+
+    return test
+
+
+def _compile_regex(pattern: Any, options: str) -> ValuesPredicate:
+    if not isinstance(pattern, re.Pattern):
+        flags = 0
+        for option, flag in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL), ("x", re.VERBOSE)):
+            if option in options:
+                flags |= flag
+        pattern = re.compile(pattern, flags)
+    return lambda values: any(isinstance(value, str) and pattern.search(value) for value in _expand(values))
+
+
+def _compile_comparison(operand: Any, accept: Callable[[int], bool]) -> ValuesPredicate:
+    order = _get_type_order(operand)
+    return lambda values: any(
+        _get_type_order(value) == order and accept(compare(None if value is MISSING else value, operand))
+        for value in _expand(values)
+    )
+
+
+def _compile_type(operand: Any) -> ValuesPredicate:
+    aliases = operand if isinstance(operand, list) else [operand]
+    types = tuple(type_ for alias in aliases for type_ in _TYPE_ALIASES[alias])
+    return lambda values: any(
+        value is not MISSING and isinstance(value, types) and not (isinstance(value, bool) and bool not in types)
+        for value in values
+    )
+
+
+def _compile_elem_match(operand: Mapping[str, Any]) -> ValuesPredicate:
+    if _is_operator_document(operand):
+        test = _compile_condition(operand)
+        return lambda values: any(isinstance(value, list) and any(test([item]) for item in value) for value in values)
+    predicate = compile_query(operand)
+    return lambda values: any(
+        isinstance(value, list) and any(isinstance(item, dict) and predicate(item) for item in value)
+        for value in values
+    )
+
+
+def _compile_operator(operator: str, operand: Any, options: str) -> ValuesPredicate:
+    match operator:
+        case "$eq":
+            return _compile_in([operand])
+        case "$ne":
+            equals = _compile_in([operand])
+            return lambda values: not equals(values)
+        case "$in":
+            return _compile_in(operand)
+        case "$nin":
+            is_in = _compile_in(operand)
+            return lambda values: not is_in(values)
+        case "$gt":
+            return _compile_comparison(operand, lambda result: result > 0)
+        case "$gte":
+            return _compile_comparison(operand, lambda result: result >= 0)
+        case "$lt":
+            return _compile_comparison(operand, lambda result: result < 0)
+        case "$lte":
+            return _compile_comparison(operand, lambda result: result <= 0)
+        case "$exists":
+            return lambda values: any(value is not MISSING for value in values) == bool(operand)
+        case "$not":
+            test = _compile_condition(operand)
+            return lambda values: not test(values)
+        case "$regex":
+            return _compile_regex(operand, options)
+        case "$type":
+            return _compile_type(operand)
+        case "$size":
+            return lambda values: any(isinstance(value, list) and len(value) == operand for value in values)
+        case "$elemMatch":
+            return _compile_elem_match(operand)
+    raise OperationFailure(f"unknown operator: {operator}")
+
+
+def _set_value(document: dict[str, Any], path: str, value: Any):
+    *parents, name = path.split(".")
+    for part in parents:
+        child = document.get(part)
+        if not isinstance(child, dict):
+            child = document[part] = {}
+        document = child
+    if value is MISSING:
+        document.pop(name, None)
+    else:
+        document[name] = value
+
+
+def _unset_value(document: dict[str, Any], path: str):
+    *parents, name = path.split(".")
+    for part in parents:
+        document = document.get(part)  # type: ignore
+        if not isinstance(document, dict):
+            return
+    document.pop(name, None)
+
+
+def _add(a: Any, b: Any) -> Any:
+    if isinstance(a, (Decimal128, Decimal)) or isinstance(b, (Decimal128, Decimal)):
+        return Decimal128(_DECIMAL128_CONTEXT.add(Decimal(_normalize(a)), Decimal(_normalize(b))))
+    return a + b
+
+
+_COMPARISONS: dict[str, Callable[[int], bool]] = {
+    "$eq": lambda result: result == 0,
+    "$ne": lambda result: result != 0,
+    "$gt": lambda result: result > 0,
+    "$gte": lambda result: result >= 0,
+    "$lt": lambda result: result < 0,
+    "$lte": lambda result: result <= 0,
+}
+
+
+def _is_true(value: Any) -> bool:
+    return not (
+        value is MISSING or value is None or value is False or (_get_type_order(value) == 2 and _normalize(value) == 0)
+    )
+
+
+def _evaluate_value_operator(operator: str, args: list[Any]) -> Any:
+    match operator:
+        case "$add":
+            total: Any = 0
+            for arg in args:
+                total = _add(total, arg)
+            return total
+        case "$subtract":
+            return _add(args[0], -_normalize(args[1]))
+    value = args[0]
+    if value is MISSING or value is None:
+        return None
+    match operator:
+        case "$strLenCP":
+            return len(value)
+        case "$toDecimal":
+            return Decimal128(Decimal(str(_normalize(value))))
+        case "$toString":
+            return str(_normalize(value))
+    raise OperationFailure(f"unknown expression operator: {operator}")
+
+
+def evaluate(expression: Any, document: Mapping[str, Any]) -> Any:
+    """Evaluate an aggregation `expression` against `document`."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return get_value(document, expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, document) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not _is_operator_document(expression):
+        return {key: evaluate(value, document) for key, value in expression.items()}
+
+    ((operator, operand),) = expression.items()
+    if operator == "$literal":
+        return operand
+    if operator == "$cond":
+        if isinstance(operand, dict):
+            operand = [operand["if"], operand["then"], operand["else"]]
+        return evaluate(operand[1] if _is_true(evaluate(operand[0], document)) else operand[2], document)
+    args = [evaluate(arg, document) for arg in (operand if isinstance(operand, list) else [operand])]
+    if operator in _COMPARISONS:
+        a, b = (None if arg is MISSING else arg for arg in args)
+        return _COMPARISONS[operator](compare(a, b))
+    match operator:
+        case "$ifNull":
+            return next((arg for arg in args if arg is not MISSING and arg is not None), None)
+        case "$and":
+            return all(_is_true(arg) for arg in args)
+        case "$or":
+            return any(_is_true(arg) for arg in args)
+        case "$not":
+            return not _is_true(args[0])
+    return _evaluate_value_operator(operator, args)
+
+
+def _update_pipeline(document: dict[str, Any], pipeline: list[Mapping[str, Any]]):
+    for stage in pipeline:
+        ((name, spec),) = stage.items()
+        if name in ("$set", "$addFields"):
+            values = {path: evaluate(expression, document) for path, expression in spec.items()}
+            for path, value in values.items():
+                _set_value(document, path, value)
+        elif name in ("$unset", "$project") and (isinstance(spec, (str, list)) or not any(spec.values())):
+            for path in [spec] if isinstance(spec, str) else spec:
+                _unset_value(document, path)
+        else:
+            raise OperationFailure(f"unsupported update pipeline stage: {name}")
+
+
+def _update_array(document: dict[str, Any], operator: str, path: str, value: Any):
+    current = get_value(document, path)
+    items = current if isinstance(current, list) else []
+    if operator == "$pull":
+        if isinstance(value, dict) and not _is_operator_document(value):
+            predicate = compile_query(value)
+            items = [item for item in items if not (isinstance(item, dict) and predicate(item))]
+        else:
+            test = _compile_condition(value)
+            items = [item for item in items if not test([item])]
+        _set_value(document, path, items)
+        return
+
+    modifiers: dict[str, Any] = value if isinstance(value, dict) and "$each" in value else {"$each": [value]}
+    for item in modifiers["$each"]:
+        if operator == "$push" or not any(_equals(existing, item) for existing in items):
+            items.append(item)
+    if "$sort" in modifiers:
+        items = _sort_documents(items, modifiers["$sort"])
+    if "$slice" in modifiers:
+        items = items[modifiers["$slice"] :] if modifiers["$slice"] < 0 else items[: modifiers["$slice"]]
+    _set_value(document, path, items)
+
+
+def _apply_update(document: dict[str, Any], update: Any, is_insert: bool):
+    """Apply an update document or update pipeline to `document` in place.
+
+    Values are not copied, the document is stored through a BSON round trip afterwards.
+    """
+    if isinstance(update, list):
+        _update_pipeline(document, update)
+        return
+
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            match operator:
+                case "$set":
+                    _set_value(document, path, value)
+                case "$setOnInsert":
+                    if is_insert:
+                        _set_value(document, path, value)
+                case "$unset":
+                    _unset_value(document, path)
+                case "$inc":
+                    current = get_value(document, path)
+                    _set_value(document, path, _add(0 if current is MISSING else current, value))
+                case "$min" | "$max":
+                    current = get_value(document, path)
+                    result = compare(current, value) if current is not MISSING else None
+                    if result is None or (result > 0 if operator == "$min" else result < 0):
+                        _set_value(document, path, value)
+                case "$addToSet" | "$push" | "$pull":
+                    _update_array(document, operator, path, value)
+                case _:
+                    raise OperationFailure(f"unknown update operator: {operator}")
+
+
+def _get_upsert_document(query: Mapping[str, Any]) -> dict[str, Any]:
+    """Seed an upserted document with the equality conditions of `query`, as MongoDB does."""
+    document: dict[str, Any] = {}
+    for key, condition in query.items():
+        if key == "$and":
+            for item in condition:
+                document.update(_get_upsert_document(item))
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_document(condition):
+            if "$eq" in condition:
+                _set_value(document, key, condition["$eq"])
+        elif not isinstance(condition, re.Pattern):
+            _set_value(document, key, condition)
+    return document
+
+
+def _get_sort_keys(sort: SortSpec | None, direction: int | None = None) -> list[tuple[str, int]]:
+    if not sort:
+        return []
+    if isinstance(sort, str):
+        return [(sort, direction or 1)]
+    if isinstance(sort, Mapping):
+        return list(sort.items())
+    return [(key, value) for key, value in sort]
+
+
+def _sort_documents(documents: list[Any], sort: Any) -> list[Any]:
+    if not isinstance(sort, (str, dict, list, tuple)):
+        # A plain direction sorts array items by their own value.
+        return sorted(documents, key=cmp_to_key(compare), reverse=sort < 0)
+    documents = list(documents)
+    for path, direction in reversed(_get_sort_keys(sort)):
+        key = cmp_to_key(lambda a, b, path=path: compare(get_value(a, path), get_value(b, path)))
+        documents.sort(key=key, reverse=direction < 0)
+    return documents
+
+
+def _to_storage(document: Mapping[str, Any]) -> dict[str, Any]:
+    return bson.decode(bson.encode(document), codec_options=_STORAGE_CODEC_OPTIONS)
+
+
+def _project(document: Mapping[str, Any], projection: Mapping[str, Any] | Sequence[str] | None) -> dict[str, Any]:
+    if not projection:
+        return dict(document)
+    if not isinstance(projection, dict):
+        projection = dict.fromkeys(projection, 1)
+    include_id = bool(projection.get("_id", 1))
+    fields = {path: value for path, value in projection.items() if path != "_id"}
+    if fields and all(fields.values()):
+        result: dict[str, Any] = {}
+        if include_id and "_id" in document:
+            result["_id"] = document["_id"]
+        for path in fields:
+            value = get_value(document, path)
+            if value is not MISSING:
+                _set_value(result, path, value)
+        return result
+    result = _to_storage(document)
+    for path in fields:
+        _unset_value(result, path)
+    if not include_id:
+        result.pop("_id", None)
+    return result
+
+
+@dataclass
+class MemoryIndex:
+    name: str
+    keys: list[tuple[str, int]]
+    unique: bool = False
+    sparse: bool = False
+    expire_after_seconds: int | None = None
+    entries: dict[tuple, set[Any]] = field(default_factory=dict)
+    # Documents with an array in an indexed field are indexed by the whole array, so equality
+    # lookups on such an index could miss them.
+    multikey: bool = False
+
+    def get_key(self, document: Mapping[str, Any]) -> tuple | None:
+        values = [get_value(document, path) for path, _ in self.keys]
+        if self.sparse and all(value is MISSING for value in values):
+            return None
+        if any(isinstance(value, list) for value in values):
+            self.multikey = True
+        return tuple(freeze(value) for value in values)
+
+    def add(self, document_id: Any, document: Mapping[str, Any]):
+        key = self.get_key(document)
+        if key is not None:
+            self.entries.setdefault(key, set()).add(document_id)
+
+    def remove(self, document_id: Any, document: Mapping[str, Any]):
+        key = self.get_key(document)
+        if key is not None and key in self.entries:
+            self.entries[key].discard(document_id)
+            if not self.entries[key]:
+                del self.entries[key]
+
+    def get_lookup_keys(self, query: Mapping[str, Any]) -> list[tuple] | None:
+        """The index keys holding every document that may match `query`, `None` when the index does not apply."""
+        if self.sparse or self.multikey:
+            return None
+        options = []
+        for path, _ in self.keys:
+            condition = query.get(path, MISSING)
+            if condition is MISSING:
+                return None
+            if _is_operator_document(condition):
+                if set(condition) == {"$eq"}:
+                    values = [condition["$eq"]]
+                elif set(condition) == {"$in"}:
+                    values = list(condition["$in"])
+                else:
+                    return None
+            else:
+                values = [condition]
+            if any(isinstance(value, (list, dict, re.Pattern)) for value in values):
+                return None
+            options.append([freeze(value) for value in values])
+        return list(itertools.product(*options))
+
+
+class MemoryCursor(Cursor):
+    def __init__(
+        self,
+        collection: "MemoryCollection",
+        filter: Mapping[str, Any],
+        projection: Mapping[str, Any] | Sequence[str] | None,
+        sort: SortSpec | None,
+        skip: int,
+        limit: int,
+    ):
+        self._collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._sort = _get_sort_keys(sort)
+        self._skip = skip
+        self._limit = limit
+
+    def sort(self, key_or_list: SortSpec, direction: int | None = None) -> "MemoryCursor":
+        self._sort = _get_sort_keys(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    async def to_list(self, length: int | None = None) -> list[Document]:
+        await asyncio.sleep(0)
+        documents = self._collection._find(self._filter, self._sort, self._skip, self._limit)
+        if length:
+            documents = documents[:length]
+        return [self._collection._load(document, self._projection) for document in documents]
+
+    async def __aiter__(self) -> AsyncIterator[Document]:
+        for document in await self.to_list():
+            yield document
+
+    async def close(self):
+        pass
+
+
+class MemoryCommandCursor(CommandCursor):
+    def __init__(self, documents: list[Document]):
+        self._documents = documents
+
+    async def to_list(self, length: int | None = None) -> list[Document]:
+        return self._documents[:length] if length else list(self._documents)
+
+    async def __aiter__(self) -> AsyncIterator[Document]:
+        for document in self._documents:
+            yield document
+
+    async def close(self):
+        pass
+
+
+class MemoryCollection(Collection):
+    """A collection kept in process memory with the semantics of a single MongoDB node.
+
+    Documents keep their insertion order, which is the order of unsorted reads. Unique indexes
+    reject duplicates with the same errors as MongoDB, equality queries on the fields of an
+    index read only the matching documents, and TTL indexes drop expired documents. Every
+    operation runs without awaiting in between, so it is atomic like a single document write.
+    """
+
+    def __init__(self, name: str, database: "MemoryDatabase"):
+        self._name = name
+        self._database = database
+        self.codec_options = database.codec_options
+        self._documents: dict[Any, dict[str, Any]] = {}
+        self._positions: dict[Any, int] = {}
+        self._counter = itertools.count()
+        self._indexes: dict[str, MemoryIndex] = {}
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def database(self) -> "MemoryDatabase":
+        return self._database
+
+    def with_options(self, codec_options: CodecOptions | None = None) -> "MemoryCollection":
+        """Return a view of the same documents decoded with `codec_options`."""
+        view = copy.copy(self)
+        view.codec_options = codec_options or self.codec_options
+        return view
+
+    # Reads
+
+    def _load(self, document: Mapping[str, Any], projection: Mapping[str, Any] | Sequence[str] | None = None):
+        """Copy a stored document out, decoded with the codec options of the collection."""
+        return bson.decode(bson.encode(_project(document, projection)), codec_options=self.codec_options)
+
+    def _expire(self):
+        for index in self._indexes.values():
+            if index.expire_after_seconds is None:
+                continue
+            path = index.keys[0][0]
+            deadline = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=index.expire_after_seconds)
+            for document in list(self._documents.values()):
+                value = get_value(document, path)
+                if isinstance(value, datetime) and _normalize(value) < deadline:
+                    self._remove(document)
+
+    def _get_candidates(self, query: Mapping[str, Any]) -> Iterable[dict[str, Any]]:
+        document_id = query.get("_id", MISSING)
+        if document_id is not MISSING and not isinstance(document_id, (list, dict, re.Pattern)):
+            document = self._documents.get(freeze(document_id))
+            return [document] if document is not None else []
+        if isinstance(document_id, dict) and set(document_id) == {"$in"}:
+            keys = {freeze(item) for item in document_id["$in"]}
+            documents = [self._documents[key] for key in keys if key in self._documents]
+            return sorted(documents, key=self._get_position)
+        for index in sorted(self._indexes.values(), key=lambda index: not index.unique):
+            keys = index.get_lookup_keys(query)
+            if keys is None:
+                continue
+            ids = set().union(*(index.entries.get(key, ()) for key in keys))
+            return sorted((self._documents[id_] for id_ in ids), key=self._get_position)
+        return list(self._documents.values())
+
+    def _get_position(self, document: Mapping[str, Any]) -> int:
+        return self._positions[freeze(document["_id"])]
+
+    def _find(
+        self,
+        query: Mapping[str, Any] | None,
+        sort: SortSpec | None = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> list[dict[str, Any]]:
+        self._expire()
+        query = query or {}
+        predicate = compile_query(query)
+        documents = [document for document in self._get_candidates(query) if predicate(document)]
+        if sort:
+            documents = _sort_documents(documents, sort)
+        documents = documents[skip:]
+        return documents[:limit] if limit else documents
+
+    def find(
+        self,
+        filter: Mapping[str, Any] | None = None,
+        projection: Mapping[str, Any] | Sequence[str] | None = None,
+        *,
+        sort: SortSpec | None = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> MemoryCursor:
+        return MemoryCursor(self, filter or {}, projection, sort, skip, limit)
+
+    async def find_one(
+        self,
+        filter: Mapping[str, Any] | None = None,
+        projection: Mapping[str, Any] | Sequence[str] | None = None,
+        *,
+        sort: SortSpec | None = None,
+    ) -> Document | None:
+        documents = await self.find(filter, projection, sort=sort, limit=1).to_list()
+        return documents[0] if documents else None
+
+    async def count_documents(self, filter: Mapping[str, Any]) -> int:
+        await asyncio.sleep(0)
+        return len(self._find(filter))
+
+    async def estimated_document_count(self) -> int:
+        return len(self._documents)
+
+    async def distinct(self, key: str, filter: Mapping[str, Any] | None = None) -> list[Any]:
+        await asyncio.sleep(0)
+        values: dict[Any, Any] = {}
+        for document in self._find(filter):
+            for value in _expand([get_value(document, key)]):
+                if value is not MISSING and not isinstance(value, list):
+                    values.setdefault(freeze(value), value)
+        return [self._load({"value": value})["value"] for value in values.values()]
+
+    # Writes
+
+    def _check_unique(self, document: Mapping[str, Any], replaced_id: Any = MISSING):
+        key = freeze(document["_id"])
+        if key in self._documents and key != replaced_id:
+            raise self._duplicate_key_error("_id_", {"_id": document["_id"]})
+        for index in self._indexes.values():
+            if not index.unique:
+                continue
+            index_key = index.get_key(document)
+            if index_key is not None and index.entries.get(index_key, set()) - {replaced_id}:
+                values = {path: get_value(document, path) for path, _ in index.keys}
+                raise self._duplicate_key_error(index.name, values)
+
+    def _duplicate_key_error(self, index_name: str, values: Mapping[str, Any]) -> DuplicateKeyError:
+        message = f"E11000 duplicate key error collection: {self._name} index: {index_name} dup key: {values}"
+        return DuplicateKeyError(
+            message, DUPLICATE_KEY_ERROR_CODE, {"code": DUPLICATE_KEY_ERROR_CODE, "errmsg": message}
+        )
+
+    def _insert(self, document: dict[str, Any]) -> Any:
+        # Like pymongo, the `_id` of an inserted document is set on the caller's document.
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        stored = _to_storage(document)
+        self._check_unique(stored)
+        key = freeze(stored["_id"])
+        self._documents[key] = stored
+        self._positions[key] = next(self._counter)
+        for index in self._indexes.values():
+            index.add(key, stored)
+        self._database._created.add(self._name)
+        return stored["_id"]
+
+    def _replace(self, document: dict[str, Any], replacement: dict[str, Any]) -> bool:
+        """Store `replacement` in place of `document`, returning whether anything changed."""
+        key = freeze(document["_id"])
+        if freeze(replacement.get("_id", document["_id"])) != key:
+            raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'")
+        stored = _to_storage({"_id": document["_id"], **replacement})
+        if stored == document:
+            return False
+        self._check_unique(stored, replaced_id=key)
+        for index in self._indexes.values():
+            index.remove(key, document)
+            index.add(key, stored)
+        self._documents[key] = stored
+        return True
+
+    def _remove(self, document: Mapping[str, Any]):
+        key = freeze(document["_id"])
+        for index in self._indexes.values():
+            index.remove(key, document)
+        del self._documents[key]
+        del self._positions[key]
+
+    def _update(
+        self,
+        query: Mapping[str, Any],
+        update: Any,
+        multi: bool,
+        upsert: bool,
+        sort: SortSpec | None = None,
+    ) -> tuple[int, int, Any, dict[str, Any] | None, dict[str, Any] | None]:
+        """Return the matched and modified counts, the upserted id and the first document before and after."""
+        documents = self._find(query, sort, limit=0 if multi else 1)
+        if not documents:
+            if not upsert:
+                return 0, 0, None, None, None
+            document = _get_upsert_document(query)
+            _apply_update(document, update, is_insert=True)
+            document_id = self._insert(document)
+            return 0, 0, document_id, None, self._documents[freeze(document_id)]
+
+        modified = 0
+        before = after = documents[0]
+        for document in documents:
+            updated = _to_storage(document)
+            _apply_update(updated, update, is_insert=False)
+            if self._replace(document, updated):
+                modified += 1
+            if document is before:
+                after = self._documents[freeze(document["_id"])]
+        return len(documents), modified, None, before, after
+
+    @staticmethod
+    def _get_update_result(matched: int, modified: int, upserted_id: Any) -> UpdateResult:
+        raw_result = {"n": matched + (upserted_id is not None), "nModified": modified, "updatedExisting": matched > 0}
+        if upserted_id is not None:
+            raw_result["upserted"] = upserted_id
+        return UpdateResult(raw_result, acknowledged=True)
+
+    async def insert_one(self, document: Document) -> InsertOneResult:
+        await asyncio.sleep(0)
+        self._expire()
+        return InsertOneResult(self._insert(document), acknowledged=True)
+
+    async def insert_many(self, documents: Iterable[Document], ordered: bool = True) -> InsertManyResult:
+        documents = list(documents)
+        result = await self.bulk_write([InsertOne(document) for document in documents], ordered=ordered)
+        return InsertManyResult([document["_id"] for document in documents], acknowledged=result.acknowledged)
+
+    async def update_one(
+        self,
+        filter: Mapping[str, Any],
+        update: Mapping[str, Any] | Sequence[Mapping[str, Any]],
+        upsert: bool = False,
+    ) -> UpdateResult:
+        await asyncio.sleep(0)
+        matched, modified, upserted_id, _, _ = self._update(filter, update, multi=False, upsert=upsert)
+        return self._get_update_result(matched, modified, upserted_id)
+
+    async def update_many(
+        self,
+        filter: Mapping[str, Any],
+        update: Mapping[str, Any] | Sequence[Mapping[str, Any]],
+        upsert: bool = False,
+    ) -> UpdateResult:
+        await asyncio.sleep(0)
+        matched, modified, upserted_id, _, _ = self._update(filter, update, multi=True, upsert=upsert)
+        return self._get_update_result(matched, modified, upserted_id)
+
+    def _replace_one(
+        self, query: Mapping[str, Any], replacement: Mapping[str, Any], upsert: bool
+    ) -> tuple[int, int, Any]:
+        documents = self._find(query, limit=1)
+        if documents:
+            return 1, int(self._replace(documents[0], dict(replacement))), None
+        if not upsert:
+            return 0, 0, None
+        document = dict(replacement)
+        if "_id" not in document and "_id" in query and not _is_operator_document(query["_id"]):
+            document["_id"] = query["_id"]
+        return 0, 0, self._insert(document)
+
+    async def replace_one(self, filter: Mapping[str, Any], replacement: Document, upsert: bool = False) -> UpdateResult:
+        await asyncio.sleep(0)
+        return self._get_update_result(*self._replace_one(filter, replacement, upsert))
+
+    async def find_one_and_update(
+        self,
+        filter: Mapping[str, Any],
+        update: Mapping[str, Any] | Sequence[Mapping[str, Any]],
+        projection: Mapping[str, Any] | Sequence[str] | None = None,
+        sort: SortSpec | None = None,
+        upsert: bool = False,
+        return_document: bool = False,
+    ) -> Document | None:
+        await asyncio.sleep(0)
+        _, _, _, before, after = self._update(filter, update, multi=False, upsert=upsert, sort=sort)
+        document = after if return_document else before
+        return self._load(document, projection) if document is not None else None
+
+    def _delete(self, query: Mapping[str, Any], multi: bool) -> int:
+        documents = self._find(query, limit=0 if multi else 1)
+        for document in documents:
+            self._remove(document)
+        return len(documents)
+
+    async def delete_one(self, filter: Mapping[str, Any]) -> DeleteResult:
+        await asyncio.sleep(0)
+        return DeleteResult({"n": self._delete(filter, multi=False)}, acknowledged=True)
+
+    async def delete_many(self, filter: Mapping[str, Any]) -> DeleteResult:
+        await asyncio.sleep(0)
+        return DeleteResult({"n": self._delete(filter, multi=True)}, acknowledged=True)
+
+    async def bulk_write(self, requests: Sequence[Any], ordered: bool = True) -> BulkWriteResult:
+        await asyncio.sleep(0)
+        self._expire()
+        result: dict[str, Any] = {
+            "writeErrors": [],
+            "writeConcernErrors": [],
+            "nInserted": 0,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+        }
+        for index, request in enumerate(requests):
+            try:
+                upserted_id = None
+                match request:
+                    case InsertOne():
+                        self._insert(request._doc)  # type: ignore
+                        result["nInserted"] += 1
+                    case UpdateOne() | UpdateMany():
+                        matched, modified, upserted_id, _, _ = self._update(
+                            request._filter,
+                            request._doc,
+                            multi=isinstance(request, UpdateMany),
+                            upsert=bool(request._upsert),
+                        )
+                        result["nMatched"] += matched
+                        result["nModified"] += modified
+                    case ReplaceOne():
+                        matched, modified, upserted_id = self._replace_one(
+                            request._filter, request._doc, bool(request._upsert)
+                        )
+                        result["nMatched"] += matched
+                        result["nModified"] += modified
+                    case DeleteOne() | DeleteMany():
+                        result["nRemoved"] += self._delete(request._filter, multi=isinstance(request, DeleteMany))
+                    case _:
+                        raise OperationFailure(f"unsupported bulk write request: {request!r}")
+                if upserted_id is not None:
+                    result["nUpserted"] += 1
+                    result["upserted"].append({"index": index, "_id": upserted_id})
+            except DuplicateKeyError as e:
+                result["writeErrors"].append(
+                    {"index": index, "code": DUPLICATE_KEY_ERROR_CODE, "errmsg": str(e), "op": request}
+                )
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, acknowledged=True)
+
+    # Aggregation
+
+    def _group(self, documents: list[dict[str, Any]], spec: Mapping[str, Any]) -> list[dict[str, Any]]:
+        groups: dict[Any, dict[str, Any]] = {}
+        for document in documents:
+            group_id = evaluate(spec["_id"], document)
+            group_id = None if group_id is MISSING else group_id
+            group = groups.setdefault(freeze(group_id), {"_id": group_id})
+            for name, accumulator in spec.items():
+                if name == "_id":
+                    continue
+                ((operator, expression),) = accumulator.items()
+                value = evaluate(expression, document) if operator != "$count" else 1
+                current = group.get(name, MISSING)
+                match operator:
+                    case "$sum" | "$count":
+                        numeric = isinstance(value, (int, float, Decimal128)) and not isinstance(value, bool)
+                        group[name] = _add(0 if current is MISSING else current, value if numeric else 0)
+                    case "$push":
+                        group[name] = (current if current is not MISSING else []) + [value]
+                    case "$addToSet":
+                        items = current if current is not MISSING else []
+                        if not any(_equals(item, value) for item in items):
+                            items.append(value)
+                        group[name] = items
+                    case "$first":
+                        if current is MISSING:
+                            group[name] = value
+                    case "$last":
+                        group[name] = value
+                    case "$min" | "$max":
+                        if value in (MISSING, None):
+                            group.setdefault(name, None)
+                        elif current in (MISSING, None) or (compare(value, current) < 0) == (operator == "$min"):
+                            group[name] = value
+                    case _:
+                        raise OperationFailure(f"unknown group operator: {operator}")
+        return list(groups.values())
+
+    def _get_collection_stats(self) -> dict[str, Any]:
+        size = sum(len(bson.encode(document)) for document in self._documents.values())
+        return {
+            "ns": f"{self._database.name}.{self._name}",
+            "storageStats": {"size": size, "storageSize": size, "totalIndexSize": 0, "count": len(self._documents)},
+        }
+
+    def _get_index_stats(self) -> list[dict[str, Any]]:
+        since = datetime.now(timezone.utc)
+        indexes = [("_id_", {"_id": 1})] + [(index.name, dict(index.keys)) for index in self._indexes.values()]
+        return [{"name": name, "key": key, "accesses": {"ops": 0, "since": since}} for name, key in indexes]
+
+    async def aggregate(self, pipeline: Sequence[Mapping[str, Any]]) -> MemoryCommandCursor:
+        await asyncio.sleep(0)
+        documents: list[dict[str, Any]] | None = None
+        for stage in pipeline:
+            ((name, spec),) = stage.items()
+            if name == "$collStats":
+                documents = [self._get_collection_stats()]
+                continue
+            if name == "$indexStats":
+                documents = self._get_index_stats()
+                continue
+            if documents is None:
+                # The first stage reads through the indexes when it is a `$match`.
+                documents = self._find(spec) if name == "$match" else self._find({})
+                if name == "$match":
+                    continue
+            match name:
+                case "$match":
+                    predicate = compile_query(spec)
+                    documents = [document for document in documents if predicate(document)]
+                case "$sort":
+                    documents = _sort_documents(documents, spec)
+                case "$limit":
+                    documents = documents[:spec]
+                case "$skip":
+                    documents = documents[spec:]
+                case "$group":
+                    documents = self._group(documents, spec)
+                case "$count":
+                    documents = [{spec: len(documents)}]
+                case "$set" | "$addFields":
+                    documents = [
+                        document | {path: evaluate(expression, document) for path, expression in spec.items()}
+                        for document in documents
+                    ]
+                case "$project":
+                    documents = [_project(document, spec) for document in documents]
+                case _:
+                    raise OperationFailure(f"unsupported aggregation stage: {name}")
+        return MemoryCommandCursor([self._load(document) for document in documents or []])
+
+    # Indexes and change streams
+
+    async def create_index(self, keys: Any, **kwargs: Any) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = [(key, 1) if isinstance(key, str) else tuple(key) for key in keys]
+        name = kwargs.get("name") or "_".join(f"{path}_{direction}" for path, direction in keys)
+        if name in self._indexes:
+            return name
+        index = MemoryIndex(
+            name=name,
+            keys=keys,
+            unique=kwargs.get("unique", False),
+            sparse=kwargs.get("sparse", False),
+            expire_after_seconds=kwargs.get("expireAfterSeconds"),
+        )
+        for document in self._documents.values():
+            key = freeze(document["_id"])
+            if index.unique and index.get_key(document) in index.entries:
+                values = {path: get_value(document, path) for path, _ in keys}
+                raise self._duplicate_key_error(name, values)
+            index.add(key, document)
+        self._indexes[name] = index
+        self._database._created.add(self._name)
+        return name
+
+    async def index_information(self) -> dict[str, dict[str, Any]]:
+        information: dict[str, dict[str, Any]] = {"_id_": {"key": [("_id", 1)]}}
+        for index in self._indexes.values():
+            information[index.name] = {"key": index.keys, "unique": index.unique, "sparse": index.sparse}
+        return information
+
+    def _clear(self):
+        self._documents.clear()
+        self._positions.clear()
+        self._indexes.clear()
+
+    async def drop(self):
+        await self._database.drop_collection(self._name)
+
+    async def watch(self, pipeline: Sequence[Mapping[str, Any]] | None = None, **kwargs: Any) -> Any:
+        raise OperationFailure("The in-memory storage does not support change streams")
+
+
+class MemoryDatabase(Database):
+    """A database of `MemoryCollection`s, returned by `get_db_connection` for the memory storage backend."""
+
+    def __init__(self, name: str, codec_options: CodecOptions | None = None):
+        self.name = name
+        self.codec_options = codec_options or CodecOptions()
+        self._collections: dict[str, MemoryCollection] = {}
+        # Like MongoDB, a collection only exists once written to or indexed.
+        self._created: set[str] = set()
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def get_collection(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name, self)
+        return self._collections[name]
+
+    async def list_collection_names(self, filter: Mapping[str, Any] | None = None) -> list[str]:
+        predicate = compile_query(filter or {})
+        return [name for name in sorted(self._created) if predicate({"name": name})]
+
+    async def drop_collection(self, name: str) -> None:
+        # Collections are cleared in place, since modules keep them in their `get_collection` caches.
+        if name in self._collections:
+            self._collections[name]._clear()
+        self._created.discard(name)
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+from pymongo import ASCENDING, DESCENDING
+
+from .amount import DECIMAL128_MAX_DIGITS
+from .archive import get_tombstone_collection_name
+from .codec import backfill_all, log_backfill_report
+from .db import get_db_connection
+from .lease import LEASE_OWNER_FIELD
+
+logger = logging.getLogger(__name__)
+
+DEPOSIT_COLLECTIONS = ("evm_deposit", "btc_deposit")
+ADDRESS_COLLECTIONS = ("evm_address", "btc_address")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[], Awaitable[None]]
+
+
+@lru_cache()
+def get_collection():
+    return get_db_connection()["migration"]
+
+
+async def _create_unique_indexes():
+    db = get_db_connection()
+    await db["evm_deposit"].create_index(("transfer.tx_hash", "transfer.chain_symbol"), unique=True)
+    await db["btc_deposit"].create_index(("transfer.tx_hash", "transfer.chain_symbol", "transfer.index"), unique=True)
+    for name in ADDRESS_COLLECTIONS:
+        await db[name].create_index("user_id", unique=True)
+        await db[name].create_index("address", unique=True)
+    await db["chain"].create_index("chain_symbol", unique=True)
+    await db["token"].create_index(("token_address", "chain_symbol"), unique=True)
+    await db["btc_utxo"].create_index(("tx_hash", "index"), unique=True)
+    await db["withdraw"].create_index(("nonce", "chain_symbol"), unique=True)
+    await db["block_retry"].create_index(("chain_symbol", "block_number"), unique=True)
+    await db["block_range"].create_index(("chain_symbol", "from_block"), unique=True)
+    await db["block_range"].create_index(("chain_symbol", "status", "lease_expires_at"))
+
+
+async def _create_query_indexes():
+    db = get_db_connection()
+    for name in DEPOSIT_COLLECTIONS:
+        # find_deposit_by_status, get_pending_deposits_block_number and the reorg updates
+        await db[name].create_index(("transfer.chain_symbol", "status", "transfer.block_number"))
+        # find_address_deposits
+        await db[name].create_index(("transfer.chain_symbol", "transfer.to", "transfer.block_number"))
+    # find_withdraws_by_status
+    await db["withdraw"].create_index(("chain_symbol", "status", "nonce"))
+    # find_user_withdraws
+    await db["withdraw"].create_index(("chain_symbol", "user_id", "nonce"))
+
+
+def _get_amount_conversion(field: str) -> list[dict]:
+    return [
+        {
+            "$set": {
+                field: {
+                    "$cond": [
+                        {"$lte": [{"$strLenCP": f"${field}"}, DECIMAL128_MAX_DIGITS]},
+                        {"$toDecimal": f"${field}"},
+                        f"${field}",
+                    ]
+                }
+            }
+        }
+    ]
+
+
+async def _convert_amounts_to_decimal128():
+    db = get_db_connection()
+    amount_fields = [(name, "transfer.value") for name in DEPOSIT_COLLECTIONS] + [
+        ("btc_utxo", "amount"),
+        ("withdraw", "amount"),
+    ]
+    for name, field in amount_fields:
+        await db[name].update_many({field: {"$type": "string"}}, _get_amount_conversion(field))
+
+
+async def _create_lease_indexes():
+    db = get_db_connection()
+    # renew_records and release_records, only leased records are indexed
+    for name in DEPOSIT_COLLECTIONS + ("withdraw",):
+        await db[name].create_index(LEASE_OWNER_FIELD, sparse=True)
+
+
+async def _create_utxo_amount_index():
+    db = get_db_connection()
+    # find_spendable_utxos, the largest unspent UTXOs first
+    await db["btc_utxo"].create_index([("status", ASCENDING), ("amount", DESCENDING)])
+    await db["btc_utxo"].create_index(LEASE_OWNER_FIELD, sparse=True)
+
+
+async def _create_chain_lease_indexes():
+    db = get_db_connection()
+    # acquire_chain_lease relies on the conflict of this index when another replica holds the lease
+    await db["chain_lease"].create_index(("stage", "chain_symbol"), unique=True)
+    await db["stage_member"].create_index(("stage", "owner"), unique=True)
+    # Members of replicas which stopped announcing themselves are dropped by Mongo
+    await db["stage_member"].create_index("expires_at", expireAfterSeconds=0)
+
+
+async def _create_summary_indexes():
+    db = get_db_connection()
+    # find_user_deposit_summary and find_user_withdraw_summary, also keeping one summary per user
+    for name in ("deposit_summary", "withdraw_summary"):
+        await db[name].create_index(("chain_symbol", "user_id"), unique=True)
+
+
+async def _create_tombstone_indexes():
+    db = get_db_connection()
+    # insert_deposits_if_not_exists looks archived deposits up by their keys
+    await db[get_tombstone_collection_name("evm_deposit")].create_index(
+        ("transfer.tx_hash", "transfer.chain_symbol"), unique=True
+    )
+    await db[get_tombstone_collection_name("btc_deposit")].create_index(
+        ("transfer.tx_hash", "transfer.chain_symbol", "transfer.index"), unique=True
+    )
+
+
+async def _backfill_compact_codec():
+    log_backfill_report(await backfill_all())
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "Create unique indexes", _create_unique_indexes),
+    Migration(2, "Create compound indexes for status, address and withdraw queries", _create_query_indexes),
+    Migration(3, "Store amounts as Decimal128", _convert_amounts_to_decimal128),
+    Migration(4, "Store hashes, addresses and chain symbols in the compact codec", _backfill_compact_codec),
+    Migration(5, "Create lease owner indexes", _create_lease_indexes),
+    Migration(6, "Create UTXO status, amount and reservation indexes", _create_utxo_amount_index),
+    Migration(7, "Create chain lease and stage member indexes", _create_chain_lease_indexes),
+    Migration(8, "Create user summary indexes", _create_summary_indexes),
+    Migration(9, "Create archived deposit tombstone indexes", _create_tombstone_indexes),
+]
+
+
+async def create_chain_deposit_indexes():
+    """Index the per-chain deposit collections of the configured chains under `DepositPartitioning.CHAIN`.
+
+    The migrations only know the shared collections, and chains may be added after they ran.
+    """
+    from .deposit import DEPOSIT_PARTITIONING, DepositPartitioning, get_collection
+
+    if DEPOSIT_PARTITIONING != DepositPartitioning.CHAIN:
+        return
+    from zexporta.config import CHAINS_CONFIG
+
+    from .partition import create_deposit_indexes
+
+    for chain in CHAINS_CONFIG.values():
+        await create_deposit_indexes(get_collection(chain), chain, DEPOSIT_PARTITIONING)
+
+
+async def get_applied_version() -> int:
+    record = await get_collection().find_one({}, sort=[("version", DESCENDING)])
+    return record["version"] if record is not None else 0
+
+
+async def migrate(migrations: list[Migration] = MIGRATIONS) -> int:
+    """Apply the migrations newer than the recorded version and return the resulting version.
+
+    Every migration must be idempotent: services call this on start, so several of them may
+    apply the same version concurrently. Per-chain deposit collections are indexed on every call.
+    """
+    applied_version = await get_applied_version()
+    for migration in sorted(migrations, key=lambda migration: migration.version):
+        if migration.version <= applied_version:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+        await migration.apply()
+        await get_collection().update_one(
+            {"version": migration.version},
+            {
+                "$setOnInsert": {
+                    "description": migration.description,
+                    "applied_at": datetime.now(timezone.utc),
+                }
+            },
+            upsert=True,
+        )
+        applied_version = migration.version
+    await create_chain_deposit_indexes()
+    return applied_version
+
+
+async def get_index_usage(collection_name: str) -> list[dict]:
+    """Return `$indexStats` of a collection as `{"name", "key", "ops", "since"}` records."""
+    cursor = await get_db_connection()[collection_name].aggregate([{"$indexStats": {}}])
+    return [
+        {
+            "name": record["name"],
+            "key": record["key"],
+            "ops": record["accesses"]["ops"],
+            "since": record["accesses"]["since"],
+        }
+        async for record in cursor
+    ]
+
+
+async def report_index_usage():
+    for collection_name in sorted(await get_db_connection().list_collection_names()):
+        for index in await get_index_usage(collection_name):
+            logger.info(f"{collection_name}.{index['name']}: {index['ops']} ops since {index['since']}")
+
+
+async def main():
+    version = await migrate()
+    logger.info(f"Database is at migration version {version}")
+    await report_index_usage()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from typing import Any
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+CHANGE_STREAM_RETRY_DELAY = 5
+_WATCHED_OPERATIONS = ["insert", "update", "replace"]
+
+
+class ChangeNotifier:
+    """Wake a waiting stage when a document matching `match` is inserted or updated.
+
+    Changes are read from a MongoDB change stream on `collection`, and `match` is applied to the
+    full document after the change. Deployments without a replica set do not support change
+    streams, so `wait` then degrades to a plain sleep of `poll_interval`.
+    """
+
+    def __init__(
+        self,
+        collection,
+        match: dict[str, Any],
+        poll_interval: float,
+        max_wait: float,
+        logger: logging.Logger | logging.LoggerAdapter | None = None,
+    ):
+        self.collection = collection
+        self.match = match
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.logger = logger or logging.getLogger(__name__)
+        self.supported = True
+        self._changed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _get_pipeline(self) -> list[dict]:
+        match = {f"fullDocument.{field}": value for field, value in self.match.items()}
+        return [{"$match": {"operationType": {"$in": _WATCHED_OPERATIONS}, **match}}]
+
+    async def _watch(self):
+        while True:
+            try:
+                async with await self.collection.watch(
+                    self._get_pipeline(),
+                    full_document="updateLookup",
+                ) as stream:
+                    # Anything may have changed before the stream was opened.
+                    self._changed.set()
+                    async for _ in stream:
+                        self._changed.set()
+            except OperationFailure as e:
+                self.logger.warning(f"Change streams are not available, fall back to polling: {e}")
+                self.supported = False
+                self._changed.set()
+                return
+            except PyMongoError as e:
+                self.logger.error(f"Change stream failed, reopen in {CHANGE_STREAM_RETRY_DELAY}s: {e}")
+                self._changed.set()
+                await asyncio.sleep(CHANGE_STREAM_RETRY_DELAY)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def wait(self, timeout: float | None = None) -> bool:
+        """Wait for a matching change, return `False` if none was seen within `timeout` or `max_wait`."""
+        self.start()
+        if not self.supported:
+            await asyncio.sleep(min(self.poll_interval, timeout or self.poll_interval))
+            return False
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout or self.max_wait)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Iterable
+
+from zexporta.custom_types import ChainConfig
+
+from .amount import get_raw_collection
+from .bulk import bulk_upsert
+from .codec import encode_chain_symbol
+from .db import get_db_connection
+from .deposit import DEPOSIT_PARTITIONING, DepositPartitioning, get_collection_name, get_key_fields
+from .lease import LEASE_OWNER_FIELD
+
+logger = logging.getLogger(__name__)
+
+PARTITION_BATCH_SIZE = 1000
+
+
+async def create_deposit_indexes(collection, chain: ChainConfig, partitioning: DepositPartitioning):
+    """Create the deposit indexes of `collection`, the chain prefix is dropped on per-chain collections."""
+    await collection.create_index(get_key_fields(chain), unique=True)
+    prefix = ("transfer.chain_symbol",) if partitioning == DepositPartitioning.SHARED else ()
+    await collection.create_index(prefix + ("status", "transfer.block_number"))
+    await collection.create_index(prefix + ("transfer.to", "transfer.block_number"))
+    await collection.create_index(LEASE_OWNER_FIELD, sparse=True)
+
+
+async def move_deposits(
+    chain: ChainConfig,
+    partitioning: DepositPartitioning = DEPOSIT_PARTITIONING,
+    batch_size: int = PARTITION_BATCH_SIZE,
+) -> int:
+    """Move the deposits of `chain` into the collection used by `partitioning` and return how many moved.
+
+    Deposits are copied first, keeping their `_id`, and deleted from the other layout afterwards,
+    so an interrupted run is completed by the next one. A deposit already present in the target
+    collection is kept and its source copy dropped.
+    """
+    db = get_db_connection()
+    source_partitioning = next(item for item in DepositPartitioning if item != partitioning)
+    source = get_raw_collection(db[get_collection_name(chain, source_partitioning)])
+    target = db[get_collection_name(chain, partitioning)]
+    await create_deposit_indexes(target, chain, partitioning)
+
+    query = {"transfer.chain_symbol": {"$in": [chain.chain_symbol, encode_chain_symbol(chain.chain_symbol)]}}
+    moved = 0
+    while records := await source.find(query, sort=[("_id", 1)]).limit(batch_size).to_list():
+        await bulk_upsert(target, records, get_key_fields(chain), insert_only=True)
+        result = await source.delete_many({"_id": {"$in": [record["_id"] for record in records]}})
+        moved += result.deleted_count
+    return moved
+
+
+async def partition_deposits(chains: Iterable[ChainConfig]) -> dict[str, int]:
+    """Move the deposits of every chain into the configured `DEPOSIT_PARTITIONING` layout.
+
+    Stop the deposit services while it runs: reads only look at the configured layout.
+    """
+    moved = {}
+    for chain in chains:
+        moved[chain.chain_symbol] = await move_deposits(chain)
+        logger.info(f"Moved {moved[chain.chain_symbol]} {chain.chain_symbol} deposits to {get_collection_name(chain)}")
+    return moved
+
+
+async def main():
+    from zexporta.config import CHAINS_CONFIG
+
+    await partition_deposits(CHAINS_CONFIG.values())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+from typing import Any, AsyncIterator, Iterable, Mapping, Protocol, Sequence
+
+from bson.codec_options import CodecOptions
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+type Document = dict[str, Any]
+type SortSpec = str | Sequence[tuple[str, int]] | Mapping[str, int]
+
+
+class Cursor(Protocol):
+    def sort(self, key_or_list: SortSpec, direction: int | None = None) -> "Cursor": ...
+
+    def skip(self, skip: int) -> "Cursor": ...
+
+    def limit(self, limit: int) -> "Cursor": ...
+
+    async def to_list(self, length: int | None = None) -> list[Document]: ...
+
+    def __aiter__(self) -> AsyncIterator[Document]: ...
+
+
+class CommandCursor(Protocol):
+    async def to_list(self, length: int | None = None) -> list[Document]: ...
+
+    def __aiter__(self) -> AsyncIterator[Document]: ...
+
+
+class Collection(Protocol):
+    """The collection operations `zexporta.db` relies on, as offered by `pymongo.AsyncCollection`.
+
+    Queries, updates, update pipelines and aggregation pipelines use the MongoDB syntax; a
+    backend raises `pymongo.errors.OperationFailure` for operators it does not support, and
+    `DuplicateKeyError` or `BulkWriteError` when a write violates a unique index.
+    """
+
+    @property
+    def name(self) -> str: ...
+
+    def with_options(self, codec_options: CodecOptions | None = None) -> "Collection": ...
+
+    def find(
+        self,
+        filter: Mapping[str, Any] | None = None,
+        projection: Mapping[str, Any] | Sequence[str] | None = None,
+        *,
+        sort: SortSpec | None = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> Cursor: ...
+
+    async def find_one(
+        self,
+        filter: Mapping[str, Any] | None = None,
+        projection: Mapping[str, Any] | Sequence[str] | None = None,
+        *,
+        sort: SortSpec | None = None,
+    ) -> Document | None: ...
+
+    async def find_one_and_update(
+        self,
+        filter: Mapping[str, Any],
+        update: Mapping[str, Any] | Sequence[Mapping[str, Any]],
+        projection: Mapping[str, Any] | Sequence[str] | None = None,
+        sort: SortSpec | None = None,
+        upsert: bool = False,
+        return_document: bool = False,
+    ) -> Document | None: ...
+
+    async def insert_one(self, document: Document) -> InsertOneResult: ...
+
+    async def insert_many(self, documents: Iterable[Document], ordered: bool = True) -> InsertManyResult: ...
+
+    async def update_one(
+        self,
+        filter: Mapping[str, Any],
+        update: Mapping[str, Any] | Sequence[Mapping[str, Any]],
+        upsert: bool = False,
+    ) -> UpdateResult: ...
+
+    async def update_many(
+        self,
+        filter: Mapping[str, Any],
+        update: Mapping[str, Any] | Sequence[Mapping[str, Any]],
+        upsert: bool = False,
+    ) -> UpdateResult: ...
+
+    async def replace_one(
+        self, filter: Mapping[str, Any], replacement: Document, upsert: bool = False
+    ) -> UpdateResult: ...
+
+    async def delete_one(self, filter: Mapping[str, Any]) -> DeleteResult: ...
+
+    async def delete_many(self, filter: Mapping[str, Any]) -> DeleteResult: ...
+
+    async def count_documents(self, filter: Mapping[str, Any]) -> int: ...
+
+    async def bulk_write(self, requests: Sequence[Any], ordered: bool = True) -> BulkWriteResult: ...
+
+    async def aggregate(self, pipeline: Sequence[Mapping[str, Any]]) -> CommandCursor: ...
+
+    async def create_index(self, keys: Any, **kwargs: Any) -> str: ...
+
+    async def watch(self, pipeline: Sequence[Mapping[str, Any]] | None = None, **kwargs: Any) -> Any: ...
+
+
+class Database(Protocol):
+    def __getitem__(self, name: str) -> Collection: ...
+
+    async def list_collection_names(self, filter: Mapping[str, Any] | None = None) -> list[str]: ...
+
+    async def drop_collection(self, name: str) -> Any: ...
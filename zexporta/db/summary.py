@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from itertools import batched
+from typing import Any, AsyncIterable, Iterable
+
+from bson.decimal128 import Decimal128, create_decimal128_context
+from pymongo import DESCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from zexporta.custom_types import ChainConfig, UserId, UserSummary
+
+from .bulk import BULK_WRITE_CHUNK_SIZE, DUPLICATE_KEY_ERROR_CODE
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent records kept in every summary
+SUMMARY_LATEST_ITEMS = int(os.getenv("SUMMARY_LATEST_ITEMS", 10))
+
+_DECIMAL128_CONTEXT = create_decimal128_context()
+_LATEST_SORT = {"sort": DESCENDING, "key": DESCENDING}
+
+
+@dataclass(frozen=True)
+class StatusChange:
+    """A record of `user_id` on `chain_symbol` moved from `from_status`, `None` for a new record, to `to_status`.
+
+    Among the latest items of the summary the record is identified by `key`, ordered by `sort`
+    and served as `item`.
+    """
+
+    chain_symbol: str
+    user_id: UserId
+    key: str
+    sort: int
+    token: str
+    amount: int
+    from_status: str | None
+    to_status: str
+    item: dict[str, Any]
+
+
+def _encode_total(value: int) -> Decimal128:
+    # Totals keep the 34 significant digits of Decimal128, larger ones are rounded
+    return Decimal128(_DECIMAL128_CONTEXT.create_decimal(Decimal(value)))
+
+
+def _get_latest_entry(change: StatusChange) -> dict[str, Any]:
+    return {"key": change.key, "sort": change.sort, "item": change.item}
+
+
+def _get_increments(changes: Iterable[StatusChange]) -> dict[str, Any]:
+    counts: dict[str, int] = defaultdict(int)
+    totals: dict[tuple[str, str], int] = defaultdict(int)
+    for change in changes:
+        if change.from_status == change.to_status:
+            continue
+        if change.from_status is not None:
+            counts[change.from_status] -= 1
+            totals[(change.from_status, change.token)] -= change.amount
+        counts[change.to_status] += 1
+        totals[(change.to_status, change.token)] += change.amount
+    increments: dict[str, Any] = {f"counts.{status}": count for status, count in counts.items() if count}
+    for (status, token), total in totals.items():
+        if total:
+            increments[f"totals.{status}.{token}"] = _encode_total(total)
+    return increments
+
+
+async def _write(collection, requests: list):
+    try:
+        await collection.bulk_write(requests, ordered=True)
+    except BulkWriteError as e:
+        # Writers upserting the first summary of a user race on the unique index, the loser retries
+        write_errors = e.details.get("writeErrors", [])
+        if len(write_errors) != 1 or write_errors[0]["code"] != DUPLICATE_KEY_ERROR_CODE:
+            raise
+        await collection.bulk_write(requests[write_errors[0]["index"] :], ordered=True)
+
+
+async def apply_status_changes(
+    collection,
+    changes: Iterable[StatusChange],
+    latest_items: int = SUMMARY_LATEST_ITEMS,
+):
+    """Apply `changes` to the summaries of their users in `collection`, with two updates per user.
+
+    Status counts and token totals are incremented by the changes. Changed records are pulled
+    from the latest items and pushed back sorted, keeping the `latest_items` most recent ones, so
+    a record older than those is sliced off again. The records are written before their changes
+    are applied; a failure is logged instead of raised and the summaries stay off until rebuilt.
+    """
+    by_user: dict[tuple[str, UserId], list[StatusChange]] = defaultdict(list)
+    for change in changes:
+        by_user[(change.chain_symbol, change.user_id)].append(change)
+    if not by_user:
+        return
+
+    now = datetime.now(timezone.utc)
+    requests = []
+    for (chain_symbol, user_id), user_changes in by_user.items():
+        query = {"chain_symbol": chain_symbol, "user_id": user_id}
+        entries = {change.key: _get_latest_entry(change) for change in user_changes}
+        requests.append(UpdateOne(query, {"$pull": {"latest": {"key": {"$in": list(entries)}}}}))
+        update: dict[str, Any] = {
+            "$push": {"latest": {"$each": list(entries.values()), "$sort": _LATEST_SORT, "$slice": latest_items}},
+            "$set": {"updated_at": now},
+        }
+        if increments := _get_increments(user_changes):
+            update["$inc"] = increments
+        requests.append(UpdateOne(query, update, upsert=True))
+    try:
+        await _write(collection, requests)
+    except Exception as e:
+        logger.exception(f"Updating {len(by_user)} summaries of {collection.name} failed: {e}")
+
+
+def _get_latest(entries: list[dict[str, Any]], latest_items: int) -> list[dict[str, Any]]:
+    return sorted(entries, key=lambda entry: (entry["sort"], entry["key"]), reverse=True)[:latest_items]
+
+
+async def replace_summaries(
+    collection,
+    changes: AsyncIterable[StatusChange],
+    latest_items: int = SUMMARY_LATEST_ITEMS,
+) -> int:
+    """Rebuild the summaries of the users of `changes`, one per record they hold, from scratch.
+
+    Return the number of summaries written.
+    """
+    summaries: dict[tuple[str, UserId], dict[str, Any]] = {}
+    async for change in changes:
+        summary = summaries.setdefault(
+            (change.chain_symbol, change.user_id),
+            {"counts": defaultdict(int), "totals": defaultdict(int), "latest": []},
+        )
+        summary["counts"][change.to_status] += 1
+        summary["totals"][(change.to_status, change.token)] += change.amount
+        summary["latest"].append(_get_latest_entry(change))
+        if len(summary["latest"]) > 2 * latest_items:
+            summary["latest"] = _get_latest(summary["latest"], latest_items)
+
+    now = datetime.now(timezone.utc)
+    requests = []
+    for (chain_symbol, user_id), summary in summaries.items():
+        totals: dict[str, dict[str, Decimal128]] = defaultdict(dict)
+        for (status, token), total in summary["totals"].items():
+            totals[status][token] = _encode_total(total)
+        query = {"chain_symbol": chain_symbol, "user_id": user_id}
+        document = query | {
+            "counts": dict(summary["counts"]),
+            "totals": dict(totals),
+            "latest": _get_latest(summary["latest"], latest_items),
+            "updated_at": now,
+        }
+        requests.append(ReplaceOne(query, document, upsert=True))
+    for chunk in batched(requests, BULK_WRITE_CHUNK_SIZE):
+        await _write(collection, list(chunk))
+    return len(requests)
+
+
+async def find_summary(collection, chain_symbol: str, user_id: UserId) -> UserSummary:
+    """Read the summary of a user, an empty one when the user has no records."""
+    record = await collection.find_one({"chain_symbol": chain_symbol, "user_id": user_id}, projection={"_id": 0})
+    if record is None:
+        return UserSummary(user_id=user_id, chain_symbol=chain_symbol)
+    # Statuses every record moved out of are left at zero by the increments
+    record["counts"] = {status: count for status, count in record.get("counts", {}).items() if count}
+    totals = {
+        status: {token: total for token, total in tokens.items() if total}
+        for status, tokens in record.get("totals", {}).items()
+    }
+    record["totals"] = {status: tokens for status, tokens in totals.items() if tokens}
+    record["latest"] = [entry["item"] for entry in record.get("latest", [])]
+    return UserSummary(**record)
+
+
+async def rebuild_summaries(chains: Iterable[ChainConfig]) -> dict[str, tuple[int, int]]:
+    """Rebuild the deposit and withdraw summaries of `chains` from their hot and archived records.
+
+    Stop the deposit and withdraw services while it runs: changes applied meanwhile may be lost.
+    """
+    from .deposit import rebuild_deposit_summaries
+    from .withdraw import rebuild_withdraw_summaries
+
+    rebuilt = {}
+    for chain in chains:
+        deposits = await rebuild_deposit_summaries(chain)
+        withdraws = await rebuild_withdraw_summaries(chain)
+        rebuilt[chain.chain_symbol] = (deposits, withdraws)
+        logger.info(f"Rebuilt {deposits} deposit and {withdraws} withdraw summaries of {chain.chain_symbol}")
+    return rebuilt
+
+
+async def main():
+    from zexporta.config import CHAINS_CONFIG
+
+    await rebuild_summaries(CHAINS_CONFIG.values())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,37 +1,36 @@
-import asyncio
 from functools import lru_cache
 
-from zexporta.custom_types import Address
+from zexporta.custom_types import Address, TokenMetadata
+from zexporta.db.bulk import bulk_upsert
 from zexporta.db.db import get_db_connection
 
 
-async def __create_token_index(collection):
-    await collection.create_index(("token_address", "chain_symbol"), unique=True)
-
-
 @lru_cache()
 def get_collection():
-    collection = get_db_connection()["token"]
-    asyncio.run_coroutine_threadsafe(
-        __create_token_index(collection),
-        asyncio.get_event_loop(),
-    )
-    return collection
-
-
-async def get_decimals(chain_symbol: str, token_address: Address) -> int | None:
-    result = await get_collection().find_one(
-        {"chain_symbol": chain_symbol, "token_address": token_address},
-        projection={"decimals": 1},
-    )
-    return result["decimals"] if result else None
-
-
-async def insert_token(chain_symbol: str, token_address: Address, decimals: int) -> None:
-    await get_collection().insert_one(
-        {
-            "chain_symbol": chain_symbol,
-            "token_address": token_address,
-            "decimals": decimals,
-        }
+    return get_db_connection()["token"]
+
+
+async def find_tokens_metadata(chain_symbol: str) -> dict[Address, TokenMetadata]:
+    cursor = get_collection().find({"chain_symbol": chain_symbol}, projection={"_id": 0})
+    return {
+        record["token_address"]: TokenMetadata(decimals=record["decimals"], symbol=record.get("symbol"))
+        async for record in cursor
+    }
+
+
+async def insert_tokens(chain_symbol: str, tokens: dict[Address, TokenMetadata]) -> None:
+    """Insert the tokens not stored yet, leaving stored ones untouched."""
+    await bulk_upsert(
+        get_collection(),
+        (
+            {
+                "chain_symbol": chain_symbol,
+                "token_address": token_address,
+                "decimals": metadata.decimals,
+                "symbol": metadata.symbol,
+            }
+            for token_address, metadata in tokens.items()
+        ),
+        key_fields=("chain_symbol", "token_address"),
+        insert_only=True,
     )
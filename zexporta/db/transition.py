@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+from weakref import WeakKeyDictionary
+
+from bson import ObjectId
+from pymongo import UpdateMany
+
+logger = logging.getLogger(__name__)
+
+TRANSITION_FLUSH_INTERVAL = float(os.getenv("TRANSITION_FLUSH_INTERVAL", 0.1))
+TRANSITION_MAX_BATCH_SIZE = int(os.getenv("TRANSITION_MAX_BATCH_SIZE", 500))
+# Marks the documents moved by the observed transitions of a flush until they are read back
+TRANSITION_MARK_FIELD = "_transition"
+
+
+class TransitionObserver(Protocol):
+    """Told about the documents moved by status transitions, to keep read models in step with them."""
+
+    async def on_transition(self, records: list[dict[str, Any]], from_status: str):
+        """`records` moved out of `from_status`, they already hold their new status and fields."""
+
+
+@dataclass
+class StatusTransition:
+    collection: Any
+    filter: dict[str, Any]
+    from_status: str
+    to_status: str
+    future: asyncio.Future
+    fields: dict[str, Any] = field(default_factory=dict)
+    observer: TransitionObserver | None = None
+
+    def can_merge(self, other: "StatusTransition") -> bool:
+        return (
+            self.from_status == other.from_status
+            and self.to_status == other.to_status
+            and self.fields == other.fields
+            and self.observer is other.observer
+        )
+
+
+def _get_runs(transitions: list[StatusTransition]) -> list[list[StatusTransition]]:
+    """Split transitions into runs of consecutive ones which can be merged."""
+    runs: list[list[StatusTransition]] = []
+    for transition in transitions:
+        if runs and runs[-1][0].can_merge(transition):
+            runs[-1].append(transition)
+        else:
+            runs.append([transition])
+    return runs
+
+
+def _get_query(run: list[StatusTransition]) -> dict[str, Any]:
+    head = run[0]
+    query: dict[str, Any] = {"status": head.from_status}
+    if len(run) == 1:
+        return query | head.filter
+    query["$or"] = [item.filter for item in run]
+    return query
+
+
+def _get_update(run: list[StatusTransition]) -> dict[str, Any]:
+    return {"$set": {"status": run[0].to_status, **run[0].fields}}
+
+
+def _coalesce(transitions: list[StatusTransition]) -> list[UpdateMany]:
+    """Merge runs of consecutive transitions with the same statuses and fields into one update."""
+    return [UpdateMany(_get_query(run), _get_update(run)) for run in _get_runs(transitions)]
+
+
+async def _write_observed(collection, transitions: list[StatusTransition]):
+    """Write `transitions` in one ordered `bulk_write`, telling observers about the documents each run moved.
+
+    Every observed run marks the documents it updates under a key of this flush, so the server
+    decides which documents each run moved. They are read back by their marks in one query and
+    the marks are removed again, leaving the marks of flushes running concurrently in place.
+    """
+    flush_id = str(ObjectId())
+    flush_key = f"{TRANSITION_MARK_FIELD}.{flush_id}"
+    runs = _get_runs(transitions)
+    requests = []
+    for index, run in enumerate(runs):
+        update = _get_update(run)
+        if run[0].observer is not None:
+            update["$set"][f"{flush_key}.{index}"] = True
+        requests.append(UpdateMany(_get_query(run), update))
+    await collection.bulk_write(requests, ordered=True)
+
+    query = {"$or": [transition.filter for transition in transitions], flush_key: {"$exists": True}}
+    records = await collection.find(query).to_list()
+    if len(records) == 0:
+        return
+    filters = query["$or"]
+    await collection.bulk_write(
+        [
+            UpdateMany(query, {"$unset": {flush_key: ""}}),
+            UpdateMany({"$or": filters, TRANSITION_MARK_FIELD: {}}, {"$unset": {TRANSITION_MARK_FIELD: ""}}),
+        ],
+        ordered=True,
+    )
+    marks = [record.pop(TRANSITION_MARK_FIELD)[flush_id] for record in records]
+    for index, run in enumerate(runs):
+        head = run[0]
+        if head.observer is None:
+            continue
+        # A document moved again by a later run is reported with the status this run gave it
+        moved = [record | {"status": head.to_status} for record, mark in zip(records, marks) if str(index) in mark]
+        if len(moved) == 0:
+            continue
+        try:
+            await head.observer.on_transition(moved, head.from_status)
+        except Exception as e:
+            logger.exception(f"Observing {len(moved)} status transitions failed: {e}")
+
+
+class StatusTransitionBuffer:
+    """Collect status transitions and write them as grouped bulk updates.
+
+    Each transition only applies to documents still in its `from_status`, so a stale transition
+    is a no-op instead of overwriting a newer status. Transitions are flushed every
+    `flush_interval` seconds, or as soon as `max_batch_size` of them are waiting, with one ordered
+    `bulk_write` per collection so transitions on the same documents keep their submission order.
+    Collections with transitions submitted with an `observer` read the documents they moved
+    back afterwards, see `_write_observed`.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = TRANSITION_FLUSH_INTERVAL,
+        max_batch_size: int = TRANSITION_MAX_BATCH_SIZE,
+    ):
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._transitions: list[StatusTransition] = []
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def submit(
+        self,
+        collection,
+        filter_: dict[str, Any],
+        from_status: str,
+        to_status: str,
+        fields: dict[str, Any] | None = None,
+        observer: TransitionObserver | None = None,
+    ) -> asyncio.Future[None]:
+        """Queue a transition and return a future resolved once it is written."""
+        future = asyncio.get_running_loop().create_future()
+        self._transitions.append(
+            StatusTransition(collection, filter_, from_status, to_status, future, fields or {}, observer)
+        )
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._transitions) >= self.max_batch_size:
+            self._full.set()
+        return future
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            transitions, self._transitions = self._transitions, []
+            by_collection: dict[int, list[StatusTransition]] = {}
+            for transition in transitions:
+                by_collection.setdefault(id(transition.collection), []).append(transition)
+            for group in by_collection.values():
+                try:
+                    if any(transition.observer is not None for transition in group):
+                        await _write_observed(group[0].collection, group)
+                    else:
+                        await group[0].collection.bulk_write(_coalesce(group), ordered=True)
+                except Exception as e:
+                    logger.exception(f"Flushing {len(group)} status transitions failed: {e}")
+                    for transition in group:
+                        if not transition.future.done():
+                            transition.future.set_exception(e)
+                else:
+                    for transition in group:
+                        if not transition.future.done():
+                            transition.future.set_result(None)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+# One buffer per event loop, its task, lock and event are bound to the loop that used them first
+_buffers: WeakKeyDictionary[asyncio.AbstractEventLoop, StatusTransitionBuffer] = WeakKeyDictionary()
+
+
+def get_transition_buffer() -> StatusTransitionBuffer:
+    """Return the transition buffer of the running loop, so processes running a new loop per request get a fresh one."""
+    loop = asyncio.get_running_loop()
+    buffer = _buffers.get(loop)
+    if buffer is None:
+        buffer = _buffers[loop] = StatusTransitionBuffer()
+    return buffer
@@ -1,7 +1,12 @@
 import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from functools import lru_cache
 from typing import Iterable
 
+from clients.btc.coin_selection import CoinSelection, select_coins
 from pymongo import DESCENDING
 
 from zexporta.custom_types import (
@@ -11,35 +16,45 @@ from zexporta.custom_types import (
     UTXOStatus,
 )
 
+from .amount import encode_amounts, sum_amounts
+from .bulk import BulkWriteSummary, bulk_upsert
+from .codec import DocumentCodec
 from .db import get_db_connection
-
-
-async def __create_indexes(collection):
-    await collection.create_index(("tx_hash", "index"), unique=True)
+from .lease import LEASE_EXPIRES_AT_FIELD, LEASE_OWNER_FIELD, get_claimable_query, release_records
+from .transition import get_transition_buffer
+from .view import DocumentView
 
 
 @lru_cache()
 def get_collection():
-    collection = get_db_connection()["btc_utxo"]
-    asyncio.run_coroutine_threadsafe(
-        __create_indexes(collection),
-        asyncio.get_event_loop(),
-    )
-    return collection
+    return get_db_connection()["btc_utxo"]
+
+
+UTXO_KEY_FIELDS = ("tx_hash", "index")
+AMOUNT_FIELDS = ("amount",)
+UTXO_CODEC = DocumentCodec(hex_fields=("tx_hash",))
+# How long the spendable UTXOs read for coin selection are reused before they are read again
+UTXO_CACHE_SECONDS = float(os.getenv("UTXO_CACHE_SECONDS", 30))
+# Coin selection considers at most this many of the largest spendable UTXOs
+UTXO_SELECTION_POOL_SIZE = int(os.getenv("UTXO_SELECTION_POOL_SIZE", 2000))
+UTXO_RESERVATION_ATTEMPTS = 3
+
+
+def _encode_utxo(utxo: UTXO) -> dict:
+    return UTXO_CODEC.encode_document(encode_amounts(utxo.model_dump(mode="json"), AMOUNT_FIELDS))
 
 
 async def insert_utxo_if_not_exists(utxo: UTXO):
-    query = {
-        "tx_hash": utxo.tx_hash,
-        "index": utxo.index,
-    }
-    record = await get_collection().find_one(query)
-    if not record:
-        await get_collection().insert_one(utxo.model_dump(mode="json"))
+    await insert_utxos_if_not_exists([utxo])
 
 
-async def insert_utxos_if_not_exists(utxos: Iterable[UTXO]):
-    await asyncio.gather(*[insert_utxo_if_not_exists(utxo) for utxo in utxos])
+async def insert_utxos_if_not_exists(utxos: Iterable[UTXO]) -> BulkWriteSummary:
+    return await bulk_upsert(
+        get_collection(),
+        (_encode_utxo(utxo) for utxo in utxos),
+        UTXO_KEY_FIELDS,
+        insert_only=True,
+    )
 
 
 async def find_utxo_by_status(
@@ -51,41 +66,145 @@ async def find_utxo_by_status(
         "status": status.value,
     }
 
-    async for record in get_collection().find(query, sort={"amount": DESCENDING}):
-        res.append(UTXO(**record))
-        if limit and len(record) >= limit:
-            break
+    async for record in get_collection().find(query, sort={"amount": DESCENDING}).limit(limit or 0):
+        res.append(UTXO(**UTXO_CODEC.decode_document(record)))
     return res
 
 
-async def update_utxo_status(tx_hash: TxHash, new_status: UTXOStatus):
-    await get_collection().update_one({"tx_hash": tx_hash}, {"$set": {"status": new_status}})
+async def get_utxo_balance(status: UTXOStatus = UTXOStatus.UNSPENT) -> int:
+    totals = await sum_amounts(get_collection(), {"status": status.value}, "amount")
+    return totals.get(None, 0)
+
+
+async def find_largest_utxos(limit: int, status: UTXOStatus = UTXOStatus.UNSPENT) -> list[UTXO]:
+    """Return the `limit` largest UTXOs, sorted by amount in the database."""
+    cursor = get_collection().find({"status": status.value}, sort={"amount": DESCENDING}).limit(limit)
+    return [UTXO(**UTXO_CODEC.decode_document(record)) async for record in cursor]
+
+
+async def find_spendable_utxos(limit: int = UTXO_SELECTION_POOL_SIZE) -> list[UTXO]:
+    """Return the `limit` largest unspent UTXOs not reserved by a withdraw, using the `(status, amount)` index."""
+    query = {"$and": [{"status": UTXOStatus.UNSPENT.value}, get_claimable_query(datetime.now(timezone.utc))]}
+    cursor = get_collection().find(query, sort={"amount": DESCENDING}).limit(limit)
+    return [UTXO(**UTXO_CODEC.decode_document(record)) async for record in cursor]
+
+
+class SpendableUTXOCache:
+    """The spendable UTXOs of this process, read again every `ttl` seconds or when invalidated."""
+
+    def __init__(self, ttl: float = UTXO_CACHE_SECONDS):
+        self.ttl = ttl
+        self._utxos: list[UTXO] | None = None
+        self._expires_at = 0.0
+
+    async def get(self) -> list[UTXO]:
+        if self._utxos is None or time.monotonic() >= self._expires_at:
+            self._utxos = await find_spendable_utxos()
+            self._expires_at = time.monotonic() + self.ttl
+        return self._utxos
+
+    def discard(self, utxos: Iterable[UTXO]) -> None:
+        if self._utxos is None:
+            return
+        keys = {(utxo.tx_hash, utxo.index) for utxo in utxos}
+        self._utxos = [utxo for utxo in self._utxos if (utxo.tx_hash, utxo.index) not in keys]
+
+    def invalidate(self) -> None:
+        self._utxos = None
+
+
+@lru_cache()
+def get_spendable_utxo_cache() -> SpendableUTXOCache:
+    return SpendableUTXOCache()
+
+
+async def reserve_utxos(utxos: list[UTXO], reservation: str, lease_seconds: int | float) -> bool:
+    """Lease all of `utxos` to `reservation` in one update, or none of them.
+
+    Only unspent UTXOs without a live lease are taken; when another withdraw reserved or spent
+    any of them first, the ones taken here are released again and `False` is returned.
+    """
+    now = datetime.now(timezone.utc)
+    keys = [UTXO_CODEC.encode_query({"tx_hash": utxo.tx_hash, "index": utxo.index}) for utxo in utxos]
+    result = await get_collection().update_many(
+        {"$and": [{"status": UTXOStatus.UNSPENT.value, "$or": keys}, get_claimable_query(now)]},
+        {"$set": {LEASE_OWNER_FIELD: reservation, LEASE_EXPIRES_AT_FIELD: now + timedelta(seconds=lease_seconds)}},
+    )
+    if result.modified_count == len(utxos):
+        return True
+    await release_utxos(reservation)
+    return False
+
+
+async def release_utxos(reservation: str):
+    await release_records(get_collection(), reservation)
+
+
+async def select_and_reserve_utxos(
+    amount: int,
+    fee_rate: int,
+    owner: str,
+    lease_seconds: int | float,
+    outputs: int = 1,
+) -> tuple[str, CoinSelection] | None:
+    """Select UTXOs paying `amount` at `fee_rate` sat/vbyte and reserve them for `owner`.
+
+    Returns the reservation, to release the UTXOs with `release_utxos` if the withdraw is given
+    up, and the selection; `None` when the spendable UTXOs cannot pay it. Selections that lose a
+    UTXO to a concurrent withdraw are retried against a freshly read spendable set.
+    """
+    cache = get_spendable_utxo_cache()
+    for _ in range(UTXO_RESERVATION_ATTEMPTS):
+        selection = select_coins(await cache.get(), amount, fee_rate, outputs=outputs)
+        if selection is None:
+            return None
+        reservation = f"{owner}-{uuid.uuid4().hex[:8]}"
+        if await reserve_utxos(selection.utxos, reservation, lease_seconds):
+            cache.discard(selection.utxos)
+            return reservation, selection
+        cache.invalidate()
+    return None
+
+
+def update_utxo_status(
+    tx_hash: TxHash,
+    index: int,
+    from_status: UTXOStatus,
+    new_status: UTXOStatus,
+) -> asyncio.Future[None]:
+    return get_transition_buffer().submit(
+        get_collection(),
+        UTXO_CODEC.encode_query({"tx_hash": tx_hash, "index": index}),
+        from_status.value,
+        new_status.value,
+    )
 
 
 async def delete_utxo(tx_hash: TxHash):
-    await get_collection().delete_one({"tx_hash": tx_hash})
+    await get_collection().delete_one(UTXO_CODEC.encode_query({"tx_hash": tx_hash}))
 
 
 async def upsert_utxo(utxo: UTXO):
-    update = {
-        "$set": utxo.model_dump(mode="json"),
-    }
-    filter_ = {
-        "tx_hash": utxo.tx_hash,
-    }
-    await get_collection().update_one(filter=filter_, update=update, upsert=True)
+    await upsert_utxos([utxo])
+
+
+async def upsert_utxos(utxos: list[UTXO]) -> BulkWriteSummary:
+    return await bulk_upsert(
+        get_collection(),
+        (_encode_utxo(utxo) for utxo in utxos),
+        UTXO_KEY_FIELDS,
+    )
 
 
-async def upsert_utxos(utxos: list[UTXO]):
-    await asyncio.gather(*[upsert_utxo(utxo) for utxo in utxos])
+UTXO_DEPOSIT_FIELDS = ("transfer.tx_hash", "transfer.value", "transfer.index", "transfer.to", "user_id")
 
 
-async def populate_deposits_utxos(deposits: list[Deposit]):
+async def populate_deposits_utxos(deposits: list[Deposit] | list[DocumentView]):
     utxos = serialize_utxo_from_deposit(deposits)
     await insert_utxos_if_not_exists(utxos)
 
 
-def serialize_utxo_from_deposit(deposits: list[Deposit]):
+def serialize_utxo_from_deposit(deposits: list[Deposit] | list[DocumentView]):
     utxos = []
     for deposit in deposits:
         transfer = deposit.transfer
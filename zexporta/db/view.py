@@ -0,0 +1,34 @@
+from typing import Any, Iterable
+
+
+def get_projection(fields: Iterable[str]) -> dict[str, int]:
+    return {"_id": 0} | dict.fromkeys(fields, 1)
+
+
+class DocumentView:
+    """Read-only attribute access over a raw, possibly projected, document without model validation.
+
+    Nested documents are wrapped on access, so `view.transfer.tx_hash` reads
+    `document["transfer"]["tx_hash"]`. Fields left out of the projection raise `AttributeError`.
+    """
+
+    __slots__ = ("_document",)
+
+    def __init__(self, document: dict[str, Any]):
+        self._document = document
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            value = self._document[name]
+        except KeyError:
+            raise AttributeError(f"{name!r} is not in the document projection") from None
+        return DocumentView(value) if isinstance(value, dict) else value
+
+    def __getitem__(self, name: str) -> Any:
+        return self._document[name]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._document!r})"
+
+    def to_dict(self) -> dict[str, Any]:
+        return self._document
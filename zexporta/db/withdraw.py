@@ -1,58 +1,143 @@
 import asyncio
-from typing import Iterable
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterable
 
+from clients import get_chain_handle
 from pymongo import ASCENDING, DESCENDING
 
 from zexporta.custom_types import (
     ChainConfig,
+    TxHash,
     UserId,
+    UserSummary,
     WithdrawRequest,
     WithdrawStatus,
 )
 
+from .amount import encode_amounts
+from .archive import archive_records, iter_archived_records
+from .bulk import BulkWriteSummary, bulk_upsert
 from .db import get_db_connection
+from .lease import LeaseHeartbeat, claim_records
+from .notifier import ChangeNotifier
+from .summary import StatusChange, apply_status_changes, find_summary, replace_summaries
+from .transition import get_transition_buffer
 
 
-async def __create_withdraw_index(collection):
-    await collection.create_index(("nonce", "chain_symbol"), unique=True)
+@lru_cache()
+def get_collection():
+    return get_db_connection()["withdraw"]
 
 
-def get_collection():
-    collection = get_db_connection()["withdraw"]
-    asyncio.run_coroutine_threadsafe(
-        __create_withdraw_index(collection),
-        asyncio.get_event_loop(),
+@lru_cache()
+def get_summary_collection():
+    return get_db_connection()["withdraw_summary"]
+
+
+WITHDRAW_KEY_FIELDS = ("chain_symbol", "nonce")
+AMOUNT_FIELDS = ("amount",)
+TERMINAL_WITHDRAW_STATUSES = (WithdrawStatus.SUCCESSFUL, WithdrawStatus.REJECTED)
+# BTC withdraws carry no token, their totals are kept under the token address of BTC deposits
+NATIVE_TOKEN_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def _get_status_change(withdraw: WithdrawRequest, from_status: str | None) -> StatusChange:
+    return StatusChange(
+        chain_symbol=withdraw.chain_symbol,
+        user_id=withdraw.user_id,
+        key=str(withdraw.nonce),
+        sort=withdraw.nonce,
+        token=getattr(withdraw, "token_address", NATIVE_TOKEN_ADDRESS),
+        amount=withdraw.amount,
+        from_status=from_status,
+        to_status=withdraw.status.value,
+        item=withdraw.model_dump(mode="json"),
     )
-    return collection
+
+
+@dataclass(frozen=True)
+class WithdrawSummaryObserver:
+    """Apply the status transitions of the withdraws of `chain` to the withdraw summaries."""
+
+    chain: ChainConfig
+
+    async def on_transition(self, records: list[dict[str, Any]], from_status: str):
+        await apply_status_changes(
+            get_summary_collection(),
+            [_get_status_change(self.chain.withdraw_request_type(**record), from_status) for record in records],
+        )
+
+
+def get_summary_observer(chain: ChainConfig) -> WithdrawSummaryObserver:
+    # Transitions only merge when they carry the same observer, so a chain keeps one
+    return get_chain_handle(chain).get_resource("withdraw_summary_observer", lambda: WithdrawSummaryObserver(chain))
 
 
 async def insert_withdraw_if_not_exists(withdraw: WithdrawRequest):
-    query = {
-        "chain_symbol": withdraw.chain_symbol,
-        "nonce": withdraw.nonce,
-    }
-    record = await get_collection().find_one(query)
-    if not record:
-        await get_collection().insert_one(withdraw.model_dump(mode="json"))
+    await insert_withdraws_if_not_exists([withdraw])
 
 
-async def insert_withdraws_if_not_exists(withdraws: Iterable[WithdrawRequest]):
-    await asyncio.gather(*[insert_withdraw_if_not_exists(withdraw) for withdraw in withdraws])
+async def insert_withdraws_if_not_exists(withdraws: Iterable[WithdrawRequest]) -> BulkWriteSummary:
+    withdraws = list(withdraws)
+    summary = await bulk_upsert(
+        get_collection(),
+        (encode_amounts(withdraw.model_dump(mode="json"), AMOUNT_FIELDS) for withdraw in withdraws),
+        WITHDRAW_KEY_FIELDS,
+        insert_only=True,
+    )
+    await apply_status_changes(
+        get_summary_collection(), [_get_status_change(withdraws[index], None) for index in summary.upserted]
+    )
+    return summary
 
 
 async def upsert_withdraw(withdraw: WithdrawRequest):
-    update = {
-        "$set": withdraw.model_dump(mode="json"),
-    }
-    filter_ = {
-        "nonce": withdraw.nonce,
-        "chain_symbol": withdraw.chain_symbol,
-    }
-    await get_collection().update_one(filter=filter_, update=update, upsert=True)
+    await upsert_withdraws([withdraw])
 
 
-async def upsert_withdraws(withdraws: list[WithdrawRequest]):
-    await asyncio.gather(*[upsert_withdraw(withdraw) for withdraw in withdraws])
+async def upsert_withdraws(withdraws: list[WithdrawRequest]) -> BulkWriteSummary:
+    statuses = await _get_statuses(withdraws)
+    summary = await bulk_upsert(
+        get_collection(),
+        (encode_amounts(withdraw.model_dump(mode="json"), AMOUNT_FIELDS) for withdraw in withdraws),
+        WITHDRAW_KEY_FIELDS,
+    )
+    await apply_status_changes(
+        get_summary_collection(),
+        [_get_status_change(withdraw, statuses.get((withdraw.chain_symbol, withdraw.nonce))) for withdraw in withdraws],
+    )
+    return summary
+
+
+async def _get_statuses(withdraws: list[WithdrawRequest]) -> dict[tuple[str, int], str]:
+    """Return the stored status of `withdraws` by chain and nonce, before they are overwritten."""
+    if len(withdraws) == 0:
+        return {}
+    query = {"$or": [{"chain_symbol": withdraw.chain_symbol, "nonce": withdraw.nonce} for withdraw in withdraws]}
+    statuses = {}
+    async for record in get_collection().find(query, projection={"chain_symbol": 1, "nonce": 1, "status": 1}):
+        statuses[(record["chain_symbol"], record["nonce"])] = record["status"]
+    return statuses
+
+
+def update_withdraw_status(
+    chain: ChainConfig,
+    nonce: int,
+    from_status: WithdrawStatus,
+    new_status: WithdrawStatus,
+    tx_hash: TxHash | None = None,
+) -> asyncio.Future[None]:
+    return get_transition_buffer().submit(
+        get_collection(),
+        {"chain_symbol": chain.chain_symbol, "nonce": nonce},
+        from_status.value,
+        new_status.value,
+        fields={"tx_hash": tx_hash} if tx_hash is not None else None,
+        observer=get_summary_observer(chain),
+    )
 
 
 async def find_withdraws_by_status(
@@ -72,22 +157,90 @@ async def find_withdraws_by_status(
     return res
 
 
+async def claim_withdraws(
+    chain: ChainConfig,
+    status: WithdrawStatus,
+    owner: str,
+    lease_seconds: int | float,
+    limit: int,
+) -> list[WithdrawRequest]:
+    """Lease up to `limit` withdraws in `status` to `owner`, in nonce order."""
+    records = await claim_records(
+        get_collection(),
+        {"status": status.value, "chain_symbol": chain.chain_symbol},
+        owner,
+        lease_seconds,
+        limit,
+        sort=[("nonce", ASCENDING)],
+    )
+    return [chain.withdraw_request_type(**record) for record in records]
+
+
+def get_withdraw_lease_heartbeat(
+    owner: str,
+    claimed: int,
+    lease_seconds: int | float,
+    logger: logging.Logger | logging.LoggerAdapter | None = None,
+) -> LeaseHeartbeat:
+    return LeaseHeartbeat(get_collection(), owner, claimed, lease_seconds, logger=logger)
+
+
 async def find_user_withdraws(
     chain: ChainConfig,
     user_id: UserId,
     status: WithdrawStatus | None,
 ) -> list[WithdrawRequest]:
-    res = []
     query = {
         "chain_symbol": chain.chain_symbol,
         "user_id": user_id,
     }
     if status is not None:
         query["status"] = status
+    return [
+        withdraw
+        async for withdraw in _iter_withdraws(
+            chain,
+            query,
+            sort=[("nonce", DESCENDING)],
+            archived=status is None or status in TERMINAL_WITHDRAW_STATUSES,
+        )
+    ]
 
-    async for record in get_collection().find(query, sort={"nonce": DESCENDING}):
-        res.append(chain.withdraw_request_type(**record))
-    return res
+
+async def _iter_withdraws(
+    chain: ChainConfig, query: dict[str, Any], sort: list[tuple[str, int]], archived: bool = True
+) -> AsyncIterator[WithdrawRequest]:
+    """Yield the hot withdraws matching `query`, then the archived ones unless `archived` is unset."""
+    nonces = set()
+    async for record in get_collection().find(query, sort=sort):
+        nonces.add(record["nonce"])
+        yield chain.withdraw_request_type(**record)
+
+    if not archived:
+        return
+    # A record being archived may briefly exist in both tiers, the hot copy wins.
+    async for record in iter_archived_records(get_collection().name, chain.chain_symbol, query, sort=sort):
+        if record["nonce"] not in nonces:
+            yield chain.withdraw_request_type(**record)
+
+
+async def find_user_withdraw_summary(chain: ChainConfig, user_id: UserId) -> UserSummary:
+    """Return the status counts, token totals and latest withdraws of a user with one read."""
+    return await find_summary(get_summary_collection(), chain.chain_symbol, user_id)
+
+
+async def rebuild_withdraw_summaries(chain: ChainConfig, user_id: UserId | None = None) -> int:
+    """Rebuild the withdraw summaries of `chain`, or only the one of `user_id`, from its withdraws."""
+    query: dict[str, Any] = {"chain_symbol": chain.chain_symbol}
+    if user_id is not None:
+        query["user_id"] = user_id
+    return await replace_summaries(
+        get_summary_collection(),
+        (
+            _get_status_change(withdraw, None)
+            async for withdraw in _iter_withdraws(chain, query, [("nonce", ASCENDING)])
+        ),
+    )
 
 
 async def find_withdraw_by_nonce(
@@ -103,3 +256,34 @@ async def find_withdraw_by_nonce(
     if record is not None:
         return chain.withdraw_request_type(**record)
     return None
+
+
+async def archive_withdraws(chain: ChainConfig, created_before: datetime, limit: int) -> int:
+    """Move terminal withdraws created before `created_before` to the monthly archive collections."""
+    return await archive_records(
+        get_collection(),
+        chain.chain_symbol,
+        {
+            "chain_symbol": chain.chain_symbol,
+            "status": {"$in": [status.value for status in TERMINAL_WITHDRAW_STATUSES]},
+        },
+        created_before,
+        limit,
+        indexes=[("user_id", "nonce")],
+    )
+
+
+def get_withdraw_notifier(
+    chain: ChainConfig,
+    status: WithdrawStatus,
+    poll_interval: float,
+    max_wait: float,
+    logger: logging.Logger | logging.LoggerAdapter | None = None,
+) -> ChangeNotifier:
+    return ChangeNotifier(
+        get_collection(),
+        {"chain_symbol": chain.chain_symbol, "status": status.value},
+        poll_interval=poll_interval,
+        max_wait=max_wait,
+        logger=logger,
+    )
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import logging.config
+from functools import partial
+
+import sentry_sdk
+from clients import ChainAsyncClient, get_async_client
+
+from zexporta.custom_types import Address, BlockNumber, ChainConfig, UserId
+from zexporta.db.address import get_active_address
+from zexporta.db.block_range import (
+    BlockRangeLeaseLost,
+    complete_block_range,
+    delete_done_block_ranges,
+    get_block_range_watermark,
+    get_last_block_range_end,
+    insert_block_ranges,
+    iter_block_ranges,
+    lease_block_range,
+    release_block_range,
+    update_block_range_progress,
+)
+from zexporta.db.block_retry import insert_retry_blocks
+from zexporta.db.chain import upsert_chain_last_observed_block
+from zexporta.db.deposit import insert_deposits_if_not_exists
+from zexporta.db.migration import migrate
+from zexporta.explorer import ExploredBatch, explorer
+from zexporta.utils.chain_scheduler import get_fencing_token
+from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
+from zexporta.utils.token_cache import get_token_cache
+from zexporta.utils.worker import get_worker_id
+
+from .config import (
+    CATCH_UP_LEASE_SECONDS,
+    CATCH_UP_RANGE_SIZE,
+    CATCH_UP_WORKERS,
+    CHAINS_CONFIG,
+    LOGGER_PATH,
+    SENTRY_DNS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def persist_catch_up_batch(chain: ChainConfig, range_from_block: BlockNumber, owner: str, batch: ExploredBatch):
+    if len(batch.deposits) > 0:
+        await insert_deposits_if_not_exists(chain, batch.deposits)
+    if len(batch.failed_blocks) > 0:
+        await insert_retry_blocks(chain.chain_symbol, batch.failed_blocks)
+    await update_block_range_progress(
+        chain.chain_symbol,
+        range_from_block,
+        owner,
+        scanned_to=max(batch.blocks_number),
+        lease_seconds=CATCH_UP_LEASE_SECONDS,
+    )
+
+
+async def catch_up_worker(
+    chain: ChainConfig,
+    client: ChainAsyncClient,
+    accepted_addresses: dict[Address, UserId],
+    owner: str,
+    logger: ChainLoggerAdapter,
+):
+    while (block_range := await lease_block_range(chain.chain_symbol, owner, CATCH_UP_LEASE_SECONDS)) is not None:
+        range_from_block = block_range["from_block"]
+        logger.info(f"Worker {owner} leased blocks {block_range['scanned_to'] + 1} to {block_range['to_block']}")
+        try:
+            await explorer(
+                client,
+                block_range["scanned_to"] + 1,
+                block_range["to_block"],
+                accepted_addresses,
+                client.extract_transfer_from_block,
+                logger=logger,
+                batch_size=chain.batch_block_size,
+                max_delay_per_block_batch=chain.delay,
+                persist_batch=partial(persist_catch_up_batch, chain, range_from_block, owner),
+                record_failed_blocks=True,
+                watched_addresses=accepted_addresses,
+            )
+            await complete_block_range(chain.chain_symbol, range_from_block, owner)
+        except BlockRangeLeaseLost as e:
+            logger.warning(f"Worker {owner} lost its lease: {e}")
+        except Exception as e:
+            logger.exception(f"Worker {owner} failed on range starting at {range_from_block}: {e}")
+            await release_block_range(chain.chain_symbol, range_from_block, owner)
+            return
+
+
+async def run_catch_up_workers(
+    chain: ChainConfig,
+    client: ChainAsyncClient,
+    accepted_addresses: dict[Address, UserId],
+    logger: ChainLoggerAdapter,
+):
+    await asyncio.gather(
+        *[
+            catch_up_worker(chain, client, accepted_addresses, f"{get_worker_id()}-{i}", logger)
+            for i in range(CATCH_UP_WORKERS)
+        ]
+    )
+
+
+async def catch_up(
+    chain: ChainConfig,
+    client: ChainAsyncClient,
+    accepted_addresses: dict[Address, UserId],
+    last_observed_block: BlockNumber,
+    latest_block: BlockNumber,
+    logger: ChainLoggerAdapter,
+) -> BlockNumber:
+    """Scan the gap up to `latest_block` as leased ranges and return the new observed watermark.
+
+    Ranges left by an earlier run are kept, only blocks after the last known range are split.
+    The checkpoint moves to the end of the contiguous run of completed ranges, so ranges still
+    leased by other workers hold it back until they are done.
+    """
+    last_range_end = await get_last_block_range_end(chain.chain_symbol)
+    start = max(last_observed_block, last_range_end or last_observed_block) + 1
+    await insert_block_ranges(chain.chain_symbol, iter_block_ranges(start, latest_block, CATCH_UP_RANGE_SIZE))
+
+    await run_catch_up_workers(chain, client, accepted_addresses, logger)
+
+    watermark = await get_block_range_watermark(chain.chain_symbol, last_observed_block + 1)
+    if watermark > last_observed_block:
+        logger.info(f"Catch up advanced observed block from {last_observed_block} to {watermark}")
+        await upsert_chain_last_observed_block(chain.chain_symbol, watermark, get_fencing_token())
+        await delete_done_block_ranges(chain.chain_symbol, watermark)
+    return max(watermark, last_observed_block)
+
+
+async def help_catch_up(chain: ChainConfig):
+    """Lease catch-up ranges created by the observer from a separate process."""
+    _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
+    while True:
+        try:
+            client = get_async_client(chain, logger=_logger)
+            accepted_addresses = await get_active_address(chain)
+            await run_catch_up_workers(chain, client, accepted_addresses, _logger)
+        except Exception as e:
+            _logger.exception(f"Exception: {e}")
+        await asyncio.sleep(chain.delay)
+
+
+async def main():
+    await migrate()
+    await asyncio.gather(*[get_token_cache().preload(chain.chain_symbol) for chain in CHAINS_CONFIG.values()])
+    loop = asyncio.get_running_loop()
+    tasks = [loop.create_task(help_catch_up(chain)) for chain in CHAINS_CONFIG.values()]
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    logging.config.dictConfig(get_logger_config(logger_path=f"{LOGGER_PATH}/catch_up.log"))
+    sentry_sdk.init(
+        dsn=SENTRY_DNS,
+    )
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
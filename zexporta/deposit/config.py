@@ -4,6 +4,7 @@ import os
 
 from zexporta.config import (
     CHAINS_CONFIG,
+    CHANGE_STREAM_MAX_WAIT_SECONDS,
     DKG_JSON_PATH,
     DKG_NAME,
     EVM_NATIVE_TOKEN_ADDRESS,
@@ -20,10 +21,26 @@ LOGGER_PATH = "/var/log/deposit/"
 
 BATCH_BLOCK_NUMBER_SIZE = int(os.getenv("BATCH_BLOCK_NUMBER_SIZE", 5))
 MAX_DELAY_PER_BLOCK_BATCH = int(os.getenv("MAX_DELAY_PER_BLOCK_BATCH", 3))
+OBSERVER_BATCHES_PER_ROUND = int(os.getenv("OBSERVER_BATCHES_PER_ROUND", 10))
+RETRY_BATCHES_PER_ROUND = int(os.getenv("RETRY_BATCHES_PER_ROUND", 2))
+
+CATCH_UP_MIN_BLOCKS = int(os.getenv("CATCH_UP_MIN_BLOCKS", 1000))
+CATCH_UP_RANGE_SIZE = int(os.getenv("CATCH_UP_RANGE_SIZE", 500))
+CATCH_UP_WORKERS = int(os.getenv("CATCH_UP_WORKERS", 4))
+CATCH_UP_LEASE_SECONDS = int(os.getenv("CATCH_UP_LEASE_SECONDS", 300))
 
 WITHDRAW_BATCH_SIZE = 10
+VAULT_DEPOSITOR_DELAY_SECOND = 10
 
 SA_DELAY_SECOND = 10
 SA_TIMEOUT = 200
 SA_BATCH_BLOCK_NUMBER_SIZE = int(os.getenv("SA_BATCH_BLOCK_NUMBER_SIZE", 100))
 SA_TRANSACTIONS_BATCH_SIZE = int(os.getenv("SA_TRANSACTIONS_BATCH_SIZE", 30))
+SA_WORKERS = int(os.getenv("SA_WORKERS", 1))
+SA_LEASE_SECONDS = int(os.getenv("SA_LEASE_SECONDS", 600))
+VAULT_DEPOSITOR_LEASE_SECONDS = int(os.getenv("VAULT_DEPOSITOR_LEASE_SECONDS", 600))
+
+HEAD_TRACKER_BUFFER_SIZE = int(os.getenv("HEAD_TRACKER_BUFFER_SIZE", 128))
+
+FINALIZER_SLICES_PER_ROUND = int(os.getenv("FINALIZER_SLICES_PER_ROUND", 8))
+FINALIZER_RPC_CONCURRENCY = int(os.getenv("FINALIZER_RPC_CONCURRENCY", 10))
@@ -1,71 +1,214 @@
 import asyncio
 import logging.config
-import math
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import batched
 
 import sentry_sdk
-from clients import filter_blocks, get_async_client
+from clients import ChainAsyncClient, filter_blocks, get_async_client
+from clients.custom_types import BlockHeader
 
-from zexporta.custom_types import ChainConfig, DepositStatus
+from zexporta.custom_types import BlockNumber, ChainConfig, DepositStatus, TxHash
 from zexporta.db.deposit import (
     find_deposit_by_status,
-    get_pending_deposits_block_number,
+    find_deposit_views_by_status,
+    get_block_numbers_by_status,
+    get_deposit_notifier,
+    get_pending_deposits_block_hashes,
     to_finalized,
-    to_reorg_block_number,
+    to_finalized_block_hashes,
+    to_reorg_block_numbers,
 )
+from zexporta.db.migration import migrate
+from zexporta.utils.chain_head import get_finalized_block_number
+from zexporta.utils.chain_scheduler import run_chains
 from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
 
-from .config import CHAINS_CONFIG, LOGGER_PATH, SENTRY_DNS
+from .config import (
+    CHAINS_CONFIG,
+    CHANGE_STREAM_MAX_WAIT_SECONDS,
+    FINALIZER_RPC_CONCURRENCY,
+    FINALIZER_SLICES_PER_ROUND,
+    LOGGER_PATH,
+    SENTRY_DNS,
+)
 
 logging.config.dictConfig(get_logger_config(logger_path=f"{LOGGER_PATH}/finalizer.log"))  # type: ignore
 logger = logging.getLogger(__name__)
 
 
-async def update_finalized_deposits(chain: ChainConfig):
+@dataclass
+class CheckedBlocks:
+    """The outcome of checking a slice of pending blocks against the canonical chain."""
+
+    blocks: dict[BlockNumber, set[str | None]]
+    confirmed_hashes: list[str] = field(default_factory=list)
+    txs_hash: list[TxHash] = field(default_factory=list)
+
+
+async def check_blocks(
+    client: ChainAsyncClient,
+    blocks: dict[BlockNumber, set[str | None]],
+    headers: dict[BlockNumber, BlockHeader],
+    rpc_budget: asyncio.Semaphore,
+    logger: ChainLoggerAdapter,
+) -> CheckedBlocks:
+    """Find which pending deposits of `blocks` are still on the canonical chain.
+
+    `blocks` maps each block number to the block hashes its deposits were observed in, `headers`
+    holds the canonical header of each of them. A block whose stored hash is still the canonical
+    one is confirmed from its header alone; only blocks with a different hash, or with deposits
+    recorded without one, are downloaded again to check which of their transactions are still on
+    chain. Every node request holds one unit of `rpc_budget`.
+    """
+
+    async def get_block_tx_hash(block_number: BlockNumber) -> list[TxHash]:
+        async with rpc_budget:
+            return await client.get_block_tx_hash(block_number)
+
+    result = CheckedBlocks(blocks)
+    unconfirmed_blocks = []
+    for block_number, block_hashes in blocks.items():
+        if block_hashes == {headers[block_number].hash}:
+            result.confirmed_hashes.append(headers[block_number].hash)
+        else:
+            unconfirmed_blocks.append(block_number)
+
+    if unconfirmed_blocks:
+        logger.warning(f"Block hash mismatch, re-fetching blocks: {unconfirmed_blocks}")
+        result.txs_hash = await filter_blocks(unconfirmed_blocks, get_block_tx_hash, max_delay_per_block_batch=0)
+    return result
+
+
+async def run_finalizer_middleware(
+    chain: ChainConfig,
+    checked: CheckedBlocks,
+    finalized_block_number: BlockNumber,
+):
+    if not (checked.confirmed_hashes or checked.txs_hash):
+        return
+    query = {
+        "chain": chain,
+        "status": DepositStatus.PENDING,
+        "from_block": min(checked.blocks),
+        "to_block": min(max(checked.blocks), finalized_block_number),
+        "txs_hash": checked.txs_hash,
+        "block_hashes": checked.confirmed_hashes,
+    }
+    if chain.deposit_finalizer_middleware_fields:
+        finalized_deposits_list = await find_deposit_views_by_status(
+            fields=chain.deposit_finalizer_middleware_fields, **query
+        )
+    else:
+        finalized_deposits_list = await find_deposit_by_status(**query)
+    for middleware in chain.deposit_finalizer_middleware or ():
+        await middleware(finalized_deposits_list)
+
+
+async def finalize_blocks(
+    chain: ChainConfig,
+    client: ChainAsyncClient,
+    slices: list[dict[BlockNumber, set[str | None]]],
+    finalized_block_number: BlockNumber,
+    rpc_budget: asyncio.Semaphore,
+    logger: ChainLoggerAdapter,
+):
+    """Finalize the pending deposits of consecutive block `slices` and mark the rest of them as reorged.
+
+    The headers of all slices are fetched in one request, then slices are checked against the
+    node concurrently and the middleware sees each slice's finalized deposits one slice after
+    another in block order, as when slices were processed one by one. The status changes of all
+    slices are written together at the end.
+    """
+    async with rpc_budget:
+        headers = await client.get_block_headers([block for blocks in slices for block in blocks])
+    checked_slices = await asyncio.gather(
+        *[check_blocks(client, blocks, headers, rpc_budget, logger) for blocks in slices]
+    )
+    if chain.deposit_finalizer_middleware:
+        for checked in checked_slices:
+            await run_finalizer_middleware(chain, checked, finalized_block_number)
+
+    # Submitted together so all land in one ordered bulk write, finalizing before the remaining
+    # pending deposits of these blocks are marked as reorged. Only the checked blocks are reorged:
+    # deposits inserted meanwhile at blocks in between, by catch-up or retried blocks, stay pending.
+    confirmed_hashes = [block_hash for checked in checked_slices for block_hash in checked.confirmed_hashes]
+    txs_hash = [tx_hash for checked in checked_slices for tx_hash in checked.txs_hash]
+    from_block = min(slices[0])
+    transitions = []
+    if confirmed_hashes:
+        transitions.append(
+            to_finalized_block_hashes(chain, finalized_block_number, confirmed_hashes, from_block=from_block)
+        )
+    if txs_hash:
+        transitions.append(to_finalized(chain, finalized_block_number, txs_hash))
+    transitions.append(to_reorg_block_numbers(chain, [block for blocks in slices for block in blocks]))
+    await asyncio.gather(*transitions)
+
+
+def split_blocks(blocks: dict[BlockNumber, set[str | None]], size: int) -> list[dict[BlockNumber, set[str | None]]]:
+    return [dict(chunk) for chunk in batched(blocks.items(), size)]
+
+
+async def update_finalized_deposits(chain: ChainConfig, rpc_budget: asyncio.Semaphore):
     _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
+    notifier = get_deposit_notifier(
+        chain,
+        DepositStatus.PENDING,
+        poll_interval=chain.delay,
+        max_wait=CHANGE_STREAM_MAX_WAIT_SECONDS,
+        logger=_logger,
+    )
+    round_size = chain.batch_block_size * FINALIZER_SLICES_PER_ROUND
     while True:
         try:
             client = get_async_client(chain, logger=_logger)
-            finalized_block_number = await client.get_finalized_block_number()
-            pending_blocks_number = await get_pending_deposits_block_number(
+            finalized_block_number = await get_finalized_block_number(client)
+            blocks_to_check = await get_pending_deposits_block_hashes(
                 chain=chain,
                 finalized_block_number=finalized_block_number,
+                limit=round_size,
             )
 
-            if len(pending_blocks_number) == 0:
+            if len(blocks_to_check) == 0:
                 _logger.info(f"No pending tx has been found. finalized_block_number: {finalized_block_number}")
-                await asyncio.sleep(chain.delay)
+                # Pending deposits above the finalized block only need the chain to advance, so keep
+                # polling at the chain pace; with none at all, sleep until a new one is observed.
+                has_pending = len(await get_block_numbers_by_status(chain, DepositStatus.PENDING, limit=1)) > 0
+                await notifier.wait(timeout=chain.delay if has_pending else None)
                 continue
 
-            for i in range(math.ceil(len(pending_blocks_number) / chain.batch_block_size)):
-                blocks_to_check = pending_blocks_number[
-                    (i * chain.batch_block_size) : ((i + 1) * chain.batch_block_size)
-                ]
-                results = await filter_blocks(
-                    blocks_to_check,
-                    client.get_block_tx_hash,
-                    max_delay_per_block_batch=chain.delay,
+            while len(blocks_to_check) > 0:
+                await finalize_blocks(
+                    chain,
+                    client,
+                    split_blocks(blocks_to_check, chain.batch_block_size),
+                    finalized_block_number,
+                    rpc_budget,
+                    _logger,
+                )
+                if len(blocks_to_check) < round_size:
+                    break
+                blocks_to_check = await get_pending_deposits_block_hashes(
+                    chain=chain,
+                    finalized_block_number=finalized_block_number,
+                    from_block=max(blocks_to_check) + 1,
+                    limit=round_size,
                 )
-                deposit_finalizer_middleware = chain.deposit_finalizer_middleware
-                if deposit_finalizer_middleware:
-                    finalized_deposits_list = await find_deposit_by_status(
-                        chain=chain,
-                        status=DepositStatus.PENDING,
-                        to_block=finalized_block_number,
-                        txs_hash=results,
-                    )
-                    for middleware in deposit_finalizer_middleware:
-                        await middleware(finalized_deposits_list)
-                await to_finalized(chain, finalized_block_number, results)
-
-                await to_reorg_block_number(chain, min(blocks_to_check), max(blocks_to_check))
         except Exception as e:
             _logger.exception(f"An error occurred: {e}")
 
 
 async def main():
-    loop = asyncio.get_running_loop()
-    tasks = [loop.create_task(update_finalized_deposits(chain)) for chain in CHAINS_CONFIG.values()]
-    await asyncio.gather(*tasks)
+    await migrate()
+    # One budget for all chains, since they may share the same node provider.
+    rpc_budget = asyncio.Semaphore(FINALIZER_RPC_CONCURRENCY)
+    await run_chains(
+        "deposit_finalizer",
+        CHAINS_CONFIG.values(),
+        partial(update_finalized_deposits, rpc_budget=rpc_budget),
+        logger=logger,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+import asyncio
+import logging.config
+
+import sentry_sdk
+from clients import get_async_client
+
+from zexporta.custom_types import ChainConfig
+from zexporta.utils.chain_head import ChainHeadTracker, get_chain_head_store
+from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
+
+from .config import CHAINS_CONFIG, HEAD_TRACKER_BUFFER_SIZE, LOGGER_PATH, SENTRY_DNS
+
+logging.config.dictConfig(get_logger_config(logger_path=f"{LOGGER_PATH}/head_tracker.log"))  # type: ignore
+logger = logging.getLogger(__name__)
+
+
+async def track_chain_head(chain: ChainConfig):
+    _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
+    tracker = None
+    while True:
+        try:
+            client = get_async_client(chain, logger=_logger)
+            if tracker is None:
+                tracker = ChainHeadTracker(
+                    client,
+                    get_chain_head_store(chain),  # type: ignore
+                    HEAD_TRACKER_BUFFER_SIZE,
+                    logger=_logger,
+                )
+            head, _ = await tracker.poll()
+            _logger.debug(f"Head: {head.latest_block_number}, finalized: {head.finalized_block_number}")
+        except Exception as e:
+            _logger.exception(f"An error occurred: {e}")
+        await asyncio.sleep(chain.delay)
+
+
+async def main():
+    if get_chain_head_store(next(iter(CHAINS_CONFIG.values()))) is None:
+        raise RuntimeError("CHAIN_HEAD_REDIS_URL is required to publish chain heads")
+    loop = asyncio.get_running_loop()
+    tasks = [loop.create_task(track_chain_head(chain)) for chain in CHAINS_CONFIG.values()]
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    sentry_sdk.init(
+        dsn=SENTRY_DNS,
+    )
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
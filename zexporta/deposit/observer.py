@@ -1,47 +1,164 @@
 import asyncio
 import logging.config
+from functools import partial
+from itertools import batched
 
 import clients.exceptions as client_exception
 import sentry_sdk
 from clients import (
+    ChainAsyncClient,
     get_async_client,
 )
 
-from zexporta.custom_types import ChainConfig
+from zexporta.custom_types import Address, BlockNumber, ChainConfig, UserId
 from zexporta.db.address import get_active_address, insert_new_address_to_db
+from zexporta.db.block_range import delete_block_ranges_after, get_last_block_range_end
+from zexporta.db.block_retry import (
+    delete_retry_blocks,
+    get_retry_blocks,
+    increase_retry_attempts,
+    insert_retry_blocks,
+)
 from zexporta.db.chain import (
     get_last_observed_block,
     upsert_chain_last_observed_block,
 )
+from zexporta.db.chain_lease import StaleFencingToken
 from zexporta.db.deposit import insert_deposits_if_not_exists
-from zexporta.explorer import explorer
+from zexporta.db.migration import migrate
+from zexporta.explorer import ExploredBatch, explore_block_batches, explorer
+from zexporta.utils.chain_head import ReorgSubscription, get_latest_block_number, subscribe_reorgs
+from zexporta.utils.chain_scheduler import get_fencing_token, run_chains
 from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
+from zexporta.utils.token_cache import get_token_cache
 
-from .config import CHAINS_CONFIG, LOGGER_PATH, SENTRY_DNS
+from .catch_up import catch_up
+from .config import (
+    CATCH_UP_MIN_BLOCKS,
+    CHAINS_CONFIG,
+    LOGGER_PATH,
+    OBSERVER_BATCHES_PER_ROUND,
+    RETRY_BATCHES_PER_ROUND,
+    SENTRY_DNS,
+)
 
 logging.config.dictConfig(get_logger_config(logger_path=f"{LOGGER_PATH}/observer.log"))
 logger = logging.getLogger(__name__)
 
 
+async def persist_explored_batch(chain: ChainConfig, batch: ExploredBatch):
+    # Deposits are inserted idempotently before the checkpoint moves, so a crash in between only
+    # rescans this batch on restart and never skips it.
+    if len(batch.deposits) > 0:
+        await insert_deposits_if_not_exists(chain, batch.deposits)
+    if len(batch.failed_blocks) > 0:
+        await insert_retry_blocks(chain.chain_symbol, batch.failed_blocks)
+    await upsert_chain_last_observed_block(chain.chain_symbol, max(batch.blocks_number), get_fencing_token())
+
+
+async def persist_retried_batch(chain: ChainConfig, batch: ExploredBatch):
+    if len(batch.deposits) > 0:
+        await insert_deposits_if_not_exists(chain, batch.deposits)
+    succeeded_blocks = [block for block in batch.blocks_number if block not in batch.failed_blocks]
+    if len(succeeded_blocks) > 0:
+        await delete_retry_blocks(chain.chain_symbol, succeeded_blocks)
+    if len(batch.failed_blocks) > 0:
+        await increase_retry_attempts(chain.chain_symbol, batch.failed_blocks)
+
+
+async def retry_failed_blocks(
+    chain: ChainConfig,
+    client: ChainAsyncClient,
+    accepted_addresses: dict[Address, UserId],
+    logger: ChainLoggerAdapter,
+):
+    retry_blocks = await get_retry_blocks(chain.chain_symbol, limit=chain.batch_block_size * RETRY_BATCHES_PER_ROUND)
+    if len(retry_blocks) == 0:
+        return
+    logger.info(f"Retrying failed blocks: {retry_blocks}")
+    await explore_block_batches(
+        client,
+        batched(retry_blocks, chain.batch_block_size),
+        accepted_addresses,
+        client.extract_transfer_from_block,
+        logger=logger,
+        max_delay_per_block_batch=chain.delay,
+        persist_batch=partial(persist_retried_batch, chain),
+        record_failed_blocks=True,
+        watched_addresses=accepted_addresses,
+    )
+
+
+async def rewind_to_fork(
+    chain: ChainConfig,
+    reorgs: ReorgSubscription,
+    last_observed_block: BlockNumber,
+    logger: ChainLoggerAdapter,
+) -> BlockNumber:
+    """Move the checkpoint back to the fork of the reorgs published since the last round.
+
+    The blocks that replaced the orphaned ones are scanned again, so deposits only they hold
+    are observed too; deposits of the orphaned blocks are left to the finalizer, which reorgs
+    the ones no longer on chain. Catch-up ranges past the fork, scanned or not, are dropped
+    first, so catch-up splits the blocks from the fork on again instead of waiting on a range
+    starting right after it.
+    """
+    fork_block_number = await reorgs.get_fork_block_number()
+    if fork_block_number is None or fork_block_number >= last_observed_block:
+        return last_observed_block
+    logger.warning(f"Reorg at block {fork_block_number}, observing again from block {fork_block_number + 1}")
+    await delete_block_ranges_after(chain.chain_symbol, fork_block_number)
+    await upsert_chain_last_observed_block(chain.chain_symbol, fork_block_number, get_fencing_token())
+    return fork_block_number
+
+
 async def observe_deposit(chain: ChainConfig):
     _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
     last_observed_block = await get_last_observed_block(chain.chain_symbol)
+    reorgs = await subscribe_reorgs(chain)
     while True:
+        if reorgs is not None and last_observed_block is not None:
+            try:
+                last_observed_block = await rewind_to_fork(chain, reorgs, last_observed_block, _logger)
+            except StaleFencingToken as e:
+                _logger.warning(f"Another observer took over the chain, stopping: {e}")
+                return
+            except Exception as e:
+                _logger.exception(f"Reading reorgs raised an exception, continue observing: {e}")
         client = get_async_client(chain, logger=_logger)
-        latest_block = await client.get_latest_block_number()
+        latest_block = await get_latest_block_number(client)
         if last_observed_block is not None and last_observed_block == latest_block:
             _logger.info(f"Block {last_observed_block} already observed continue")
             await asyncio.sleep(chain.delay)
             continue
         last_observed_block = last_observed_block or (latest_block - 1)
-        to_block = min(latest_block, last_observed_block + chain.batch_block_size)
+        to_block = min(latest_block, last_observed_block + chain.batch_block_size * OBSERVER_BATCHES_PER_ROUND)
         if last_observed_block >= to_block:
             _logger.warning(f"last_observed_block: {last_observed_block} is bigger then to_block {to_block}")
             continue
         await insert_new_address_to_db(chain)
         accepted_addresses = await get_active_address(chain)
+        if (
+            latest_block - last_observed_block > CATCH_UP_MIN_BLOCKS
+            or await get_last_block_range_end(chain.chain_symbol) is not None
+        ):
+            try:
+                last_observed_block = await catch_up(
+                    chain, client, accepted_addresses, last_observed_block, latest_block, _logger
+                )
+            except StaleFencingToken as e:
+                _logger.warning(f"Another observer took over the chain, stopping: {e}")
+                return
+            except Exception as e:
+                _logger.exception(f"Catch up raised an exception: {e}")
+                await asyncio.sleep(5)
+            continue
+        try:
+            await retry_failed_blocks(chain, client, accepted_addresses, _logger)
+        except Exception as e:
+            _logger.exception(f"Retrying failed blocks raised an exception, continue observing: {e}")
         try:
-            accepted_deposits = await explorer(
+            await explorer(
                 client,
                 last_observed_block + 1,
                 to_block,
@@ -50,7 +167,13 @@ async def observe_deposit(chain: ChainConfig):
                 logger=_logger,
                 batch_size=chain.batch_block_size,
                 max_delay_per_block_batch=chain.delay,
+                persist_batch=partial(persist_explored_batch, chain),
+                record_failed_blocks=True,
+                watched_addresses=accepted_addresses,
             )
+        except StaleFencingToken as e:
+            _logger.warning(f"Another observer took over the chain, stopping: {e}")
+            return
         except client_exception.BaseClientError as e:
             logger.error(f"Client raise Error, {e}")
         except ValueError as e:
@@ -59,18 +182,15 @@ async def observe_deposit(chain: ChainConfig):
         except Exception as e:
             _logger.exception(f"Exception: {e}")
             await asyncio.sleep(5)
-        else:
-            if len(accepted_deposits) > 0:
-                await insert_deposits_if_not_exists(chain, accepted_deposits)
 
-        await upsert_chain_last_observed_block(chain.chain_symbol, to_block)
-        last_observed_block = to_block
+        # The checkpoint only advances for batches that were completely persisted.
+        last_observed_block = await get_last_observed_block(chain.chain_symbol) or last_observed_block
 
 
 async def main():
-    loop = asyncio.get_running_loop()
-    tasks = [loop.create_task(observe_deposit(chain)) for chain in CHAINS_CONFIG.values()]
-    await asyncio.gather(*tasks)
+    await migrate()
+    await asyncio.gather(*[get_token_cache().preload(chain.chain_symbol) for chain in CHAINS_CONFIG.values()])
+    await run_chains("deposit_observer", CHAINS_CONFIG.values(), observe_deposit, logger=logger)
 
 
 if __name__ == "__main__":
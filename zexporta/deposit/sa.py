@@ -19,14 +19,20 @@ from zexporta.custom_types import (
     TxHash,
 )
 from zexporta.db.deposit import (
-    find_deposit_by_status,
+    claim_deposit_views,
+    get_deposit_lease_heartbeat,
+    get_deposit_notifier,
     to_reorg_with_tx_hash,
     upsert_deposits,
 )
+from zexporta.db.lease import LeaseHeartbeat, LeaseLost
+from zexporta.db.migration import migrate
+from zexporta.utils.chain_scheduler import run_chains
 from zexporta.utils.dkg import parse_dkg_json
 from zexporta.utils.encoder import DEPOSIT_OPERATION, encode_zex_deposit
 from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
 from zexporta.utils.node_info import NodesInfo
+from zexporta.utils.worker import get_worker_id
 from zexporta.utils.zex_api import (
     ZexAPIError,
     send_deposits,
@@ -34,12 +40,15 @@ from zexporta.utils.zex_api import (
 
 from .config import (
     CHAINS_CONFIG,
+    CHANGE_STREAM_MAX_WAIT_SECONDS,
     DKG_JSON_PATH,
     DKG_NAME,
     LOGGER_PATH,
+    SA_LEASE_SECONDS,
     SA_SHIELD_PRIVATE_KEY,
     SA_TIMEOUT,
     SA_TRANSACTIONS_BATCH_SIZE,
+    SA_WORKERS,
     SENTRY_DNS,
     ZEX_ENCODE_VERSION,
 )
@@ -64,6 +73,7 @@ async def process_deposit(
     dkg_party: list[str],
     finalized_block_number: BlockNumber,
     logger: ChainLoggerAdapter,
+    heartbeat: LeaseHeartbeat | None = None,
 ):
     logger.info(f"Processing txs: {txs_hash}")
     nonces_response = await sa.request_nonces(dkg_party, number_of_nonces=1)
@@ -106,6 +116,9 @@ async def process_deposit(
         if hash_ != result["message_hash"]:
             raise DepositDifferentHashError("Hash message is not valid")
 
+        if heartbeat is not None:
+            # Another worker took these deposits over, it sends them instead.
+            heartbeat.check()
         await send_result_to_zex(
             client,
             encoded_data,
@@ -138,31 +151,49 @@ async def send_result_to_zex(
     return result
 
 
-async def deposit(chain: ChainConfig):
+async def deposit(chain: ChainConfig, owner: str):
     _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
+    notifier = get_deposit_notifier(
+        chain,
+        DepositStatus.FINALIZED,
+        poll_interval=chain.delay,
+        max_wait=CHANGE_STREAM_MAX_WAIT_SECONDS,
+        logger=_logger,
+    )
     while True:
         client = httpx.AsyncClient()
+        has_more = False
         try:
             dkg_party = dkg_key["party"]
-            deposits = await find_deposit_by_status(
+            deposits = await claim_deposit_views(
                 chain=chain,
                 status=DepositStatus.FINALIZED,
+                fields=("transfer.tx_hash", "transfer.block_number"),
+                owner=owner,
+                lease_seconds=SA_LEASE_SECONDS,
                 limit=SA_TRANSACTIONS_BATCH_SIZE,
             )
-            txs_hash = [deposit.transfer.tx_hash for deposit in (deposits)]
+            txs_hash = [deposit.transfer.tx_hash for deposit in deposits]
             if len(txs_hash) <= 0:
                 _logger.info("No finalized deposit found.")
                 continue
             finalized_block_number = deposits[-1].transfer.block_number
             try:
-                await process_deposit(
-                    client,
-                    chain,
-                    txs_hash,
-                    dkg_party,
-                    finalized_block_number=finalized_block_number,
-                    logger=_logger,
-                )
+                async with get_deposit_lease_heartbeat(
+                    chain, owner, len(deposits), SA_LEASE_SECONDS, logger=_logger
+                ) as heartbeat:
+                    await process_deposit(
+                        client,
+                        chain,
+                        txs_hash,
+                        dkg_party,
+                        finalized_block_number=finalized_block_number,
+                        logger=_logger,
+                        heartbeat=heartbeat,
+                    )
+                has_more = len(deposits) == SA_TRANSACTIONS_BATCH_SIZE
+            except LeaseLost as e:
+                _logger.warning(e)
             except ZexAPIError as e:
                 _logger.error(f"Error at sending deposit to Zex: {e}")
             except AssertionError as e:
@@ -176,13 +207,17 @@ async def deposit(chain: ChainConfig):
 
         finally:
             await client.aclose()
-            await asyncio.sleep(chain.delay)
+            if not has_more:
+                await notifier.wait()
+
+
+async def run_chain_workers(chain: ChainConfig):
+    await asyncio.gather(*[deposit(chain, f"{get_worker_id()}-{chain.chain_symbol}-{i}") for i in range(SA_WORKERS)])
 
 
 async def main():
-    loop = asyncio.get_running_loop()
-    tasks = [loop.create_task(deposit(chain)) for chain in CHAINS_CONFIG.values()]
-    await asyncio.gather(*tasks)
+    await migrate()
+    await run_chains("deposit_sa", CHAINS_CONFIG.values(), run_chain_workers, logger=logger)
 
 
 if __name__ == "__main__":
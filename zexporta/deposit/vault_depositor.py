@@ -16,17 +16,22 @@ from zexporta.custom_types import (
     DepositStatus,
     EVMConfig,
 )
-from zexporta.db.deposit import find_deposit_by_status, upsert_deposits
+from zexporta.db.deposit import claim_deposits, get_deposit_lease_heartbeat, get_deposit_notifier, upsert_deposits
+from zexporta.db.migration import migrate
 from zexporta.utils.abi import FACTORY_ABI, USER_DEPOSIT_ABI
 from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
+from zexporta.utils.worker import get_worker_id
 
 from .config import (
     CHAINS_CONFIG,
+    CHANGE_STREAM_MAX_WAIT_SECONDS,
     EVM_NATIVE_TOKEN_ADDRESS,
     EVM_VAULT_DEPOSITOR_PRIVATE_KEY,
     LOGGER_PATH,
     SENTRY_DNS,
     USER_DEPOSIT_FACTORY_ADDRESS,
+    VAULT_DEPOSITOR_DELAY_SECOND,
+    VAULT_DEPOSITOR_LEASE_SECONDS,
     WITHDRAW_BATCH_SIZE,
 )
 
@@ -117,44 +122,65 @@ async def check_transactions_receipt(
     return tx_receipts
 
 
-async def withdraw(chain: EVMConfig):
+async def withdraw(chain: EVMConfig, owner: str):
     _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
+    notifier = get_deposit_notifier(
+        chain,
+        DepositStatus.VERIFIED,
+        poll_interval=VAULT_DEPOSITOR_DELAY_SECOND,
+        max_wait=CHANGE_STREAM_MAX_WAIT_SECONDS,
+        logger=_logger,
+    )
 
     while True:
         w3 = get_evm_async_client(chain, _logger).client
         account = w3.eth.account.from_key(EVM_VAULT_DEPOSITOR_PRIVATE_KEY)
         nonce = await w3.eth.get_transaction_count(account.address, "pending")
         try:
-            deposits = await find_deposit_by_status(chain, status=DepositStatus.VERIFIED, limit=WITHDRAW_BATCH_SIZE)
+            deposits = await claim_deposits(
+                chain,
+                status=DepositStatus.VERIFIED,
+                owner=owner,
+                lease_seconds=VAULT_DEPOSITOR_LEASE_SECONDS,
+                limit=WITHDRAW_BATCH_SIZE,
+            )
             if len(deposits) == 0:
                 _logger.debug("New deposit is not found.")
-                await asyncio.sleep(10)
+                await notifier.wait()
                 continue
             logger.info(f"Deposit length is {len(deposits)}")
-            txs_hash = await broadcast_transactions(w3, account, deposits, nonce, _logger)
-            txs_receipt = await check_transactions_receipt(w3, txs_hash)
-            for index, (tx_receipt, tx_type) in enumerate(txs_receipt):
-                if isinstance(tx_receipt, BaseException):
-                    _logger.error(f"Exception occurred, error: {tx_receipt}")
-                    continue
-                if tx_receipt["status"] != 1:
-                    _logger.error(
-                        f"Transaction for address {deposits[index].transfer.to} and \
-                          TxHash {tx_receipt['transactionHash'].hex()} \
-                          TxType {tx_type} is not successful."
-                    )
-                if tx_type == TxType.CONTRACT_DEPLOY:
-                    continue
-                deposits[index].status = DepositStatus.SUCCESSFUL
-            await upsert_deposits(chain=chain, deposits=deposits)
+            async with get_deposit_lease_heartbeat(
+                chain, owner, len(deposits), VAULT_DEPOSITOR_LEASE_SECONDS, logger=_logger
+            ):
+                txs_hash = await broadcast_transactions(w3, account, deposits, nonce, _logger)
+                txs_receipt = await check_transactions_receipt(w3, txs_hash)
+                for index, (tx_receipt, tx_type) in enumerate(txs_receipt):
+                    if isinstance(tx_receipt, BaseException):
+                        _logger.error(f"Exception occurred, error: {tx_receipt}")
+                        continue
+                    if tx_receipt["status"] != 1:
+                        _logger.error(
+                            f"Transaction for address {deposits[index].transfer.to} and \
+                              TxHash {tx_receipt['transactionHash'].hex()} \
+                              TxType {tx_type} is not successful."
+                        )
+                    if tx_type == TxType.CONTRACT_DEPLOY:
+                        continue
+                    deposits[index].status = DepositStatus.SUCCESSFUL
+                await upsert_deposits(chain=chain, deposits=deposits)
 
         except Exception as e:
             _logger.error(f"Exception occurred, error: {e}")
 
 
 async def main():
+    await migrate()
     loop = asyncio.get_running_loop()
-    tasks = [loop.create_task(withdraw(chain)) for chain in CHAINS_CONFIG.values() if isinstance(chain, EVMConfig)]
+    tasks = [
+        loop.create_task(withdraw(chain, f"{get_worker_id()}-{chain.chain_symbol}"))
+        for chain in CHAINS_CONFIG.values()
+        if isinstance(chain, EVMConfig)
+    ]
     await asyncio.gather(*tasks)
 
 
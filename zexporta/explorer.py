@@ -1,5 +1,10 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Any, Callable, Coroutine
+from functools import partial
+from typing import Any, Awaitable, Callable, Coroutine, Iterable, Iterator
 
 from clients import ChainAsyncClient, filter_blocks
 
@@ -12,58 +17,252 @@ from zexporta.custom_types import (
     Transfer,
     UserId,
 )
-from zexporta.db.token import get_decimals, insert_token
+from zexporta.utils.token_cache import get_token_cache
 
+logger = logging.getLogger(__name__)
 
-def get_block_batches(
+
+def iter_block_batches(
     from_block: BlockNumber,
     to_block: BlockNumber,
     *,
     batch_size: int = 5,
-) -> list[tuple[BlockNumber, ...]]:
-    block_batches = [
-        tuple(j for j in range(i, min(to_block + 1, i + batch_size)))
-        for i in range(from_block, to_block + 1, batch_size)
-    ]
-    return block_batches
+) -> Iterator[tuple[BlockNumber, ...]]:
+    for i in range(from_block, to_block + 1, batch_size):
+        yield tuple(range(i, min(to_block + 1, i + batch_size)))
 
 
-async def explorer(
-    client: ChainAsyncClient,
+def get_block_batches(
     from_block: BlockNumber,
     to_block: BlockNumber,
-    accepted_addresses: dict[Address, UserId],
-    extract_block_logic: Callable[..., Coroutine[Any, Any, list[Transfer]]],
     *,
-    batch_size=5,
-    max_delay_per_block_batch: int | float = 10,
+    batch_size: int = 5,
+) -> list[tuple[BlockNumber, ...]]:
+    return list(iter_block_batches(from_block, to_block, batch_size=batch_size))
+
+
+@dataclass
+class ExploredBatch:
+    blocks_number: tuple[BlockNumber, ...]
+    deposits: list[Deposit]
+    failed_blocks: list[BlockNumber] = field(default_factory=list)
+
+
+@dataclass
+class StageStats:
+    """Counters of one explorer pipeline stage.
+
+    `busy_time` is the time spent doing the stage work and `stalled_time` is the time spent
+    waiting for the next stage to accept a result, so the stage with the lowest `blocks_per_second`
+    and no stall is the bottleneck.
+    """
+
+    name: str
+    batches: int = 0
+    blocks: int = 0
+    items: int = 0
+    busy_time: float = 0.0
+    stalled_time: float = 0.0
+
+    @property
+    def blocks_per_second(self) -> float:
+        return self.blocks / self.busy_time if self.busy_time else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.batches} batches, {self.blocks} blocks, {self.items} items, "
+            f"{self.blocks_per_second:.2f} blocks/s, busy {self.busy_time:.2f}s, stalled {self.stalled_time:.2f}s"
+        )
+
+
+async def _put(queue: asyncio.Queue, item: Any, stats: StageStats):
+    start = time.monotonic()
+    await queue.put(item)
+    stats.stalled_time += time.monotonic() - start
+
+
+async def _extract_or_record_failure(
+    extract_block_logic: Callable[..., Coroutine[Any, Any, list[Transfer]]],
+    failed_blocks: list[BlockNumber],
+    block_number: BlockNumber,
     **kwargs,
-) -> list[Deposit[Transfer]]:
-    result = []
-    block_batches = get_block_batches(from_block, to_block, batch_size=batch_size)
+) -> list[Transfer]:
+    try:
+        return await extract_block_logic(block_number, **kwargs)
+    except Exception as e:
+        (kwargs.get("logger") or logger).error(f"Extracting block {block_number} failed, error: {e}")
+        failed_blocks.append(block_number)
+        return []
+
+
+async def _fetch_stage(
+    block_batches: Iterable[tuple[BlockNumber, ...]],
+    extract_block_logic: Callable[..., Coroutine[Any, Any, list[Transfer]]],
+    out_queue: asyncio.Queue,
+    stats: StageStats,
+    max_delay_per_block_batch: int | float,
+    record_failed_blocks: bool,
+    **kwargs,
+):
     for blocks_number in block_batches:
+        start = time.monotonic()
+        failed_blocks: list[BlockNumber] = []
         transfers = await filter_blocks(
             blocks_number,
-            extract_block_logic,
+            partial(_extract_or_record_failure, extract_block_logic, failed_blocks)
+            if record_failed_blocks
+            else extract_block_logic,
             max_delay_per_block_batch=max_delay_per_block_batch,
             **kwargs,
         )
+        stats.busy_time += time.monotonic() - start
+        stats.batches += 1
+        stats.blocks += len(blocks_number)
+        stats.items += len(transfers)
+        await _put(out_queue, (blocks_number, transfers, sorted(failed_blocks)), stats)
+    await _put(out_queue, None, stats)
+
+
+async def _match_stage(
+    client: ChainAsyncClient,
+    accepted_addresses: dict[Address, UserId],
+    in_queue: asyncio.Queue,
+    out_queue: asyncio.Queue,
+    stats: StageStats,
+):
+    while (item := await in_queue.get()) is not None:
+        blocks_number, transfers, failed_blocks = item
+        start = time.monotonic()
         accepted_deposits = await get_accepted_deposits(
             client,
             transfers,
             accepted_addresses=accepted_addresses,
         )
-        result.extend(accepted_deposits)
+        stats.busy_time += time.monotonic() - start
+        stats.batches += 1
+        stats.blocks += len(blocks_number)
+        stats.items += len(accepted_deposits)
+        await _put(
+            out_queue,
+            ExploredBatch(blocks_number=blocks_number, deposits=accepted_deposits, failed_blocks=failed_blocks),
+            stats,
+        )
+    await _put(out_queue, None, stats)
+
+
+async def _persist_stage(
+    in_queue: asyncio.Queue,
+    stats: StageStats,
+    result: list[Deposit],
+    persist_batch: Callable[[ExploredBatch], Awaitable[Any]] | None,
+):
+    while (batch := await in_queue.get()) is not None:
+        start = time.monotonic()
+        if persist_batch is not None:
+            await persist_batch(batch)
+        result.extend(batch.deposits)
+        stats.busy_time += time.monotonic() - start
+        stats.batches += 1
+        stats.blocks += len(batch.blocks_number)
+        stats.items += len(batch.deposits)
+
+
+async def explore_block_batches(
+    client: ChainAsyncClient,
+    block_batches: Iterable[tuple[BlockNumber, ...]],
+    accepted_addresses: dict[Address, UserId],
+    extract_block_logic: Callable[..., Coroutine[Any, Any, list[Transfer]]],
+    *,
+    max_delay_per_block_batch: int | float = 10,
+    persist_batch: Callable[[ExploredBatch], Awaitable[Any]] | None = None,
+    record_failed_blocks: bool = False,
+    queue_size: int = 2,
+    **kwargs,
+) -> list[Deposit[Transfer]]:
+    """Run fetch, match and persist as concurrent stages connected by bounded queues.
+
+    While batch N is being matched, batch N + 1 is fetched and batch N - 1 is handed to
+    `persist_batch`. Batches reach `persist_batch` in the order of `block_batches`.
+
+    With `record_failed_blocks`, a block whose extraction raises is reported in
+    `ExploredBatch.failed_blocks` instead of failing the whole run.
+    """
+    _logger = kwargs.get("logger") or logger
+    fetched_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    matched_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    fetch_stats = StageStats("fetch")
+    match_stats = StageStats("match")
+    persist_stats = StageStats("persist")
+    result: list[Deposit] = []
+
+    tasks = [
+        asyncio.create_task(
+            _fetch_stage(
+                block_batches,
+                extract_block_logic,
+                fetched_queue,
+                fetch_stats,
+                max_delay_per_block_batch,
+                record_failed_blocks,
+                **kwargs,
+            )
+        ),
+        asyncio.create_task(_match_stage(client, accepted_addresses, fetched_queue, matched_queue, match_stats)),
+        asyncio.create_task(_persist_stage(matched_queue, persist_stats, result, persist_batch)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        _logger.info(f"Explorer pipeline | {fetch_stats} | {match_stats} | {persist_stats}")
     return result
 
 
+async def explorer(
+    client: ChainAsyncClient,
+    from_block: BlockNumber,
+    to_block: BlockNumber,
+    accepted_addresses: dict[Address, UserId],
+    extract_block_logic: Callable[..., Coroutine[Any, Any, list[Transfer]]],
+    *,
+    batch_size=5,
+    max_delay_per_block_batch: int | float = 10,
+    persist_batch: Callable[[ExploredBatch], Awaitable[Any]] | None = None,
+    record_failed_blocks: bool = False,
+    **kwargs,
+) -> list[Deposit[Transfer]]:
+    return await explore_block_batches(
+        client,
+        iter_block_batches(from_block, to_block, batch_size=batch_size),
+        accepted_addresses,
+        extract_block_logic,
+        max_delay_per_block_batch=max_delay_per_block_batch,
+        persist_batch=persist_batch,
+        record_failed_blocks=record_failed_blocks,
+        **kwargs,
+    )
+
+
 async def get_token_decimals(client: ChainAsyncClient, token_address: Address) -> int:
-    chain_symbol = client.chain.chain_symbol
-    decimals = await get_decimals(chain_symbol, token_address)
-    if decimals is None:
-        decimals = await client.get_token_decimals(token_address)
-        await insert_token(chain_symbol, token_address, decimals)
-    return decimals
+    return (await get_token_cache().get_token_metadata(client, token_address)).decimals
+
+
+async def _gather_with_semaphore[K, V](
+    keys: Iterable[K],
+    fn: Callable[[K], Awaitable[V]],
+    semaphore: asyncio.Semaphore,
+) -> dict[K, V]:
+    async def run(key: K) -> V:
+        async with semaphore:
+            return await fn(key)
+
+    keys = list(keys)
+    values = await asyncio.gather(*[run(key) for key in keys])
+    return dict(zip(keys, values))
 
 
 async def get_accepted_deposits(
@@ -73,24 +272,55 @@ async def get_accepted_deposits(
     *,
     sa_timestamp: Timestamp | None = None,
     deposit_status: DepositStatus = DepositStatus.PENDING,
+    max_concurrency: int = 10,
 ) -> list[Deposit]:
+    """Build deposits for transfers sent to accepted addresses.
+
+    Token metadata comes from the token cache, which resolves all unknown tokens in one batch,
+    and transaction status is looked up once per distinct tx hash, at most `max_concurrency`
+    at a time. Transfers of contracts which are not tokens are skipped.
+    """
+    matched = [
+        (transfer, user_id) for transfer in transfers if (user_id := accepted_addresses.get(transfer.to)) is not None
+    ]
+    if not matched:
+        return []
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tokens_metadata, txs_successful = await asyncio.gather(
+        get_token_cache().get_tokens_metadata(client, {transfer.token for transfer, _ in matched}),
+        _gather_with_semaphore(
+            {transfer.tx_hash for transfer, _ in matched},
+            client.is_transaction_successful,
+            semaphore,
+        ),
+    )
+
+    transfer_class = client.chain.transfer_class
     result = []
-    for transfer in transfers:
-        if (user_id := accepted_addresses.get(transfer.to)) is not None:
-            decimals = await get_token_decimals(client, transfer.token)
-            if await client.is_transaction_successful(transfer.tx_hash):
-                deposit = Deposit(
-                    user_id=user_id,
-                    decimals=decimals,
-                    transfer=client.chain.transfer_class.model_validate(transfer),
-                    status=deposit_status,
-                    sa_timestamp=sa_timestamp,
-                )
-                if (
-                    transfer.token != "0x0000000000000000000000000000000000000000"
-                    and Decimal(deposit.transfer.value) / 10**decimals > 300
-                ):  # FIXME: this is just for test becareful and remove it
-                    deposit.status = DepositStatus.REJECTED
-                result.append(deposit)
+    for transfer, user_id in matched:
+        if not txs_successful[transfer.tx_hash]:
+            continue
+        token_metadata = tokens_metadata[transfer.token]
+        if token_metadata is None:
+            logger.warning(f"Skipping transfer {transfer.tx_hash}, {transfer.token} is not a token")
+            continue
+        decimals = token_metadata.decimals
+        status = deposit_status
+        if (
+            transfer.token != "0x0000000000000000000000000000000000000000"
+            and Decimal(transfer.value) / 10**decimals > 300
+        ):  # FIXME: this is just for test becareful and remove it
+            status = DepositStatus.REJECTED
+        # Transfers come validated from the chain client, so build the deposit without revalidating them.
+        result.append(
+            Deposit.model_construct(
+                user_id=user_id,
+                decimals=decimals,
+                transfer=transfer if isinstance(transfer, transfer_class) else transfer_class.model_validate(transfer),
+                status=status,
+                sa_timestamp=sa_timestamp,
+            )
+        )
 
     return result
@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Iterable
+
+import redis.asyncio as redis
+from clients import ChainAsyncClient, get_chain_handle
+from clients.custom_types import BlockHeader
+from pydantic import BaseModel
+from redis.asyncio.client import PubSub
+
+from zexporta.custom_types import BlockNumber, ChainConfig
+
+logger = logging.getLogger(__name__)
+
+# Redis the head tracker publishes chain heads to; without it every stage asks its RPC node directly
+CHAIN_HEAD_REDIS_URL = os.getenv("CHAIN_HEAD_REDIS_URL") or None
+# Published heads older than this are ignored, so a stopped tracker never holds a stage back
+CHAIN_HEAD_MAX_AGE_SECONDS = float(os.getenv("CHAIN_HEAD_MAX_AGE_SECONDS", 30))
+CHAIN_HEAD_KEY_PREFIX = "chain_head"
+CHAIN_HEAD_STORE_RESOURCE = "chain_head_store"
+
+
+class ChainHead(BaseModel):
+    chain_symbol: str
+    latest_block_number: BlockNumber
+    latest_block_hash: str
+    finalized_block_number: BlockNumber
+    updated_at: float
+
+
+class Reorg(BaseModel):
+    chain_symbol: str
+    fork_block_number: BlockNumber
+    depth: int
+    detected_at: float
+
+
+def get_head_key(chain_symbol: str) -> str:
+    return f"{CHAIN_HEAD_KEY_PREFIX}:{chain_symbol}"
+
+
+def get_reorg_channel(chain_symbol: str) -> str:
+    return f"{CHAIN_HEAD_KEY_PREFIX}:{chain_symbol}:reorg"
+
+
+class ChainHeadStore:
+    """Chain heads shared between the processes of a host through Redis.
+
+    The head of each chain is one JSON value, so readers always see a consistent latest and
+    finalized pair; reorgs are published on a per chain channel.
+    """
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    async def publish(self, head: ChainHead) -> None:
+        await self.client.set(get_head_key(head.chain_symbol), head.model_dump_json())
+
+    async def publish_reorg(self, reorg: Reorg) -> None:
+        await self.client.publish(get_reorg_channel(reorg.chain_symbol), reorg.model_dump_json())
+
+    async def get(self, chain_symbol: str) -> ChainHead | None:
+        value = await self.client.get(get_head_key(chain_symbol))
+        return ChainHead.model_validate(json.loads(value)) if value else None
+
+    async def subscribe_reorgs(self, chain_symbol: str) -> "ReorgSubscription":
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(get_reorg_channel(chain_symbol))
+        return ReorgSubscription(pubsub)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class ReorgSubscription:
+    """The reorgs of one chain published since the subscription, read without waiting."""
+
+    def __init__(self, pubsub: PubSub):
+        self.pubsub = pubsub
+
+    async def get_fork_block_number(self) -> BlockNumber | None:
+        """Return the lowest fork block of the reorgs received since the last call, `None` without any."""
+        fork_block_number = None
+        while (message := await self.pubsub.get_message(timeout=0)) is not None:
+            if message["type"] != "message":
+                continue
+            reorg = Reorg.model_validate_json(message["data"])
+            if fork_block_number is None or reorg.fork_block_number < fork_block_number:
+                fork_block_number = reorg.fork_block_number
+        return fork_block_number
+
+
+def get_chain_head_store(chain: ChainConfig) -> ChainHeadStore | None:
+    """Return the head store of `chain` for the running loop, or `None` when no Redis is configured."""
+    if CHAIN_HEAD_REDIS_URL is None:
+        return None
+    return get_chain_handle(chain).get_loop_resource(
+        CHAIN_HEAD_STORE_RESOURCE,
+        lambda: ChainHeadStore(redis.from_url(CHAIN_HEAD_REDIS_URL, decode_responses=True)),
+    )
+
+
+async def subscribe_reorgs(chain: ChainConfig) -> ReorgSubscription | None:
+    """Subscribe to the reorgs the head tracker publishes for `chain`, `None` when no Redis is configured."""
+    store = get_chain_head_store(chain)
+    if store is None:
+        return None
+    return await store.subscribe_reorgs(chain.chain_symbol)
+
+
+async def get_published_head(chain: ChainConfig) -> ChainHead | None:
+    store = get_chain_head_store(chain)
+    if store is None:
+        return None
+    try:
+        head = await store.get(chain.chain_symbol)
+    except redis.RedisError as e:
+        logger.warning(f"Reading the {chain.chain_symbol} chain head failed, error: {e}")
+        return None
+    if head is None or time.time() - head.updated_at > CHAIN_HEAD_MAX_AGE_SECONDS:
+        return None
+    return head
+
+
+async def get_latest_block_number(client: ChainAsyncClient) -> BlockNumber:
+    """Return the latest block number published by the head tracker, asking the node when there is none."""
+    head = await get_published_head(client.chain)
+    if head is None:
+        return await client.get_latest_block_number()
+    return head.latest_block_number
+
+
+async def get_finalized_block_number(client: ChainAsyncClient, at_least: BlockNumber | None = None) -> BlockNumber:
+    """Return the finalized block number published by the head tracker, asking the node when there is none.
+
+    The node is asked as well when the published number is below `at_least`, so a head that is a
+    poll behind never rejects a block another node already sees as finalized.
+    """
+    head = await get_published_head(client.chain)
+    if head is None or (at_least is not None and head.finalized_block_number < at_least):
+        return await client.get_finalized_block_number()
+    return head.finalized_block_number
+
+
+class HeaderRingBuffer:
+    """The most recent headers of a chain, consecutive by block number."""
+
+    def __init__(self, size: int):
+        self._headers: deque[BlockHeader] = deque(maxlen=size)
+
+    @property
+    def size(self) -> int:
+        return self._headers.maxlen  # type: ignore
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+    @property
+    def tail(self) -> BlockHeader | None:
+        return self._headers[-1] if self._headers else None
+
+    @property
+    def block_numbers(self) -> range:
+        if not self._headers:
+            return range(0)
+        return range(self._headers[0].number, self._headers[-1].number + 1)
+
+    def get(self, block_number: BlockNumber) -> BlockHeader | None:
+        if block_number not in self.block_numbers:
+            return None
+        return self._headers[block_number - self._headers[0].number]
+
+    def clear(self) -> None:
+        self._headers.clear()
+
+    def truncate(self, block_number: BlockNumber) -> None:
+        """Drop the headers above `block_number`."""
+        while self._headers and self._headers[-1].number > block_number:
+            self._headers.pop()
+
+    def extend(self, headers: Iterable[BlockHeader]) -> None:
+        for header in headers:
+            if self._headers and header.number != self._headers[-1].number + 1:
+                self._headers.clear()
+            self._headers.append(header)
+
+
+class ChainHeadTracker:
+    """Follow the head of one chain, detecting reorgs within the last `buffer_size` blocks."""
+
+    def __init__(
+        self,
+        client: ChainAsyncClient,
+        store: ChainHeadStore,
+        buffer_size: int,
+        logger: logging.Logger | logging.LoggerAdapter = logger,
+    ):
+        self.client = client
+        self.store = store
+        self.buffer = HeaderRingBuffer(buffer_size)
+        self.logger = logger
+
+    async def poll(self) -> tuple[ChainHead, Reorg | None]:
+        """Fetch the new headers of the chain, publish its head and any reorg found on the way."""
+        latest_block_number = await self.client.get_latest_block_number()
+        finalized_block_number = await self.client.get_finalized_block_number()
+        reorg = await self._follow(latest_block_number)
+        tail: BlockHeader = self.buffer.tail  # type: ignore
+        head = ChainHead(
+            chain_symbol=self.client.chain.chain_symbol,
+            latest_block_number=tail.number,
+            latest_block_hash=tail.hash,
+            finalized_block_number=min(finalized_block_number, tail.number),
+            updated_at=time.time(),
+        )
+        if reorg is not None:
+            await self.store.publish_reorg(reorg)
+        await self.store.publish(head)
+        return head, reorg
+
+    async def _follow(self, latest_block_number: BlockNumber) -> Reorg | None:
+        tail = self.buffer.tail
+        if tail is None or latest_block_number - tail.number >= self.buffer.size:
+            # Nothing to compare against, start over from the latest block.
+            self.buffer.clear()
+            self.buffer.extend((await self.client.get_block_headers([latest_block_number])).values())
+            return None
+
+        # The last known block is fetched again with the new ones, a different hash means a reorg.
+        from_block = min(tail.number, latest_block_number)
+        headers = await self.client.get_block_headers(range(from_block, latest_block_number + 1))
+        if headers[from_block].hash == self.buffer.get(from_block).hash:  # type: ignore
+            self.buffer.extend(headers[number] for number in range(tail.number + 1, latest_block_number + 1))
+            return None
+
+        known = self.buffer.block_numbers
+        canonical = await self.client.get_block_headers(range(known.start, from_block))
+        canonical.update(headers)
+        fork_block_number = known.start - 1
+        for block_number in reversed(range(known.start, from_block)):
+            if canonical[block_number].hash == self.buffer.get(block_number).hash:  # type: ignore
+                fork_block_number = block_number
+                break
+        reorg = Reorg(
+            chain_symbol=self.client.chain.chain_symbol,
+            fork_block_number=fork_block_number,
+            depth=tail.number - fork_block_number,
+            detected_at=time.time(),
+        )
+        self.logger.warning(f"Reorg detected, fork at block {fork_block_number} with depth {reorg.depth}")
+        self.buffer.truncate(fork_block_number)
+        self.buffer.extend(canonical[number] for number in range(fork_block_number + 1, latest_block_number + 1))
+        return reorg
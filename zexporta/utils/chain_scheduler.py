@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import math
+import os
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Iterable
+
+from zexporta.custom_types import ChainConfig
+from zexporta.db.chain_lease import (
+    ChainLease,
+    acquire_chain_lease,
+    count_stage_members,
+    heartbeat_stage_member,
+    release_chain_lease,
+    remove_stage_member,
+    renew_chain_lease,
+)
+
+from .worker import get_worker_id
+
+logger = logging.getLogger(__name__)
+
+# Shard the chains of a stage across its replicas through chain leases; without it every replica runs every chain
+CHAIN_LEASING = os.getenv("CHAIN_LEASING", "false").lower() == "true"
+# A replica that stops renewing its chain leases for this long loses them to the other replicas
+CHAIN_LEASE_SECONDS = float(os.getenv("CHAIN_LEASE_SECONDS", 30))
+
+_current_chain_lease: ContextVar[ChainLease | None] = ContextVar("current_chain_lease", default=None)
+
+
+def get_fencing_token() -> int | None:
+    """Return the fencing token of the chain lease the current task runs under, `None` without leasing.
+
+    Only the observer checkpoint is fenced. Status transitions of the finalizer and the SA are
+    not: each one is conditional on the status it moves records from, so a transition a former
+    holder writes late matches none of the records its successor already moved.
+    """
+    lease = _current_chain_lease.get()
+    return lease.token if lease is not None else None
+
+
+class ChainScheduler:
+    """Run `worker` for the chains of `stage` whose leases this replica holds.
+
+    Every third of `lease_seconds` the replica announces itself, renews its leases and takes
+    free or expired ones up to its fair share of the chains, the number of chains divided by
+    the number of live replicas. The worker of a chain whose lease was lost is cancelled, and
+    a replica above its share, after another one joined, releases its extra chains. A replica
+    that dies stops renewing, so its chains are taken over once their leases expire.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        chains: Iterable[ChainConfig],
+        worker: Callable[[ChainConfig], Awaitable[None]],
+        owner: str,
+        lease_seconds: int | float = CHAIN_LEASE_SECONDS,
+        logger: logging.Logger | logging.LoggerAdapter = logger,
+    ):
+        self.stage = stage
+        self.chains = {chain.chain_symbol: chain for chain in chains}
+        self.worker = worker
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.logger = logger
+        self.running: dict[str, tuple[ChainLease, asyncio.Task]] = {}
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    await self.rebalance()
+                except Exception as e:
+                    self.logger.exception(f"Rebalancing the chains of {self.stage} failed: {e}")
+                    await self.stop_expired()
+                await asyncio.sleep(self.lease_seconds / 3)
+        finally:
+            await asyncio.gather(*[self.stop(chain_symbol) for chain_symbol in list(self.running)])
+            await remove_stage_member(self.stage, self.owner)
+
+    async def rebalance(self):
+        await heartbeat_stage_member(self.stage, self.owner, self.lease_seconds)
+        members = max(await count_stage_members(self.stage), 1)
+        share = math.ceil(len(self.chains) / members)
+
+        for chain_symbol, (lease, task) in list(self.running.items()):
+            if task.done():
+                if not task.cancelled() and task.exception() is not None:
+                    self.logger.error(f"Worker of {chain_symbol} stopped: {task.exception()}")
+                await self.stop(chain_symbol)
+                continue
+            renewed = await renew_chain_lease(lease, self.lease_seconds)
+            if renewed is None:
+                self.logger.warning(f"Lease of {chain_symbol} was taken over, stopping its worker")
+                await self.stop(chain_symbol, release=False)
+            else:
+                self.running[chain_symbol] = (renewed, task)
+
+        for chain_symbol in sorted(self.running)[share:]:
+            self.logger.info(f"Releasing {chain_symbol}, above the share of {share} chains of {members} replicas")
+            await self.stop(chain_symbol)
+
+        for chain_symbol, chain in self.chains.items():
+            if len(self.running) >= share:
+                break
+            if chain_symbol in self.running:
+                continue
+            lease = await acquire_chain_lease(self.stage, chain_symbol, self.owner, self.lease_seconds)
+            if lease is not None:
+                self.logger.info(f"Acquired {chain_symbol} with fencing token {lease.token}")
+                self.start(chain, lease)
+
+    async def stop_expired(self):
+        """Stop the workers whose leases expired without being renewed, another replica may run them by now."""
+        now = datetime.now(timezone.utc)
+        for chain_symbol, (lease, _) in list(self.running.items()):
+            if lease.expires_at <= now:
+                self.logger.warning(f"Lease of {chain_symbol} expired before it was renewed, stopping its worker")
+                await self.stop(chain_symbol, release=False)
+
+    def start(self, chain: ChainConfig, lease: ChainLease):
+        async def run():
+            _current_chain_lease.set(lease)
+            await self.worker(chain)
+
+        self.running[chain.chain_symbol] = (lease, asyncio.create_task(run()))
+
+    async def stop(self, chain_symbol: str, release: bool = True):
+        lease, task = self.running.pop(chain_symbol)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if release:
+            await release_chain_lease(lease)
+
+
+async def run_chains(
+    stage: str,
+    chains: Iterable[ChainConfig],
+    worker: Callable[[ChainConfig], Awaitable[None]],
+    logger: logging.Logger | logging.LoggerAdapter = logger,
+):
+    """Run `worker` for each of `chains`, sharded across the replicas of `stage` when `CHAIN_LEASING` is set."""
+    if not CHAIN_LEASING:
+        await asyncio.gather(*[worker(chain) for chain in chains])
+        return
+    await ChainScheduler(stage, chains, worker, get_worker_id(), logger=logger).run()
@@ -0,0 +1,83 @@
+import os
+import time
+from functools import lru_cache
+from typing import Iterable
+
+from clients import ChainAsyncClient
+
+from zexporta.custom_types import Address, TokenMetadata
+from zexporta.db.token import find_tokens_metadata, insert_tokens
+
+# How long an address found not to be a token is remembered before it is looked up again
+TOKEN_NEGATIVE_CACHE_SECONDS = float(os.getenv("TOKEN_NEGATIVE_CACHE_SECONDS", 3600))
+
+
+class NotATokenError(Exception):
+    """Raise when an address does not implement the token metadata calls."""
+
+
+class TokenMetadataCache:
+    """Process wide cache of token metadata, keyed by chain symbol and token address.
+
+    The tokens of a chain are loaded from the `token` collection on its first lookup, tokens
+    missing there are resolved in one batched client call and stored, and addresses that turn
+    out not to be tokens are remembered for `negative_ttl` seconds so they are not looked up on
+    every block.
+    """
+
+    def __init__(self, negative_ttl: float = TOKEN_NEGATIVE_CACHE_SECONDS):
+        self.negative_ttl = negative_ttl
+        self._tokens: dict[tuple[str, Address], TokenMetadata] = {}
+        self._not_tokens: dict[tuple[str, Address], float] = {}
+        self._loaded_chains: set[str] = set()
+
+    async def preload(self, chain_symbol: str) -> None:
+        if chain_symbol in self._loaded_chains:
+            return
+        for token_address, metadata in (await find_tokens_metadata(chain_symbol)).items():
+            self._tokens[(chain_symbol, token_address)] = metadata
+        self._loaded_chains.add(chain_symbol)
+
+    async def get_tokens_metadata(
+        self, client: ChainAsyncClient, token_addresses: Iterable[Address]
+    ) -> dict[Address, TokenMetadata | None]:
+        """Return the metadata of each token, `None` for addresses which are not tokens."""
+        chain_symbol = client.chain.chain_symbol
+        await self.preload(chain_symbol)
+        now = time.monotonic()
+        result: dict[Address, TokenMetadata | None] = {}
+        unknown = []
+        for token_address in set(token_addresses):
+            key = (chain_symbol, token_address)
+            if (metadata := self._tokens.get(key)) is not None:
+                result[token_address] = metadata
+            elif self._not_tokens.get(key, 0) > now:
+                result[token_address] = None
+            else:
+                unknown.append(token_address)
+        if not unknown:
+            return result
+
+        resolved = await client.get_tokens_metadata(unknown)
+        tokens = {token_address: metadata for token_address, metadata in resolved.items() if metadata is not None}
+        if tokens:
+            await insert_tokens(chain_symbol, tokens)
+        for token_address, metadata in resolved.items():
+            if metadata is None:
+                self._not_tokens[(chain_symbol, token_address)] = now + self.negative_ttl
+            else:
+                self._tokens[(chain_symbol, token_address)] = metadata
+                self._not_tokens.pop((chain_symbol, token_address), None)
+            result[token_address] = metadata
+        return result
+
+    async def get_token_metadata(self, client: ChainAsyncClient, token_address: Address) -> TokenMetadata:
+        metadata = (await self.get_tokens_metadata(client, [token_address]))[token_address]
+        if metadata is None:
+            raise NotATokenError(f"{token_address} on {client.chain.chain_symbol} is not a token")
+        return metadata
+
+
+@lru_cache()
+def get_token_cache() -> TokenMetadataCache:
+    return TokenMetadataCache()
@@ -0,0 +1,10 @@
+import os
+import socket
+import uuid
+from functools import lru_cache
+
+
+@lru_cache()
+def get_worker_id() -> str:
+    """Identify this process when it takes a lease on shared work."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
@@ -14,6 +14,7 @@ from zexporta.custom_types import (
 )
 from zexporta.db.address import get_active_address, insert_new_address_to_db
 from zexporta.explorer import get_accepted_deposits
+from zexporta.utils.chain_head import get_finalized_block_number
 from zexporta.utils.encoder import DEPOSIT_OPERATION, encode_zex_deposit
 from zexporta.utils.logger import ChainLoggerAdapter
 
@@ -66,7 +67,7 @@ async def get_deposits(
 ):
     _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
     client = get_async_client(chain=chain, logger=_logger)
-    finalized_block_number = await client.get_finalized_block_number()
+    finalized_block_number = await get_finalized_block_number(client, at_least=sa_finalized_block_number)
     if sa_finalized_block_number > finalized_block_number:
         raise NotFinalizedBlockError(
             f"sa_finalized_block_number: {sa_finalized_block_number} \
@@ -1,5 +1,8 @@
+import os
+
 from zexporta.config import (
     CHAINS_CONFIG,
+    CHANGE_STREAM_MAX_WAIT_SECONDS,
     DKG_JSON_PATH,
     DKG_NAME,
     EVM_WITHDRAWER_PRIVATE_KEY,
@@ -11,3 +14,5 @@ LOGGER_PATH = "/var/log/withdraw/"
 WITHDRAW_DELAY_SECOND = 10
 SA_TIMEOUT = 60
 SA_DELAY_SECOND = 20
+SA_LEASE_SECONDS = int(os.getenv("WITHDRAW_SA_LEASE_SECONDS", 600))
+SA_WITHDRAW_BATCH_SIZE = int(os.getenv("WITHDRAW_SA_BATCH_SIZE", 10))
@@ -10,6 +10,7 @@ from zexporta.db.chain import (
     get_last_withdraw_nonce,
     upsert_chain_last_withdraw_nonce,
 )
+from zexporta.db.migration import migrate
 from zexporta.db.withdraw import insert_withdraws_if_not_exists
 from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
 from zexporta.utils.zex_api import (
@@ -59,6 +60,7 @@ async def observe_withdraw(chain: ChainConfig):
 
 
 async def main():
+    await migrate()
     loop = asyncio.get_running_loop()
     tasks = [
         loop.create_task(observe_withdraw(chain)) for chain in CHAINS_CONFIG.values() if isinstance(chain, EVMConfig)
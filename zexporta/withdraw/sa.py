@@ -17,26 +17,37 @@ from zexporta.custom_types import (
     EVMWithdrawRequest,
     WithdrawStatus,
 )
-from zexporta.db.withdraw import find_withdraws_by_status, upsert_withdraw
+from zexporta.db.lease import LeaseLost
+from zexporta.db.migration import migrate
+from zexporta.db.withdraw import (
+    claim_withdraws,
+    get_withdraw_lease_heartbeat,
+    get_withdraw_notifier,
+    update_withdraw_status,
+)
 from zexporta.utils.abi import VAULT_ABI
 from zexporta.utils.decode_error import decode_custom_error_data
 from zexporta.utils.dkg import parse_dkg_json
 from zexporta.utils.encoder import get_evm_withdraw_hash
 from zexporta.utils.logger import ChainLoggerAdapter, get_logger_config
 from zexporta.utils.node_info import NodesInfo
+from zexporta.utils.worker import get_worker_id
 from zexporta.utils.zex_api import (
     ZexAPIError,
 )
 
 from .config import (
     CHAINS_CONFIG,
+    CHANGE_STREAM_MAX_WAIT_SECONDS,
     DKG_JSON_PATH,
     DKG_NAME,
     EVM_WITHDRAWER_PRIVATE_KEY,
     LOGGER_PATH,
     SA_DELAY_SECOND,
+    SA_LEASE_SECONDS,
     SA_SHIELD_PRIVATE_KEY,
     SA_TIMEOUT,
+    SA_WITHDRAW_BATCH_SIZE,
     SENTRY_DNS,
 )
 
@@ -143,76 +154,119 @@ async def send_withdraw(
     logger.info(f"Method called successfully. Transaction Hash: {tx_hash.hex()}")
 
 
-async def withdraw(chain: EVMConfig):
+async def set_withdraw_status(chain: EVMConfig, withdraw_request: EVMWithdrawRequest, status: WithdrawStatus):
+    # Awaited before the next request, a lost SUCCESSFUL status would send the withdraw again.
+    withdraw_request.status = status
+    await update_withdraw_status(
+        chain,
+        withdraw_request.nonce,
+        WithdrawStatus.PENDING,
+        status,
+        tx_hash=withdraw_request.tx_hash,
+    )
+
+
+async def process_withdraw_request(
+    w3: AsyncWeb3,
+    account: LocalAccount,
+    chain: EVMConfig,
+    withdraw_request: EVMWithdrawRequest,
+    dkg_party,
+    logger: ChainLoggerAdapter,
+):
+    try:
+        await process_withdraw_sa(
+            w3=w3,
+            account=account,
+            chain=chain,
+            withdraw_request=withdraw_request,
+            dkg_party=dkg_party,
+            logger=logger,
+        )
+    except ZexAPIError as e:
+        logger.error(f"Error at sending deposit to Zex: {e}")
+    except web3.exceptions.ContractCustomError as e:
+        logger.error(
+            f"Contract Error, error: {e.message} \
+              decoded_error: {decode_custom_error_data(e.message, VAULT_ABI)}"
+        )
+        await set_withdraw_status(chain, withdraw_request, WithdrawStatus.REJECTED)
+
+    except web3.exceptions.Web3Exception as e:
+        logger.error(f"Web3Error: {e}")
+        await asyncio.sleep(60)
+    except AssertionError as e:
+        logger.error(f"Validator error, error: {e}")
+    except (KeyError, json.JSONDecodeError, TypeError) as e:
+        logger.exception(f"Error occurred in pyfrost, {e}")
+    except asyncio.TimeoutError as e:
+        logger.error(f"Timeout occurred continue after 1 min, error {e}")
+        await asyncio.sleep(60)
+    except ValidatorResultError as e:
+        logger.error(f"Validator result is not successful, error {e}")
+    except WithdrawDifferentHashError as e:
+        logger.error(f"data that process in zex is different from validators: {e}")
+        await set_withdraw_status(chain, withdraw_request, WithdrawStatus.REJECTED)
+    except TxError as e:
+        logger.error(f"TxError, error: {e}")
+        await set_withdraw_status(chain, withdraw_request, WithdrawStatus.REJECTED)
+    else:
+        await set_withdraw_status(chain, withdraw_request, WithdrawStatus.SUCCESSFUL)
+
+
+async def withdraw(chain: EVMConfig, owner: str):
     _logger = ChainLoggerAdapter(logger, chain.chain_symbol)
 
+    notifier = get_withdraw_notifier(
+        chain,
+        WithdrawStatus.PENDING,
+        poll_interval=SA_DELAY_SECOND,
+        max_wait=CHANGE_STREAM_MAX_WAIT_SECONDS,
+        logger=_logger,
+    )
     while True:
+        has_more = False
         try:
             w3 = get_evm_async_client(chain, _logger).client
             account = w3.eth.account.from_key(EVM_WITHDRAWER_PRIVATE_KEY)
 
             dkg_party = dkg_key["party"]
-            withdraws_requests = await find_withdraws_by_status(chain, WithdrawStatus.PENDING)
+            withdraws_requests = await claim_withdraws(
+                chain,
+                WithdrawStatus.PENDING,
+                owner=owner,
+                lease_seconds=SA_LEASE_SECONDS,
+                limit=SA_WITHDRAW_BATCH_SIZE,
+            )
 
             if len(withdraws_requests) == 0:
                 _logger.debug(f"No {WithdrawStatus.PENDING.value} has been found to process ...")
                 continue
-            for withdraw_request in withdraws_requests:
-                if not isinstance(withdraw_request, EVMWithdrawRequest):
-                    continue
-                try:
-                    await process_withdraw_sa(
-                        w3=w3,
-                        account=account,
-                        chain=chain,
-                        withdraw_request=withdraw_request,
-                        dkg_party=dkg_party,
-                        logger=_logger,
-                    )
-                except ZexAPIError as e:
-                    _logger.error(f"Error at sending deposit to Zex: {e}")
-                    continue
-                except web3.exceptions.ContractCustomError as e:
-                    _logger.error(
-                        f"Contract Error, error: {e.message} \
-                          decoded_error: {decode_custom_error_data(e.message, VAULT_ABI)}"
-                    )
-                    withdraw_request.status = WithdrawStatus.REJECTED
-                    await upsert_withdraw(withdraw_request)
-
-                except web3.exceptions.Web3Exception as e:
-                    _logger.error(f"Web3Error: {e}")
-                    await asyncio.sleep(60)
-                except AssertionError as e:
-                    _logger.error(f"Validator error, error: {e}")
-                    continue
-                except (KeyError, json.JSONDecodeError, TypeError) as e:
-                    _logger.exception(f"Error occurred in pyfrost, {e}")
-                    continue
-                except asyncio.TimeoutError as e:
-                    _logger.error(f"Timeout occurred continue after 1 min, error {e}")
-                    await asyncio.sleep(60)
-                    continue
-                except ValidatorResultError as e:
-                    _logger.error(f"Validator result is not successful, error {e}")
-                except WithdrawDifferentHashError as e:
-                    _logger.error(f"data that process in zex is different from validators: {e}")
-                    withdraw_request.status = WithdrawStatus.REJECTED
-                    await upsert_withdraw(withdraw_request)
-                except TxError as e:
-                    _logger.error(f"TxError, error: {e}")
-                    withdraw_request.status = WithdrawStatus.REJECTED
-                    await upsert_withdraw(withdraw_request)
-                else:
-                    withdraw_request.status = WithdrawStatus.SUCCESSFUL
-                    await upsert_withdraw(withdraw_request)
+            async with get_withdraw_lease_heartbeat(
+                owner, len(withdraws_requests), SA_LEASE_SECONDS, logger=_logger
+            ) as heartbeat:
+                for withdraw_request in withdraws_requests:
+                    if not isinstance(withdraw_request, EVMWithdrawRequest):
+                        continue
+                    # Another worker took the remaining withdraws over, it sends them instead.
+                    heartbeat.check()
+                    await process_withdraw_request(w3, account, chain, withdraw_request, dkg_party, _logger)
+            has_more = len(withdraws_requests) == SA_WITHDRAW_BATCH_SIZE
+        except LeaseLost as e:
+            _logger.warning(e)
         finally:
-            await asyncio.sleep(SA_DELAY_SECOND)
+            if not has_more:
+                await notifier.wait()
 
 
 async def main():
+    await migrate()
     loop = asyncio.get_running_loop()
-    tasks = [loop.create_task(withdraw(chain)) for chain in CHAINS_CONFIG.values() if isinstance(chain, EVMConfig)]
+    tasks = [
+        loop.create_task(withdraw(chain, f"{get_worker_id()}-{chain.chain_symbol}"))
+        for chain in CHAINS_CONFIG.values()
+        if isinstance(chain, EVMConfig)
+    ]
     await asyncio.gather(*tasks)
 
 